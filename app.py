@@ -1,10 +1,19 @@
 import logging
 import sys
+import threading
 from flask import Flask
 
 # Configure logging to output to stdout
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
+def _aplicar_indices():
+    from data.indices import aplicar_indices, registrar_informe
+    try:
+        registrar_informe(aplicar_indices())
+        logging.info("Índices aplicados.")
+    except Exception as e:
+        logging.error(f"No se pudieron aplicar los índices: {e}")
+
 def create_app():
     logging.info("Iniciando create_app...")
     app = Flask(__name__)
@@ -15,15 +24,39 @@ def create_app():
 
     # Importar filtros
     logging.info("Importando filtros...")
-    from common.utils import format_date_filter, format_datetime_filter
+    from common.utils import format_date_filter, format_datetime_filter, ProveedorJSON
+    from data.esquema import fecha_iso
     logging.info("Filtros importados.")
 
     # Registrar filtros
     logging.info("Registrando filtros...")
     app.jinja_env.filters['formato_fecha'] = format_date_filter
     app.jinja_env.filters['formato_fecha_hora'] = format_datetime_filter
+    app.jinja_env.filters['fecha_iso'] = fecha_iso
     logging.info("Filtros registrados.")
 
+    # Fechas e importes de MongoDB (datetime, Decimal) en las respuestas JSON
+    app.json = ProveedorJSON(app)
+
+    # Métricas, perfilado y consultas lentas: se registran antes de que nada cree el cliente de MongoDB
+    if app.config.get('METRICAS_ACTIVO'):
+        logging.info("Activando métricas de Prometheus...")
+        from common import metricas
+        metricas.init_app(app)
+    if app.config.get('PERFILADO_ACTIVO'):
+        logging.info("Activando perfilado de peticiones...")
+        from common import perfilado
+        perfilado.init_app(app)
+    if app.config.get('CONSULTAS_LENTAS_ACTIVO'):
+        logging.info("Activando registro de consultas lentas...")
+        from common import consultas_lentas
+        consultas_lentas.activar()
+
+    # Índices de MongoDB (en segundo plano para no conectar en el arranque)
+    if app.config.get('MONGO_CREAR_INDICES'):
+        logging.info("Lanzando aplicación de índices de MongoDB en segundo plano...")
+        threading.Thread(target=_aplicar_indices, name='indices', daemon=True).start()
+
     # Importar y registrar Blueprints
     logging.info("Importando Blueprint: main")
     from modules.main.routes import main_bp
@@ -0,0 +1,403 @@
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+import config
+from benchmarks.generar_datos import APELLIDOS, FECHA_BASE, JUEGOS, SEMILLA
+
+# Pruebas de carga de extremo a extremo: la aplicación real bajo gunicorn contra un
+# mongod local, con usuarios simulados que repiten lo que hace el personal de la
+# tienda (mirar el calendario, filtrar reservas, crear reservas) mientras corre una
+# exportación a Excel. Para cada ruta se informa de p50/p95/p99 y peticiones por
+# segundo; con varios --modelo se repite la misma carga con cada modelo de workers.
+#
+#   python -m benchmarks.carga --cargar 100000 --modelo sync:4 gthread:2x8 --usuarios 20
+#   python -m benchmarks.carga --url http://127.0.0.1:8000 --duracion 120
+#
+# El cliente HTTP usa solo la biblioteca estándar. Sin --url arranca gunicorn (main:app,
+# gunicorn.conf.py) con MONGO_DB=--base-datos; con --cargar la base de datos se borra
+# y se rellena antes con benchmarks/generar_datos.py.
+BASE_DATOS = 'jocrol_bench'
+PUERTO = 8765
+USUARIOS = 10
+DURACION_S = 60
+CALENTAMIENTO_S = 5
+PAUSA_MS = 200
+EXPORTACIONES = 1
+TIEMPO_ARRANQUE_S = 60
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Peso de cada escenario en la mezcla de los usuarios
+ESCENARIOS = {'calendario': 3, 'reservas': 4, 'nueva_reserva': 2}
+
+
+class Cliente:
+    """Conexión keep-alive de un usuario simulado que anota la latencia de cada petición."""
+
+    def __init__(self, url, registro):
+        partes = urlsplit(url)
+        self.host, self.puerto = partes.hostname, partes.port or 80
+        self.registro = registro
+        self.conexion = None
+
+    def peticion(self, metodo, ruta, etiqueta, parametros=None, formulario=None):
+        """Lanza la petición y devuelve (estado, cuerpo). Las respuestas de error cuentan como fallo."""
+        if parametros:
+            ruta = f"{ruta}?{urlencode(parametros)}"
+        cuerpo, cabeceras = None, {}
+        if formulario is not None:
+            cuerpo = urlencode(formulario)
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        inicio = time.perf_counter()
+        estado, datos = None, b''
+        try:
+            if self.conexion is None:
+                self.conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=300)
+            self.conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self.conexion.getresponse()
+            estado = respuesta.status
+            # Las descargas grandes se leen por trozos y se descartan
+            while True:
+                trozo = respuesta.read(64 * 1024)
+                if not trozo:
+                    break
+                if len(datos) < 1024 * 1024:
+                    datos += trozo
+        except (OSError, http.client.HTTPException):
+            self.cerrar()
+        self.registro.anotar(f"{metodo} {etiqueta}", (time.perf_counter() - inicio) * 1000, estado)
+        return estado, datos
+
+    def json(self, ruta, etiqueta, parametros=None):
+        estado, datos = self.peticion('GET', ruta, etiqueta, parametros)
+        if estado != 200:
+            return None
+        try:
+            return json.loads(datos)
+        except ValueError:
+            return None
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+
+class Registro:
+    """Latencias por ruta de un hilo. Lo anterior a `desde` (calentamiento) no se anota."""
+
+    def __init__(self, desde):
+        self.desde = desde
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+
+    def anotar(self, ruta, ms, estado):
+        if time.monotonic() < self.desde:
+            return
+        # Las redirecciones tras un POST son la respuesta correcta de los formularios
+        if estado is None or estado >= 400:
+            self.errores[ruta] += 1
+        else:
+            self.latencias[ruta].append(ms)
+
+
+# --- Escenarios ---
+
+def _fecha(rng, dias):
+    return (FECHA_BASE + timedelta(days=rng.randint(-dias, dias))).isoformat()
+
+
+def escenario_calendario(cliente, rng):
+    """Abre el calendario y navega unos meses (FullCalendar pide la ventana visible)."""
+    cliente.peticion('GET', '/calendario', '/calendario')
+    inicio = FECHA_BASE + timedelta(days=rng.randint(-180, 120))
+    for _ in range(rng.randint(1, 4)):
+        fin = inicio + timedelta(days=42)
+        cliente.peticion('GET', '/api/eventos', '/api/eventos',
+                         {'start': inicio.isoformat(), 'end': fin.isoformat()})
+        inicio += timedelta(days=rng.choice([-35, 28, 35]))
+
+
+def escenario_reservas(cliente, rng):
+    """Filtra el listado de reservas como lo hace el personal y pasa alguna página."""
+    filtros = rng.choice([
+        {},
+        {'payment_status': 'pendiente'},
+        {'q': rng.choice(APELLIDOS).lower()},
+        {'start_date': _fecha(rng, 120), 'payment_status': rng.choice(['pagado', 'pendiente'])},
+        {'sort_by': rng.choice(['cliente', 'producto', 'pendiente']), 'sort_order': rng.choice(['asc', 'desc'])},
+    ])
+    cliente.peticion('GET', '/reservas/', '/reservas/', filtros)
+    for pagina in range(2, 2 + rng.randint(0, 2)):
+        cliente.peticion('GET', '/reservas/', '/reservas/', {**filtros, 'page': pagina})
+
+
+def escenario_nueva_reserva(cliente, rng):
+    """Abre el formulario, busca cliente y producto con el autocompletado y guarda la reserva."""
+    cliente.peticion('GET', '/reservas/nueva', '/reservas/nueva')
+    clientes = cliente.json('/reservas/api/clientes', '/reservas/api/clientes',
+                            {'q': rng.choice(APELLIDOS)[:3].lower()})
+    juego = rng.choice(list(JUEGOS))
+    tipo = rng.choice(['lanzamiento', 'lanzamiento', 'lanzamiento', 'evento'])
+    productos = cliente.json('/reservas/api/productos', '/reservas/api/productos', {'tipo': tipo, 'juego': juego})
+    if not clientes or not productos:
+        return
+    cliente.peticion('POST', '/reservas/nueva', '/reservas/nueva', formulario={
+        'cliente_id': rng.choice(clientes)['id'],
+        'tipo_producto': tipo,
+        'juego': juego,
+        'producto_id': rng.choice(productos)['id'],
+        'cantidad': rng.choice([1, 1, 1, 2, 3]),
+        'pagado': rng.choice(['0', '0', '10', '50']),
+        'estado': rng.choice(['Pendiente', 'Confirmado']),
+        'tipo_pago': rng.choice(['Efectivo', 'Visa', '']),
+        'notas': 'prueba de carga',
+    })
+
+
+FUNCIONES_ESCENARIOS = {
+    'calendario': escenario_calendario,
+    'reservas': escenario_reservas,
+    'nueva_reserva': escenario_nueva_reserva,
+}
+
+
+def _usuario(url, registro, rng, escenarios, fin, pausa_ms):
+    cliente = Cliente(url, registro)
+    nombres, pesos = zip(*escenarios.items())
+    try:
+        while time.monotonic() < fin:
+            FUNCIONES_ESCENARIOS[rng.choices(nombres, weights=pesos)[0]](cliente, rng)
+            if pausa_ms:
+                time.sleep(min(rng.expovariate(1000 / pausa_ms), max(fin - time.monotonic(), 0)))
+    finally:
+        cliente.cerrar()
+
+
+def _exportador(url, registro, fin):
+    """Descarga el Excel completo una y otra vez mientras dura la prueba."""
+    cliente = Cliente(url, registro)
+    try:
+        while time.monotonic() < fin:
+            cliente.peticion('GET', '/export/excel', '/export/excel')
+    finally:
+        cliente.cerrar()
+
+
+# --- Ejecución y resultados ---
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not valores_ordenados:
+        return None
+    indice = max(math.ceil(p / 100 * len(valores_ordenados)) - 1, 0)
+    return valores_ordenados[indice]
+
+
+def resumir(registros, segundos):
+    latencias, errores = defaultdict(list), defaultdict(int)
+    for registro in registros:
+        for ruta, valores in registro.latencias.items():
+            latencias[ruta].extend(valores)
+        for ruta, total in registro.errores.items():
+            errores[ruta] += total
+
+    rutas = {}
+    for ruta in sorted(set(latencias) | set(errores)):
+        valores = sorted(latencias[ruta])
+        rutas[ruta] = {
+            'peticiones': len(valores),
+            'errores': errores[ruta],
+            'por_segundo': round(len(valores) / segundos, 2),
+            'p50_ms': round(percentil(valores, 50), 1) if valores else None,
+            'p95_ms': round(percentil(valores, 95), 1) if valores else None,
+            'p99_ms': round(percentil(valores, 99), 1) if valores else None,
+            'max_ms': round(valores[-1], 1) if valores else None,
+        }
+    todas = sorted(v for valores in latencias.values() for v in valores)
+    total = {
+        'peticiones': len(todas),
+        'errores': sum(errores.values()),
+        'por_segundo': round(len(todas) / segundos, 2),
+        'p50_ms': round(percentil(todas, 50), 1) if todas else None,
+        'p95_ms': round(percentil(todas, 95), 1) if todas else None,
+        'p99_ms': round(percentil(todas, 99), 1) if todas else None,
+    }
+    return {'rutas': rutas, 'total': total}
+
+
+def ejecutar_carga(url, usuarios=USUARIOS, duracion=DURACION_S, calentamiento=CALENTAMIENTO_S,
+                   pausa_ms=PAUSA_MS, exportaciones=EXPORTACIONES, escenarios=None, semilla=SEMILLA):
+    """Lanza los usuarios y exportaciones contra `url` y devuelve el resumen por ruta."""
+    escenarios = escenarios or ESCENARIOS
+    ahora = time.monotonic()
+    desde, fin = ahora + calentamiento, ahora + calentamiento + duracion
+
+    registros, hilos = [], []
+    for n in range(usuarios):
+        registro = Registro(desde)
+        registros.append(registro)
+        hilos.append(threading.Thread(
+            target=_usuario, args=(url, registro, random.Random(semilla + n), escenarios, fin, pausa_ms), daemon=True
+        ))
+    for _ in range(exportaciones):
+        registro = Registro(desde)
+        registros.append(registro)
+        hilos.append(threading.Thread(target=_exportador, args=(url, registro, fin), daemon=True))
+
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    # Una exportación que termina tarde alarga la prueba: el rendimiento se mide sobre lo real
+    return resumir(registros, max(time.monotonic() - desde, duracion))
+
+
+def _esperar_servidor(url, proceso, limite=TIEMPO_ARRANQUE_S):
+    partes = urlsplit(url)
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó al arrancar (código {proceso.returncode})")
+        try:
+            conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=5)
+            conexion.request('GET', '/')
+            if conexion.getresponse().status < 500:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"La aplicación no respondió en {limite} s")
+
+
+def leer_modelo(texto):
+    """'sync:4' o 'gthread:2x8' -> {'clase', 'workers', 'hilos'}."""
+    try:
+        clase, tamano = texto.split(':')
+        workers, _, hilos = tamano.partition('x')
+        return {'clase': clase, 'workers': int(workers), 'hilos': int(hilos or 1)}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Modelo no válido: '{texto}' (se espera clase:workers[xhilos])")
+
+
+def arrancar_gunicorn(modelo, puerto, base_datos):
+    entorno = {**os.environ, 'MONGO_DB': base_datos}
+    orden = [
+        sys.executable, '-m', 'gunicorn', 'main:app', '-c', os.path.join(RAIZ, 'gunicorn.conf.py'),
+        '--bind', f'127.0.0.1:{puerto}', '--workers', str(modelo['workers']),
+        '--worker-class', modelo['clase'], '--threads', str(modelo['hilos']), '--timeout', '300',
+    ]
+    return subprocess.Popen(orden, cwd=RAIZ, env=entorno)
+
+
+def parar_gunicorn(proceso):
+    if proceso.poll() is None:
+        proceso.send_signal(signal.SIGTERM)
+        try:
+            proceso.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+            proceso.wait()
+
+
+def cargar_datos(reservas, base_datos, semilla):
+    # Se importa aquí: solo hace falta acceso directo a MongoDB si se cargan datos
+    import tempfile
+    from benchmarks.servicios import cargar_escala
+    config.MONGO_DB = base_datos
+    conteos, tiempos = cargar_escala(reservas, os.path.join(tempfile.gettempdir(), 'jocrol_carga', str(reservas)), semilla)
+    logging.info(f"Datos cargados en '{base_datos}' en {tiempos['carga_s']:.1f} s: {conteos}")
+    return conteos
+
+
+def imprimir(nombre, resumen):
+    logging.info(f"== {nombre} ==")
+    logging.info(f"{'ruta':<32} {'peticiones':>10} {'errores':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for ruta, datos in list(resumen['rutas'].items()) + [('TOTAL', resumen['total'])]:
+        logging.info(
+            f"{ruta:<32} {datos['peticiones']:>10} {datos['errores']:>8} {datos['por_segundo']:>8.1f} "
+            + ' '.join(f"{datos[p]:>8.1f}" if datos[p] is not None else f"{'-':>8}" for p in ('p50_ms', 'p95_ms', 'p99_ms'))
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pruebas de carga de la aplicación bajo gunicorn.')
+    parser.add_argument('--url', help='Aplicación ya arrancada; si no se indica, se arranca gunicorn')
+    parser.add_argument('--modelo', type=leer_modelo, nargs='+', default=[leer_modelo('sync:2')],
+                        help="Modelos de workers de gunicorn a comparar: clase:workers[xhilos], p. ej. gthread:2x8")
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--usuarios', type=int, default=USUARIOS, help='Usuarios simultáneos')
+    parser.add_argument('--duracion', type=int, default=DURACION_S, help='Segundos medidos por modelo')
+    parser.add_argument('--calentamiento', type=int, default=CALENTAMIENTO_S, help='Segundos iniciales sin medir')
+    parser.add_argument('--pausa-ms', type=int, default=PAUSA_MS, help='Pausa media entre escenarios de un usuario')
+    parser.add_argument('--exportaciones', type=int, default=EXPORTACIONES, help='Exportaciones a Excel simultáneas')
+    parser.add_argument('--escenarios', nargs='+', choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    parser.add_argument('--base-datos', default=BASE_DATOS, help='Base de datos que usa la aplicación arrancada')
+    parser.add_argument('--cargar', type=int, metavar='RESERVAS', help='Borra la base de datos y carga datos sintéticos')
+    parser.add_argument('--forzar', action='store_true', help='Permite usar la base de datos de la aplicación')
+    parser.add_argument('--salida', help='Fichero JSON de resultados (por defecto en benchmarks/resultados/)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
+    # Con --url solo se toca la base de datos si se cargan datos
+    if (args.cargar or not args.url) and args.base_datos == config.MONGO_DB and not args.forzar:
+        logging.error(f"'{args.base_datos}' es la base de datos de la aplicación: usa otra o añade --forzar.")
+        return 2
+
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'usuarios': args.usuarios,
+        'duracion_s': args.duracion,
+        'pausa_ms': args.pausa_ms,
+        'exportaciones': args.exportaciones,
+        'escenarios': {nombre: ESCENARIOS[nombre] for nombre in args.escenarios},
+        'datos': cargar_datos(args.cargar, args.base_datos, args.semilla) if args.cargar else None,
+        'modelos': {},
+    }
+    parametros = dict(
+        usuarios=args.usuarios, duracion=args.duracion, calentamiento=args.calentamiento, pausa_ms=args.pausa_ms,
+        exportaciones=args.exportaciones, escenarios=resultado['escenarios'], semilla=args.semilla,
+    )
+
+    if args.url:
+        resultado['modelos']['externo'] = ejecutar_carga(args.url, **parametros)
+        imprimir(args.url, resultado['modelos']['externo'])
+    else:
+        url = f'http://127.0.0.1:{args.puerto}'
+        for modelo in args.modelo:
+            nombre = f"{modelo['clase']}:{modelo['workers']}x{modelo['hilos']}"
+            logging.info(f"Arrancando gunicorn ({nombre})...")
+            proceso = arrancar_gunicorn(modelo, args.puerto, args.base_datos)
+            try:
+                _esperar_servidor(url, proceso)
+                resultado['modelos'][nombre] = {**modelo, **ejecutar_carga(url, **parametros)}
+            finally:
+                parar_gunicorn(proceso)
+            imprimir(nombre, resultado['modelos'][nombre])
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS, f"carga-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    logging.info(f"Resultados en {salida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import uuid
+from datetime import date, timedelta
+from itertools import accumulate
+
+# Generador de datos sintéticos con la forma de los ficheros de data/*.json (los que lee
+# python -m data.migration). Con la misma semilla y escala produce siempre los mismos
+# datos. La escala es el número de reservas; el resto de colecciones crece en proporción
+# (un cliente por cada 20 reservas, un lanzamiento por cada 200, ...). Los ficheros se
+# escriben documento a documento, así que 1M de reservas no se cargan en memoria.
+#
+#   python -m benchmarks.generar_datos 100000 --salida /tmp/jocrol_100k [--semilla 42]
+SEMILLA = 42
+FECHA_BASE = date(2025, 1, 1)
+
+JUEGOS = {
+    'Magic': ('#D8A03D', ['Secret Lair', 'Edges of Eternities', "Marvel's Spiderman", 'Avatar', 'Foundations', 'Aetherdrift']),
+    'One Piece': ('#E24A4A', ['Extras', 'Starter Deck', 'EB03', 'OP12', 'OP13', 'OP14', 'PRB02']),
+    'Final Fantasy': ('#4A90E2', ['Starter Deck', 'Gunslinger in the Abyss']),
+    'Dragon Ball': ('#F5A623', ['FB06', 'FB07']),
+    'Digimon': ('#4A4AE2', ['BT23', 'BT24']),
+    'Lorcana': ('#7B64A3', ['Fabled', 'Archazia']),
+    'Gundam': ('#C0C0C0', ['GD02', 'GD03', 'Starter Deck']),
+    'Riftbound': ('#50E3C2', ['Origins (Set One)', 'Starter Deck']),
+}
+# (tipo de producto, precio mínimo, precio máximo)
+TIPOS_LANZAMIENTO = [
+    ('Caja de sobres', 90, 200), ('Bundle', 40, 60), ('Caja de sobres Collector', 250, 400),
+    ('Caja de escena', 20, 35), ('Mazos de commander', 45, 60), ('Starter Deck', 10, 20),
+    ('Gift Bundle', 50, 70), ('Double Pack', 15, 25), ('Case', 500, 1200),
+]
+TIPOS_EVENTO = ['Prerelease', 'Torneo semanal', 'Comm Party', 'Draft', 'Store Championship']
+NOMBRES = ['Ana', 'Luis', 'Marta', 'Javi', 'Lucía', 'Pablo', 'Sara', 'Dani', 'Elena', 'Hugo',
+           'Irene', 'Álvaro', 'Nuria', 'Óscar', 'Carmen', 'Rubén', 'Alba', 'Iván', 'Noelia', 'Sergio']
+APELLIDOS = ['García', 'Pérez', 'López', 'Martín', 'Sánchez', 'Gómez', 'Ruiz', 'Díaz', 'Muñoz',
+             'Álvarez', 'Romero', 'Navarro', 'Torres', 'Domínguez', 'Gil', 'Vázquez', 'Ramos']
+ESTADOS = ['Pendiente', 'Confirmado', 'Entregado', 'Cancelado']
+PESOS_ESTADOS = [30, 45, 20, 5]
+TIPOS_PAGO = ['Efectivo', 'Visa', 'paygold', None]
+
+
+def tamanos(reservas):
+    """Número de documentos de cada colección para una escala de `reservas`."""
+    return {
+        'reservas': reservas,
+        'clientes': max(reservas // 20, 50),
+        'lanzamientos': max(reservas // 200, 20),
+        'eventos': max(reservas // 500, 10),
+        'staff': 5,
+    }
+
+
+class Generador:
+    def __init__(self, reservas, semilla=SEMILLA, fecha_base=FECHA_BASE):
+        self.rng = random.Random(semilla)
+        self.tamanos = tamanos(reservas)
+        self.fecha_base = fecha_base
+        # Productos y clientes guardan solo lo que necesitan las reservas
+        self.productos = []  # (tipo, id, fecha, precio, precio_reserva)
+        self.clientes = []
+
+    def _id(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _fecha(self, dias_antes, dias_despues, base=None):
+        base = base or self.fecha_base
+        return base + timedelta(days=self.rng.randint(-dias_antes, dias_despues))
+
+    def juegos_colecciones(self):
+        return {'juegos': {nombre: {'color': color, 'colecciones': list(colecciones)}
+                           for nombre, (color, colecciones) in JUEGOS.items()}}
+
+    def generar_clientes(self):
+        for n in range(self.tamanos['clientes']):
+            nombre = f"{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}"
+            cliente_id = self._id()
+            self.clientes.append(cliente_id)
+            usuario = nombre.lower().replace(' ', '.')
+            yield {
+                'id': cliente_id,
+                'nombre': nombre,
+                'email': f"{usuario}.{n}@ejemplo.com" if self.rng.random() < 0.8 else '',
+                'telefono': str(600000000 + n),
+            }
+
+    def generar_lanzamientos(self):
+        for _ in range(self.tamanos['lanzamientos']):
+            juego = self.rng.choice(list(JUEGOS))
+            coleccion = self.rng.choice(JUEGOS[juego][1])
+            tipo, minimo, maximo = self.rng.choice(TIPOS_LANZAMIENTO)
+            fecha_salida = self._fecha(365, 180)
+            precio = round(self.rng.uniform(minimo, maximo), 2)
+            precio_reserva = self.rng.choice([0.0, 0.0, 5.0, 10.0, 20.0])
+            lanzamiento_id = self._id()
+            self.productos.append(('lanzamiento', lanzamiento_id, fecha_salida, precio, precio_reserva))
+            yield {
+                'id': lanzamiento_id,
+                'nombre': tipo,
+                'juego': juego,
+                'coleccion': coleccion,
+                'fecha_salida': fecha_salida.isoformat(),
+                'fecha_envio': (fecha_salida - timedelta(days=self.rng.choice([0, 3, 7]))).isoformat(),
+                'precio': precio,
+                'reserva': precio_reserva,
+                'tipo': tipo,
+                'comentario': '',
+            }
+
+    def generar_eventos(self):
+        for _ in range(self.tamanos['eventos']):
+            juego = self.rng.choice(list(JUEGOS))
+            fecha = self._fecha(365, 180)
+            precio = float(self.rng.choice([0, 5, 10, 15, 25]))
+            evento_id = self._id()
+            self.productos.append(('evento', evento_id, fecha, precio, 0.0))
+            yield {
+                'id': evento_id,
+                'nombre': f"{self.rng.choice(TIPOS_EVENTO)} {juego}",
+                'juego': juego,
+                'coleccion': '',
+                'fecha_salida': fecha.isoformat(),
+                'precio': precio,
+                'reserva': 0.0,
+                'tipo': 'Evento',
+                'comentario': '',
+                'fecha': fecha.isoformat(),
+            }
+
+    def generar_staff(self):
+        for n in range(self.tamanos['staff']):
+            yield {'id': self._id(), 'nombre': f"Staff {n + 1}", 'email': f"staff{n + 1}@ejemplo.com"}
+
+    def generar_reservas(self):
+        # Popularidad tipo Zipf: unos pocos productos y clientes concentran las reservas
+        pesos_productos = list(accumulate(1 / (i + 1) for i in range(len(self.productos))))
+        pesos_clientes = list(accumulate(1 / (i + 1) ** 0.7 for i in range(len(self.clientes))))
+        for _ in range(self.tamanos['reservas']):
+            tipo, producto_id, fecha_producto, precio, precio_reserva = self.rng.choices(
+                self.productos, cum_weights=pesos_productos)[0]
+            cliente_id = self.rng.choices(self.clientes, cum_weights=pesos_clientes)[0]
+            cantidad = self.rng.choices([1, 2, 3, 4], weights=[70, 20, 7, 3])[0]
+            total = precio * cantidad + precio_reserva
+            pagado = round(self.rng.choice([0.0, precio_reserva, total / 2, total]), 2)
+            yield {
+                'id': self._id(),
+                'cliente_id': cliente_id,
+                'lanzamiento_id': producto_id if tipo == 'lanzamiento' else None,
+                'evento_id': producto_id if tipo == 'evento' else None,
+                'cantidad': cantidad,
+                'fecha_reserva': self._fecha(90, 0, fecha_producto).isoformat(),
+                'estado': self.rng.choices(ESTADOS, weights=PESOS_ESTADOS)[0],
+                'pagado': pagado,
+                'tipo_pago': self.rng.choice(TIPOS_PAGO) if pagado else None,
+                'notas': '',
+                'pago_completo': pagado >= total,
+            }
+
+
+def escribir_array(ruta, documentos):
+    """Escribe un array JSON documento a documento. Devuelve cuántos se escribieron."""
+    total = 0
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for doc in documentos:
+            f.write(',\n  ' if total else '\n  ')
+            json.dump(doc, f, ensure_ascii=False)
+            total += 1
+        f.write('\n]\n')
+    return total
+
+
+def generar(reservas, salida, semilla=SEMILLA):
+    """Genera los ficheros JSON de una escala en la carpeta `salida`. Devuelve {coleccion: documentos}."""
+    os.makedirs(salida, exist_ok=True)
+    generador = Generador(reservas, semilla)
+    with open(os.path.join(salida, 'juegos_colecciones.json'), 'w', encoding='utf-8') as f:
+        json.dump(generador.juegos_colecciones(), f, ensure_ascii=False, indent=4)
+
+    # El orden importa: las reservas eligen entre los clientes y productos ya generados
+    conteos = {'juegos_colecciones': len(JUEGOS)}
+    for coleccion, documentos in [
+        ('clientes', generador.generar_clientes()),
+        ('lanzamientos', generador.generar_lanzamientos()),
+        ('eventos', generador.generar_eventos()),
+        ('staff', generador.generar_staff()),
+        ('reservas', generador.generar_reservas()),
+    ]:
+        conteos[coleccion] = escribir_array(os.path.join(salida, f'{coleccion}.json'), documentos)
+    return conteos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera datos sintéticos con la forma de data/*.json.')
+    parser.add_argument('reservas', type=int, help='Número de reservas (escala), p. ej. 1000 o 1000000')
+    parser.add_argument('--salida', required=True, help='Carpeta donde escribir los ficheros JSON')
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    for coleccion, total in generar(args.reservas, args.salida, args.semilla).items():
+        logging.info(f"{coleccion}: {total} documentos")
+    logging.info(f"Para cargarlos: python -m data.migration --directorio {args.salida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import config
+from benchmarks.generar_datos import FECHA_BASE, SEMILLA, generar
+from data.catalogo import invalidar_catalogo
+from data.data_manager import obtener_cliente
+from data.migration import migrar
+from modules.clientes.services import obtener_clientes_paginados
+from modules.export.excel import generar_excel
+from modules.lanzamientos.services import obtener_lanzamientos_filtrados
+from modules.main.services import obtener_eventos_calendario
+from modules.reservas.services import obtener_reservas_filtradas
+
+# Benchmarks de los servicios principales contra un mongod local con datos sintéticos
+# (benchmarks/generar_datos.py). Para cada escala se generan los datos, se cargan con
+# data.migration en una base de datos de pruebas (que se borra antes) y se mide cada
+# caso varias veces. El resultado se guarda en JSON para comparar ejecuciones.
+#
+#   python -m benchmarks.servicios [--escalas 1000 10000] [--comparar resultados/anterior.json]
+#
+# Los datos se cargan en --base-datos ('jocrol_bench' por defecto), que se borra en cada
+# escala; la base de datos de la aplicación (MONGO_DB) solo se acepta con --forzar.
+ESCALAS = [1000, 10000, 100000, 1000000]
+BASE_DATOS = 'jocrol_bench'
+REPETICIONES = 5
+CALENTAMIENTO = 1
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+
+
+def _ventana(dias_antes, dias_despues):
+    return ((FECHA_BASE - timedelta(days=dias_antes)).isoformat(),
+            (FECHA_BASE + timedelta(days=dias_despues)).isoformat())
+
+
+def _exportar_excel():
+    generar_excel().close()
+
+
+def _casos():
+    """Lista de (nombre, función sin argumentos, pesado). Los pesados se miden una sola vez."""
+    mes = _ventana(0, 30)
+    semanas = _ventana(7, 35)
+    return [
+        ('reservas_sin_filtros', lambda: obtener_reservas_filtradas({}), False),
+        ('reservas_pendientes_mes', lambda: obtener_reservas_filtradas(
+            {'payment_status': 'pendiente', 'start_date': mes[0], 'end_date': mes[1]}), False),
+        ('reservas_busqueda', lambda: obtener_reservas_filtradas({'q': 'garcia'}), False),
+        ('reservas_orden_cliente', lambda: obtener_reservas_filtradas({'sort_by': 'cliente', 'sort_order': 'asc'}), False),
+        ('reservas_pagina_100', lambda: obtener_reservas_filtradas({'page': 100}), False),
+        ('clientes_paginados', lambda: obtener_clientes_paginados({}), False),
+        ('clientes_busqueda', lambda: obtener_clientes_paginados({'q': 'martin'}), False),
+        ('lanzamientos_todos', lambda: obtener_lanzamientos_filtrados({}), False),
+        ('lanzamientos_juego_mes', lambda: obtener_lanzamientos_filtrados(
+            {'juego': 'Magic', 'start_date': mes[0], 'end_date': mes[1]}), False),
+        ('calendario_ventana', lambda: obtener_eventos_calendario(*semanas), False),
+        ('calendario_completo', lambda: obtener_eventos_calendario(), False),
+        ('exportar_excel', _exportar_excel, True),
+    ]
+
+
+def medir(funcion, repeticiones=REPETICIONES, calentamiento=CALENTAMIENTO):
+    """Ejecuta `funcion` y devuelve las estadísticas de sus tiempos en milisegundos."""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'repeticiones': repeticiones,
+        'min_ms': round(tiempos[0], 3),
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+        'media_ms': round(statistics.fmean(tiempos), 3),
+        'max_ms': round(tiempos[-1], 3),
+    }
+
+
+def _revision_git():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(DIRECTORIO_RESULTADOS)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cargar_escala(reservas, directorio, semilla=SEMILLA):
+    """Genera los datos de una escala y los carga en una base de datos vacía. Devuelve (conteos, segundos)."""
+    inicio = time.perf_counter()
+    conteos = generar(reservas, directorio, semilla)
+    generacion_s = time.perf_counter() - inicio
+
+    obtener_cliente().drop_database(config.MONGO_DB)
+    inicio = time.perf_counter()
+    migrar(directorio=directorio, reiniciar=True)
+    carga_s = time.perf_counter() - inicio
+    invalidar_catalogo()
+    return conteos, {'generacion_s': round(generacion_s, 3), 'carga_s': round(carga_s, 3)}
+
+
+def ejecutar(escalas, directorio, semilla=SEMILLA, repeticiones=REPETICIONES, omitir=()):
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'revision': _revision_git(),
+        'python': platform.python_version(),
+        'mongodb': obtener_cliente().server_info().get('version'),
+        'base_datos': config.MONGO_DB,
+        'semilla': semilla,
+        'escalas': {},
+    }
+    for reservas in escalas:
+        logging.info(f"Escala {reservas} reservas: generando y cargando datos...")
+        conteos, tiempos_carga = cargar_escala(reservas, os.path.join(directorio, str(reservas)), semilla)
+        casos = {}
+        for nombre, funcion, pesado in _casos():
+            if nombre in omitir:
+                continue
+            casos[nombre] = medir(funcion, 1 if pesado else repeticiones, 0 if pesado else CALENTAMIENTO)
+            logging.info(f"  {nombre}: mediana {casos[nombre]['mediana_ms']:.1f} ms, p95 {casos[nombre]['p95_ms']:.1f} ms")
+        resultado['escalas'][str(reservas)] = {'documentos': conteos, **tiempos_carga, 'casos': casos}
+    return resultado
+
+
+def comparar(actual, anterior):
+    """Líneas con la mediana de cada caso frente a la de una ejecución anterior."""
+    lineas = []
+    for escala, datos in actual['escalas'].items():
+        casos_anteriores = anterior.get('escalas', {}).get(escala, {}).get('casos', {})
+        for nombre, estadisticas in datos['casos'].items():
+            previo = casos_anteriores.get(nombre)
+            if not previo or not previo['mediana_ms']:
+                continue
+            ratio = estadisticas['mediana_ms'] / previo['mediana_ms']
+            lineas.append(
+                f"{escala:>8} {nombre:<26} {previo['mediana_ms']:>10.1f} ms -> {estadisticas['mediana_ms']:>10.1f} ms  x{ratio:.2f}"
+            )
+    return lineas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de los servicios con datos sintéticos.')
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS, help='Números de reservas a probar')
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--omitir', nargs='*', default=[], help='Casos que no se miden, p. ej. exportar_excel')
+    parser.add_argument('--base-datos', default=BASE_DATOS, help='Base de datos de pruebas (se borra)')
+    parser.add_argument('--forzar', action='store_true', help='Permite usar la base de datos de la aplicación')
+    parser.add_argument('--datos', default=os.path.join(tempfile.gettempdir(), 'jocrol_bench'),
+                        help='Carpeta para los ficheros JSON generados')
+    parser.add_argument('--salida', help='Fichero JSON de resultados (por defecto en benchmarks/resultados/)')
+    parser.add_argument('--comparar', help='Resultados anteriores con los que comparar')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    if args.base_datos == config.MONGO_DB and not args.forzar:
+        logging.error(f"'{args.base_datos}' es la base de datos de la aplicación: usa otra o añade --forzar.")
+        return 2
+    # Antes de la primera consulta: obtener_db() lee config.MONGO_DB en cada llamada
+    config.MONGO_DB = args.base_datos
+
+    resultado = ejecutar(args.escalas, args.datos, args.semilla, args.repeticiones, set(args.omitir))
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS, f"servicios-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    logging.info(f"Resultados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+        for linea in comparar(resultado, anterior):
+            logging.info(linea)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import re
+import unicodedata
+
+# Claves de búsqueda: cada documento guarda en 'busqueda' los prefijos normalizados
+# (sin tildes y en minúsculas) de las palabras de sus campos de texto. Con un índice
+# multikey sobre ese campo, buscar "pokemon" o "garcia" encuentra "Pokémon" o "García"
+# sin recorrer la colección con $regex. La búsqueda es por prefijo de palabra.
+CAMPO_BUSQUEDA = 'busqueda'
+LONGITUD_MAXIMA_PREFIJO = 15
+
+CAMPOS_BUSQUEDA = {
+    'clientes': ('nombre', 'email', 'telefono'),
+    'lanzamientos': ('nombre', 'coleccion', 'juego'),
+    'eventos': ('nombre', 'coleccion', 'juego'),
+}
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes, diéresis ni virgulilla (ñ -> n) y sin signos de puntuación."""
+    if texto is None:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def palabras(texto):
+    return normalizar(texto).split()
+
+
+def generar_claves(*textos):
+    claves = set()
+    for texto in textos:
+        for palabra in palabras(texto):
+            for i in range(1, min(len(palabra), LONGITUD_MAXIMA_PREFIJO) + 1):
+                claves.add(palabra[:i])
+    return sorted(claves)
+
+
+def claves_documento(coleccion, documento):
+    """Claves de búsqueda de un documento según los campos declarados para su colección."""
+    return generar_claves(*(documento.get(campo) for campo in CAMPOS_BUSQUEDA[coleccion]))
+
+
+def filtro_busqueda(q):
+    """
+    Filtro de MongoDB para el texto `q`: todas sus palabras deben ser prefijo de alguna
+    palabra del documento. Devuelve None si `q` no contiene palabras.
+    """
+    prefijos = [palabra[:LONGITUD_MAXIMA_PREFIJO] for palabra in palabras(q)]
+    if not prefijos:
+        return None
+    return {CAMPO_BUSQUEDA: {'$all': sorted(set(prefijos))}}
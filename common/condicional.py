@@ -0,0 +1,41 @@
+import hashlib
+from flask import request, Response
+from data.catalogo import sello_catalogo
+from data.versiones import obtener_versiones
+
+def respuesta_condicional(colecciones, generar, variante=''):
+    """
+    Responde con 304 si el cliente ya tiene la versión actual de los datos.
+    `colecciones` son las colecciones de las que depende la respuesta y `generar`
+    una función sin argumentos que construye la respuesta completa; solo se llama
+    si los datos han cambiado. `variante` distingue respuestas del mismo endpoint
+    (p. ej. la ventana de fechas del calendario).
+    """
+    versiones = obtener_versiones(colecciones)
+    if 'juegos_colecciones' in versiones:
+        # El catálogo sale de la caché del worker: el ETag usa el sello con que se cargó
+        versiones['juegos_colecciones']['version'] = sello_catalogo()
+    firma = '|'.join(f"{c}:{versiones[c]['version']}" for c in sorted(versiones))
+    etag = hashlib.sha1(f"{firma}|{variante}".encode('utf-8')).hexdigest()
+    fechas = [v['modificado'] for v in versiones.values() if v['modificado']]
+    modificado = max(fechas).replace(microsecond=0) if fechas else None
+
+    if request.if_none_match:
+        no_modificado = request.if_none_match.contains(etag)
+    else:
+        desde = request.if_modified_since
+        no_modificado = bool(modificado and desde and modificado <= desde.replace(tzinfo=None))
+
+    if no_modificado:
+        respuesta = Response(status=304)
+    else:
+        respuesta = generar()
+        if respuesta.status_code != 200:
+            # Los errores no llevan validadores para que no se reutilicen
+            return respuesta
+    respuesta.set_etag(etag)
+    if modificado:
+        respuesta.last_modified = modificado
+    # El navegador debe revalidar siempre, pero puede reutilizar el cuerpo si recibe un 304
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
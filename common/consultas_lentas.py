@@ -0,0 +1,225 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from flask import has_request_context, request
+from pymongo import DESCENDING, monitoring
+from pymongo.errors import CollectionInvalid, PyMongoError
+import config
+from data.data_manager import db, obtener_cliente, registrar_listener
+
+# Registro de consultas lentas con su plan de ejecución. Un CommandListener mide cada
+# lectura (find, aggregate, count, distinct); si supera CONSULTAS_LENTAS_UMBRAL_MS se
+# repite con explain en un hilo aparte y se guarda el plan ganador (COLLSCAN/IXSCAN,
+# índice usado, documentos examinados frente a devueltos) en una colección limitada
+# (capped), junto con la ruta que la lanzó. La misma consulta (colección, comando y
+# ruta) se explica como mucho una vez cada CONSULTAS_LENTAS_INTERVALO_S.
+#
+#   python -m common.consultas_lentas [--limite 20]   (resumen agrupado)
+COLECCION = 'consultas_lentas'
+COMANDOS_EXPLICABLES = ('find', 'aggregate', 'count', 'distinct')
+# Explains pendientes a partir de los cuales se descartan las muestras nuevas
+MAXIMO_PENDIENTES = 20
+# Campos del comando que no forman parte de la consulta (sesión, réplica, etc.)
+CAMPOS_SESION = ('lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern')
+# El comando se guarda como texto JSON (los operadores '$' no son nombres de campo válidos)
+LONGITUD_MAXIMA_COMANDO = 10000
+
+_lock = threading.Lock()
+_executor = None
+_pid_executor = None
+_pendientes = 0
+_ultimo_explain = {}
+_coleccion_creada = False
+
+
+def _obtener_executor():
+    global _executor, _pid_executor
+    pid = os.getpid()
+    if _executor is None or _pid_executor != pid:
+        with _lock:
+            if _executor is None or _pid_executor != pid:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+                _pid_executor = pid
+    return _executor
+
+
+def _ahora():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _asegurar_coleccion():
+    global _coleccion_creada
+    if _coleccion_creada:
+        return
+    try:
+        db.create_collection(COLECCION, capped=True, size=config.CONSULTAS_LENTAS_TAMANO_MB * 1024 * 1024)
+    except CollectionInvalid:
+        pass  # ya existe
+    _coleccion_creada = True
+
+
+def _limpiar_comando(comando):
+    return {k: v for k, v in comando.items() if not k.startswith('$') and k not in CAMPOS_SESION}
+
+
+def _recorrer_plan(plan, etapas, indices):
+    if not isinstance(plan, dict):
+        return
+    plan = plan.get('queryPlan', plan)  # motor SBE (MongoDB 7+)
+    if 'stage' in plan:
+        etapas.append(plan['stage'])
+    if plan.get('indexName'):
+        indices.append(plan['indexName'])
+    for clave in ('inputStage', 'outerStage', 'innerStage'):
+        _recorrer_plan(plan.get(clave), etapas, indices)
+    for hijo in plan.get('inputStages', []):
+        _recorrer_plan(hijo, etapas, indices)
+
+
+def resumir_explain(explain):
+    """Resume la salida de explain: etapas e índices del plan ganador y contadores de ejecución."""
+    # En un aggregate el plan de la consulta inicial está en la etapa $cursor
+    for etapa in explain.get('stages', []):
+        if '$cursor' in etapa:
+            explain = etapa['$cursor']
+            break
+    etapas, indices = [], []
+    _recorrer_plan(explain.get('queryPlanner', {}).get('winningPlan'), etapas, indices)
+    estadisticas = explain.get('executionStats', {})
+    return {
+        'etapas': etapas,
+        'indices': indices,
+        'collscan': 'COLLSCAN' in etapas,
+        'devueltos': estadisticas.get('nReturned'),
+        'docs_examinados': estadisticas.get('totalDocsExamined'),
+        'claves_examinadas': estadisticas.get('totalKeysExamined'),
+        'tiempo_explain_ms': estadisticas.get('executionTimeMillis'),
+    }
+
+
+def _explicar(muestra):
+    global _pendientes
+    try:
+        comando = muestra.pop('comando_bson')
+        escribe = any('$out' in etapa or '$merge' in etapa for etapa in comando.get('pipeline', []))
+        # Con $out/$merge, executionStats ejecutaría la escritura: solo se pide el plan
+        verbosidad = 'queryPlanner' if escribe else 'executionStats'
+        try:
+            explain = obtener_cliente()[muestra['base_datos']].command('explain', comando, verbosity=verbosidad)
+            muestra['plan'] = resumir_explain(explain)
+        except PyMongoError as e:
+            muestra['error'] = str(e)
+        _asegurar_coleccion()
+        db[COLECCION].insert_one(muestra)
+    except Exception as e:
+        logging.error(f"No se pudo registrar la consulta lenta: {e}")
+    finally:
+        with _lock:
+            _pendientes -= 1
+
+
+class _MonitorConsultas(monitoring.CommandListener):
+    """Guarda las lecturas en curso y manda a explicar las que superan el umbral."""
+
+    def __init__(self):
+        self._en_curso = {}
+
+    def started(self, event):
+        if event.command_name not in COMANDOS_EXPLICABLES:
+            return
+        ruta = None
+        if has_request_context():
+            ruta = {'metodo': request.method, 'ruta': request.path, 'endpoint': request.endpoint}
+        self._en_curso[(event.connection_id, event.request_id)] = (event.database_name, dict(event.command), ruta)
+
+    def failed(self, event):
+        self._en_curso.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        global _pendientes
+        datos = self._en_curso.pop((event.connection_id, event.request_id), None)
+        if datos is None or event.duration_micros < config.CONSULTAS_LENTAS_UMBRAL_MS * 1000:
+            return
+        base_datos, comando, ruta = datos
+        coleccion = comando.get(event.command_name)
+        forma = (coleccion, event.command_name, (ruta or {}).get('endpoint'))
+
+        ahora = time.monotonic()
+        with _lock:
+            if ahora - _ultimo_explain.get(forma, float('-inf')) < config.CONSULTAS_LENTAS_INTERVALO_S:
+                return
+            if _pendientes >= MAXIMO_PENDIENTES:
+                return
+            _ultimo_explain[forma] = ahora
+            _pendientes += 1
+
+        muestra = {
+            'momento': _ahora(),
+            'base_datos': base_datos,
+            'coleccion': coleccion,
+            'comando_nombre': event.command_name,
+            'comando_bson': _limpiar_comando(comando),
+            'comando': json.dumps(_limpiar_comando(comando), default=str)[:LONGITUD_MAXIMA_COMANDO],
+            'duracion_ms': round(event.duration_micros / 1000, 3),
+            'ruta': ruta,
+            'pid': os.getpid(),
+        }
+        _obtener_executor().submit(_explicar, muestra)
+
+
+def activar():
+    """Registra el listener. Debe llamarse antes de la primera consulta a MongoDB."""
+    registrar_listener(_MonitorConsultas())
+    logging.info(f"Registro de consultas lentas activado (umbral {config.CONSULTAS_LENTAS_UMBRAL_MS} ms).")
+
+
+def resumen(limite=20):
+    """Consultas lentas registradas agrupadas por colección, comando, ruta y plan, de peor a mejor."""
+    pipeline = [
+        {'$group': {
+            '_id': {
+                'coleccion': '$coleccion',
+                'comando': '$comando_nombre',
+                'endpoint': '$ruta.endpoint',
+                'etapas': '$plan.etapas',
+                'indices': '$plan.indices',
+            },
+            'muestras': {'$sum': 1},
+            'duracion_max_ms': {'$max': '$duracion_ms'},
+            'duracion_media_ms': {'$avg': '$duracion_ms'},
+            'docs_examinados': {'$max': '$plan.docs_examinados'},
+            'devueltos': {'$max': '$plan.devueltos'},
+            'ultima': {'$max': '$momento'},
+        }},
+        {'$sort': {'duracion_max_ms': DESCENDING}},
+        {'$limit': limite},
+    ]
+    return list(db[COLECCION].aggregate(pipeline))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resumen del registro de consultas lentas.')
+    parser.add_argument('--limite', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    for fila in resumen(args.limite):
+        clave = fila['_id']
+        plan = ' > '.join(clave.get('etapas') or []) or 'sin plan'
+        indices = ', '.join(clave.get('indices') or []) or '-'
+        logging.info(
+            f"{clave.get('coleccion')}.{clave.get('comando')} [{clave.get('endpoint') or 'fuera de petición'}] "
+            f"{fila['muestras']} muestras, máx {fila['duracion_max_ms']:.1f} ms, media {fila['duracion_media_ms']:.1f} ms | "
+            f"plan {plan} (índices: {indices}) | examinados {fila['docs_examinados']} / devueltos {fila['devueltos']}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import functools
+import logging
+import os
+import threading
+import time
+from flask import g, request, Response, before_render_template, template_rendered
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from pymongo import monitoring
+from data.data_manager import registrar_listener
+from common.perfilado import exigir_token
+
+# Métricas de Prometheus en /metrics: latencia por blueprint y endpoint, tiempo de
+# render de plantillas, llamadas a servicios, filas importadas/exportadas y estado del
+# pool de MongoDB.
+#
+# Con gunicorn cada worker es un proceso: si PROMETHEUS_MULTIPROC_DIR está definida
+# (lo hace gunicorn.conf.py) cada proceso escribe sus valores en ficheros de esa carpeta
+# y /metrics los suma, así que cualquier worker devuelve los totales de la instancia.
+# Sin la variable (servidor de desarrollo) las métricas son las del propio proceso.
+#
+# /metrics exige el token de PERFILADO_TOKEN, como /api/estado/*: en la configuración
+# de Prometheus, `authorization: {credentials: <token>}` (o bearer_token). Sin token
+# configurado se siguen registrando pero el endpoint responde 404.
+MULTIPROCESO = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# Cubos en segundos: de peticiones servidas desde caché a exportaciones completas
+CUBOS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CUBOS_ESPERA_POOL = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+PETICION_SEGUNDOS = Histogram(
+    'jocrol_peticion_segundos', 'Duración de las peticiones HTTP',
+    ['blueprint', 'endpoint', 'metodo', 'estado'], buckets=CUBOS_LATENCIA
+)
+PLANTILLA_SEGUNDOS = Histogram(
+    'jocrol_plantilla_segundos', 'Tiempo de render de las plantillas Jinja',
+    ['plantilla'], buckets=CUBOS_LATENCIA
+)
+OPERACIONES = Counter(
+    'jocrol_operaciones', 'Llamadas a operaciones de servicio', ['operacion', 'resultado']
+)
+FILAS = Counter(
+    'jocrol_filas_procesadas', 'Filas procesadas en importaciones y exportaciones', ['operacion', 'coleccion']
+)
+POOL_EN_USO = Gauge(
+    'jocrol_mongo_conexiones_en_uso', 'Conexiones de MongoDB prestadas (checked out)', multiprocess_mode='livesum'
+)
+POOL_ABIERTAS = Gauge(
+    'jocrol_mongo_conexiones_abiertas', 'Conexiones de MongoDB abiertas', multiprocess_mode='livesum'
+)
+POOL_ESPERA_SEGUNDOS = Histogram(
+    'jocrol_mongo_espera_conexion_segundos', 'Espera para obtener una conexión del pool', buckets=CUBOS_ESPERA_POOL
+)
+POOL_FALLOS = Counter(
+    'jocrol_mongo_fallos_checkout', 'Peticiones de conexión al pool que fallaron', ['motivo']
+)
+
+
+def contar_operacion(nombre):
+    """Decorador que cuenta las llamadas a una función de servicio, con su resultado (ok/error)."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            try:
+                resultado = funcion(*args, **kwargs)
+            except Exception:
+                OPERACIONES.labels(nombre, 'error').inc()
+                raise
+            OPERACIONES.labels(nombre, 'ok').inc()
+            return resultado
+        return envoltura
+    return decorador
+
+
+def contar_operacion_diferida(nombre):
+    """
+    Como contar_operacion, para funciones que devuelven un generador (respuestas en
+    streaming): el trabajo ocurre al consumirlo, así que el resultado se registra al
+    terminar (ok), si falla a medias (error) o si se cierra antes de acabar, p. ej.
+    porque el cliente corta la descarga (cortada). Los errores al llamar a la
+    función, antes de empezar a generar, cuentan como error.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            try:
+                generador = funcion(*args, **kwargs)
+            except Exception:
+                OPERACIONES.labels(nombre, 'error').inc()
+                raise
+            return _contar_al_consumir(nombre, generador)
+        return envoltura
+    return decorador
+
+
+def _contar_al_consumir(nombre, generador):
+    resultado = 'error'
+    try:
+        yield from generador
+        resultado = 'ok'
+    except GeneratorExit:
+        resultado = 'cortada'
+        raise
+    finally:
+        OPERACIONES.labels(nombre, resultado).inc()
+
+
+def contar_filas(operacion, coleccion, filas):
+    if filas:
+        FILAS.labels(operacion, coleccion).inc(filas)
+
+
+class _MonitorPoolMetricas(monitoring.ConnectionPoolListener):
+    """Lleva el estado del pool de MongoDB a las métricas de Prometheus."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _fin_espera(self):
+        inicio = getattr(self._local, 'inicio_espera', None)
+        self._local.inicio_espera = None
+        return time.monotonic() - inicio if inicio is not None else None
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        POOL_ABIERTAS.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        POOL_ABIERTAS.dec()
+
+    def connection_check_out_started(self, event):
+        self._local.inicio_espera = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        self._fin_espera()
+        POOL_FALLOS.labels(str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        espera = self._fin_espera()
+        if espera is not None:
+            POOL_ESPERA_SEGUNDOS.observe(espera)
+        POOL_EN_USO.inc()
+
+    def connection_checked_in(self, event):
+        POOL_EN_USO.dec()
+
+
+def _inicio_peticion():
+    g.metricas_inicio = time.perf_counter()
+
+
+def _fin_peticion(response):
+    inicio = g.pop('metricas_inicio', None)
+    if inicio is not None and request.endpoint != 'metricas':
+        PETICION_SEGUNDOS.labels(
+            request.blueprint or '', request.endpoint or 'desconocido', request.method, str(response.status_code)
+        ).observe(time.perf_counter() - inicio)
+    return response
+
+
+def _antes_de_render(app, template, context, **kwargs):
+    g.setdefault('metricas_render', []).append(time.perf_counter())
+
+
+def _despues_de_render(app, template, context, **kwargs):
+    pila = g.get('metricas_render')
+    if pila:
+        PLANTILLA_SEGUNDOS.labels(template.name or 'cadena').observe(time.perf_counter() - pila.pop())
+
+
+def metricas():
+    exigir_token()
+    if MULTIPROCESO:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return Response(generate_latest(registro), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Instrumenta `app` y expone /metrics. Debe llamarse antes de la primera consulta a MongoDB."""
+    registrar_listener(_MonitorPoolMetricas())
+    before_render_template.connect(_antes_de_render, app)
+    template_rendered.connect(_despues_de_render, app)
+    app.before_request(_inicio_peticion)
+    app.after_request(_fin_peticion)
+    app.add_url_rule('/metrics', 'metricas', metricas)
+    logging.info(f"Métricas de Prometheus en /metrics ({'multiproceso' if MULTIPROCESO else 'un proceso'}).")
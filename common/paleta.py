@@ -0,0 +1,70 @@
+import threading
+from data.catalogo import obtener_juegos_y_colecciones, version_catalogo
+
+COLOR_POR_DEFECTO = '#6c757d'
+
+# Tabla (juego, coleccion) -> (juego_color, coleccion_color), materializada una vez
+# por versión del catálogo. La entrada (juego, None) guarda el color del juego para
+# colecciones que no están en el catálogo.
+_lock = threading.Lock()
+_paleta = {}
+_version = None
+
+
+def adjust_color_brightness(hex_color, factor):
+    """
+    Ajusta el brillo de un color hexadecimal.
+    Factor < 1 para oscurecer, > 1 para aclarar.
+    """
+    if not hex_color or not hex_color.startswith('#') or len(hex_color) != 7:
+        return hex_color
+
+    try:
+        r, g, b = int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
+        r = int(max(0, min(255, r * factor)))
+        g = int(max(0, min(255, g * factor)))
+        b = int(max(0, min(255, b * factor)))
+        return f"#{r:02x}{g:02x}{b:02x}"
+    except (ValueError, TypeError):
+        return hex_color
+
+
+def _construir_paleta(juegos):
+    paleta = {}
+    for juego, info in juegos.items():
+        juego_color = info.get('color', COLOR_POR_DEFECTO)
+        paleta[(juego, None)] = (juego_color, juego_color)
+        for idx, coleccion in enumerate(info.get('colecciones', [])):
+            # Cada colección oscurece el color del juego un 10% más que la anterior
+            factor = 1 - ((idx + 1) * 0.1)
+            paleta.setdefault((juego, coleccion), (juego_color, adjust_color_brightness(juego_color, factor)))
+    return paleta
+
+
+def obtener_paleta():
+    global _paleta, _version
+    version = version_catalogo()
+    if version != _version:
+        with _lock:
+            if version != _version:
+                _paleta = _construir_paleta(obtener_juegos_y_colecciones().get('juegos', {}))
+                _version = version
+    return _paleta
+
+
+def colores(juego, coleccion, paleta=None):
+    """Devuelve (juego_color, coleccion_color) para un juego y una colección."""
+    paleta = paleta if paleta is not None else obtener_paleta()
+    return (
+        paleta.get((juego, coleccion))
+        or paleta.get((juego, None))
+        or (COLOR_POR_DEFECTO, COLOR_POR_DEFECTO)
+    )
+
+
+def aplicar_colores(documentos):
+    """Añade 'juego_color' y 'coleccion_color' a cada documento (lanzamiento o evento)."""
+    paleta = obtener_paleta()
+    for doc in documentos:
+        doc['juego_color'], doc['coleccion_color'] = colores(doc.get('juego'), doc.get('coleccion'), paleta)
+    return documentos
@@ -0,0 +1,177 @@
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, deque
+import bson
+from flask import abort, g, jsonify, make_response, request, before_render_template, template_rendered
+from pymongo import monitoring
+import config
+from data.data_manager import registrar_listener
+
+# Perfilado por petición: cuántos comandos de MongoDB lanza cada petición, cuántos
+# documentos y bytes devuelven, cuánto tarda la base de datos y cuánto el render de
+# las plantillas. Se devuelve en la cabecera Server-Timing (visible en las DevTools
+# del navegador) y las peticiones más lentas se guardan en memoria para consultarlas
+# en /api/estado/perfil. Todo es por proceso: cada worker de gunicorn tiene lo suyo.
+#
+# Los eventos de pymongo se emiten en el hilo que lanza el comando, así que el perfil
+# de la petición en curso se guarda en una ContextVar. Los comandos lanzados fuera de
+# una petición (trabajos en segundo plano, índices) no se cuentan.
+_perfil_actual = contextvars.ContextVar('perfil_peticion', default=None)
+
+_lock = threading.Lock()
+_lentas = deque(maxlen=config.PERFILADO_PETICIONES_LENTAS)
+
+
+def _nuevo_perfil():
+    return {
+        'inicio': time.perf_counter(),
+        'comandos': 0,
+        'documentos': 0,
+        'bytes': 0,
+        'db_ms': 0.0,
+        'plantillas_ms': 0.0,
+        'por_comando': Counter(),
+        'render': [],
+    }
+
+
+def _documentos_respuesta(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    if 'n' in reply:
+        return reply['n']
+    return 0
+
+
+class _MonitorComandos(monitoring.CommandListener):
+    """Suma al perfil de la petición en curso cada comando que termina."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        perfil = _perfil_actual.get()
+        if perfil is None:
+            return
+        perfil['comandos'] += 1
+        perfil['db_ms'] += event.duration_micros / 1000
+        perfil['por_comando'][event.command_name] += 1
+        reply = event.reply
+        perfil['documentos'] += _documentos_respuesta(reply)
+        try:
+            perfil['bytes'] += len(bson.encode(reply))
+        except Exception:
+            pass
+
+    def failed(self, event):
+        perfil = _perfil_actual.get()
+        if perfil is None:
+            return
+        perfil['comandos'] += 1
+        perfil['db_ms'] += event.duration_micros / 1000
+        perfil['por_comando'][event.command_name] += 1
+
+
+def _antes_de_render(app, template, context, **kwargs):
+    perfil = _perfil_actual.get()
+    if perfil is not None:
+        perfil['render'].append((time.perf_counter(), perfil['db_ms']))
+
+
+def _despues_de_render(app, template, context, **kwargs):
+    perfil = _perfil_actual.get()
+    if perfil is not None and perfil['render']:
+        inicio, db_ms = perfil['render'].pop()
+        # Las consultas lanzadas durante el render cuentan como base de datos, no como plantilla
+        perfil['plantillas_ms'] += (time.perf_counter() - inicio) * 1000 - (perfil['db_ms'] - db_ms)
+
+
+def _iniciar_perfil():
+    g.perfil_token = _perfil_actual.set(_nuevo_perfil())
+
+
+def _cerrar_perfil(response):
+    perfil = _perfil_actual.get()
+    if perfil is None:
+        return response
+
+    total_ms = (time.perf_counter() - perfil['inicio']) * 1000
+    app_ms = max(total_ms - perfil['db_ms'] - perfil['plantillas_ms'], 0.0)
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={perfil["db_ms"]:.1f};desc="MongoDB ({perfil["comandos"]} comandos, {perfil["documentos"]} docs)"',
+        f'tpl;dur={perfil["plantillas_ms"]:.1f};desc="Plantillas"',
+        f'app;dur={app_ms:.1f};desc="Python"',
+        f'total;dur={total_ms:.1f}',
+    ])
+
+    if total_ms >= config.PERFILADO_UMBRAL_MS:
+        with _lock:
+            _lentas.append({
+                'momento': time.time(),
+                'metodo': request.method,
+                'ruta': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'estado': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(perfil['db_ms'], 2),
+                'plantillas_ms': round(perfil['plantillas_ms'], 2),
+                'comandos': perfil['comandos'],
+                'documentos': perfil['documentos'],
+                'bytes': perfil['bytes'],
+                'por_comando': dict(perfil['por_comando']),
+            })
+    return response
+
+
+def _limpiar_perfil(exc=None):
+    token = g.pop('perfil_token', None)
+    if token is not None:
+        _perfil_actual.reset(token)
+
+
+def peticiones_lentas(limite=None):
+    """Las peticiones perfiladas de este proceso, de la más lenta a la más rápida."""
+    with _lock:
+        lentas = sorted(_lentas, key=lambda p: p['total_ms'], reverse=True)
+    return lentas[:limite] if limite else lentas
+
+
+def token_valido(token):
+    """Comprueba el token de acceso a los datos de perfilado (sin token configurado, nunca)."""
+    return bool(config.PERFILADO_TOKEN and token) and hmac.compare_digest(token, config.PERFILADO_TOKEN)
+
+
+def _token_peticion():
+    # Cabecera X-Token-Perfil o Authorization: Bearer (la que envía Prometheus con bearer_token)
+    token = request.headers.get('X-Token-Perfil', '')
+    if not token:
+        esquema, _, valor = request.headers.get('Authorization', '').partition(' ')
+        if esquema.lower() == 'bearer':
+            token = valor.strip()
+    return token
+
+
+def exigir_token():
+    """
+    Protege los endpoints de estado (/api/estado/*, /metrics) con PERFILADO_TOKEN:
+    sin token configurado responden 404 y sin el token correcto, 403.
+    """
+    if not config.PERFILADO_TOKEN:
+        abort(404)
+    if not token_valido(_token_peticion()):
+        abort(make_response(jsonify({"error": "Token no válido"}), 403))
+
+
+def init_app(app):
+    """Activa el perfilado en `app`. Debe llamarse antes de la primera consulta a MongoDB."""
+    registrar_listener(_MonitorComandos())
+    before_render_template.connect(_antes_de_render, app)
+    template_rendered.connect(_despues_de_render, app)
+    app.before_request(_iniciar_perfil)
+    app.after_request(_cerrar_perfil)
+    app.teardown_request(_limpiar_perfil)
+    logging.info("Perfilado de peticiones activado.")
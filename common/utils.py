@@ -1,17 +1,42 @@
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
 
 def format_date_filter(value, format='%d/%m/%Y'):
     if not value: return ""
+    # Las fechas se guardan como fechas BSON; los textos quedan de datos sin migrar
+    if isinstance(value, (datetime, date)):
+        return value.strftime(format)
     try:
         date_obj = datetime.strptime(value.split(' ')[0], '%Y-%m-%d')
         return date_obj.strftime(format)
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, AttributeError):
         return value
 
 def format_datetime_filter(value, format='%d/%m/%Y %H:%M'):
     if not value: return ""
+    if isinstance(value, datetime):
+        return value.strftime(format)
     try:
         date_obj = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
         return date_obj.strftime(format)
     except (ValueError, TypeError):
         return value
+
+class ProveedorJSON(DefaultJSONProvider):
+    """
+    JSON de las respuestas: las fechas a medianoche salen como 'YYYY-MM-DD' (el formato
+    de los <input type="date"> y de FullCalendar), el resto en ISO 8601, y los importes
+    Decimal como números.
+    """
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime):
+            if (o.hour, o.minute, o.second, o.microsecond) == (0, 0, 0, 0):
+                return o.strftime('%Y-%m-%d')
+            return o.isoformat()
+        if isinstance(o, date):
+            return o.isoformat()
+        if isinstance(o, Decimal):
+            return float(o)
+        return DefaultJSONProvider.default(o)
@@ -10,4 +10,78 @@ load_dotenv()
 # La SECRET_KEY se carga desde el archivo .env
 SECRET_KEY = os.getenv('SECRET_KEY')
 
-MONGO_URI = os.getenv('MONGO_URI')
\ No newline at end of file
+MONGO_URI = os.getenv('MONGO_URI')
+MONGO_DB = os.getenv('MONGO_DB', 'jocrol')
+
+def _entero(nombre, por_defecto=None):
+    valor = os.getenv(nombre)
+    return int(valor) if valor not in (None, '') else por_defecto
+
+def _booleano(nombre, por_defecto=False):
+    valor = os.getenv(nombre)
+    if valor in (None, ''):
+        return por_defecto
+    return valor.lower() in ('1', 'true', 'si', 'yes')
+
+# Pool de conexiones de MongoDB (por proceso: cada worker de gunicorn tiene el suyo).
+# Los valores vacíos usan los valores por defecto de pymongo.
+MONGO_MAX_POOL_SIZE = _entero('MONGO_MAX_POOL_SIZE', 50)
+MONGO_MIN_POOL_SIZE = _entero('MONGO_MIN_POOL_SIZE', 0)
+MONGO_MAX_IDLE_TIME_MS = _entero('MONGO_MAX_IDLE_TIME_MS', 300000)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = _entero('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000)
+MONGO_CONNECT_TIMEOUT_MS = _entero('MONGO_CONNECT_TIMEOUT_MS', 10000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = _entero('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)
+MONGO_SOCKET_TIMEOUT_MS = _entero('MONGO_SOCKET_TIMEOUT_MS')
+# Compresión del protocolo, p. ej. 'zstd,snappy,zlib'. zstd y snappy necesitan
+# los paquetes 'zstandard' y 'python-snappy'; pymongo ignora los que no estén instalados.
+MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+
+# Crear/verificar los índices declarados en data/indices.py al arrancar la aplicación
+MONGO_CREAR_INDICES = _booleano('MONGO_CREAR_INDICES', True)
+
+# Caché del catálogo de juegos y colecciones (data/catalogo.py)
+CATALOGO_TTL_SEGUNDOS = _entero('CATALOGO_TTL_SEGUNDOS', 300)
+# Invalidar la caché de todos los workers con un change stream (requiere replica set)
+CATALOGO_CHANGE_STREAM = _booleano('CATALOGO_CHANGE_STREAM', False)
+# Sin change stream, cada worker comprueba el sello de versión del catálogo como mucho cada N segundos
+CATALOGO_SELLO_INTERVALO_S = _entero('CATALOGO_SELLO_INTERVALO_S', 5)
+
+# Paginación de listados
+RESERVAS_POR_PAGINA = _entero('RESERVAS_POR_PAGINA', 50)
+CLIENTES_POR_PAGINA = _entero('CLIENTES_POR_PAGINA', 50)
+
+# Autocompletado de clientes y productos en los formularios de reservas
+AUTOCOMPLETAR_LIMITE = _entero('AUTOCOMPLETAR_LIMITE', 20)
+AUTOCOMPLETAR_LIMITE_MAXIMO = _entero('AUTOCOMPLETAR_LIMITE_MAXIMO', 50)
+
+# Importación de Excel: filas por lote de validación e inserción
+IMPORTACION_TAMANO_LOTE = _entero('IMPORTACION_TAMANO_LOTE', 1000)
+
+# Trabajos en segundo plano (importaciones y exportaciones, data/trabajos.py)
+TRABAJOS_MAX_HILOS = _entero('TRABAJOS_MAX_HILOS', 2)
+# Los trabajos terminados y sus ficheros se borran pasado este tiempo
+TRABAJOS_RETENCION_HORAS = _entero('TRABAJOS_RETENCION_HORAS', 72)
+# Cada proceso marca sus trabajos vivos con este intervalo; los que pasan más de
+# TRABAJOS_SIN_LATIDO_S sin latido (proceso muerto o sin CPU) se dan por fallidos
+TRABAJOS_LATIDO_S = _entero('TRABAJOS_LATIDO_S', 30)
+TRABAJOS_SIN_LATIDO_S = _entero('TRABAJOS_SIN_LATIDO_S', 300)
+
+# Perfilado por petición (common/perfilado.py): cabecera Server-Timing y registro de peticiones lentas
+PERFILADO_ACTIVO = _booleano('PERFILADO_ACTIVO', False)
+# Solo se guardan las peticiones que tardan al menos esto; se conservan las últimas N
+PERFILADO_UMBRAL_MS = _entero('PERFILADO_UMBRAL_MS', 200)
+PERFILADO_PETICIONES_LENTAS = _entero('PERFILADO_PETICIONES_LENTAS', 100)
+# Token para consultar /api/estado/perfil, /api/estado/pool y /metrics (cabecera X-Token-Perfil
+# o Authorization: Bearer); sin token esos endpoints no existen
+PERFILADO_TOKEN = os.getenv('PERFILADO_TOKEN')
+
+# Registro de consultas lentas con su plan de ejecución (common/consultas_lentas.py)
+CONSULTAS_LENTAS_ACTIVO = _booleano('CONSULTAS_LENTAS_ACTIVO', False)
+CONSULTAS_LENTAS_UMBRAL_MS = _entero('CONSULTAS_LENTAS_UMBRAL_MS', 100)
+# Una misma consulta (colección, comando y ruta) se explica como mucho una vez en este intervalo
+CONSULTAS_LENTAS_INTERVALO_S = _entero('CONSULTAS_LENTAS_INTERVALO_S', 300)
+CONSULTAS_LENTAS_TAMANO_MB = _entero('CONSULTAS_LENTAS_TAMANO_MB', 16)
+
+# Métricas de Prometheus en /metrics (common/metricas.py). Con gunicorn, gunicorn.conf.py
+# define PROMETHEUS_MULTIPROC_DIR para sumar los valores de todos los workers.
+METRICAS_ACTIVO = _booleano('METRICAS_ACTIVO', True)
@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+import time
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+import config
+from data.data_manager import JUEGOS_COLECCIONES_COLLECTION
+from data import repositorio
+from data.versiones import marcar_cambio, obtener_versiones
+
+# Caché en proceso del catálogo de juegos y colecciones.
+# El catálogo cambia pocas veces al mes pero se consulta en casi cada página,
+# así que se guarda en memoria y se invalida explícitamente al escribirlo.
+# Las escrituras de otros workers se detectan con el change stream si está activo o,
+# si no, comparando como mucho cada CATALOGO_SELLO_INTERVALO_S el sello de versión de
+# 'juegos_colecciones' (data/versiones.py) con el que se cargó la caché. Las APIs
+# condicionales usan ese mismo sello en el ETag, así que el ETag siempre corresponde
+# al catálogo que sirve el worker. El TTL queda para las escrituras hechas fuera de
+# la aplicación, que no tocan el sello.
+_lock = threading.Lock()
+_datos = None
+_expira = 0.0
+_version = 0
+_sello = 0
+_proxima_comprobacion = 0.0
+_escucha_activa = False
+_pid_escucha = None
+
+
+def _cargar():
+    juegos_list = repositorio.buscar('juegos_colecciones', vista='catalogo')
+    juegos_dict = {
+        juego['nombre']: {
+            'color': juego['color'],
+            'colecciones': juego['colecciones']
+        }
+        for juego in juegos_list
+    }
+    return {'juegos': juegos_dict}
+
+
+def _sello_actual():
+    return obtener_versiones(['juegos_colecciones'])['juegos_colecciones']['version']
+
+
+def obtener_juegos_y_colecciones():
+    """
+    Devuelve el catálogo {'juegos': {nombre: {'color', 'colecciones'}}}.
+    El dict devuelto es compartido: no se debe modificar.
+    """
+    global _datos, _expira, _version, _sello, _proxima_comprobacion
+    if config.CATALOGO_CHANGE_STREAM:
+        _asegurar_escucha()
+    ahora = time.monotonic()
+    recargar = _datos is None or ahora >= _expira
+    if not recargar and not _escucha_activa and ahora >= _proxima_comprobacion:
+        _proxima_comprobacion = ahora + config.CATALOGO_SELLO_INTERVALO_S
+        recargar = _sello_actual() != _sello
+    if recargar:
+        with _lock:
+            # El sello se lee antes de cargar: si cambia entre medias, se vuelve a recargar
+            sello = _sello_actual()
+            nuevos = _cargar()
+            if nuevos != _datos:
+                _version += 1
+            _datos = nuevos
+            _sello = sello
+            _expira = time.monotonic() + config.CATALOGO_TTL_SEGUNDOS
+            _proxima_comprobacion = time.monotonic() + config.CATALOGO_SELLO_INTERVALO_S
+    return _datos
+
+
+def sello_catalogo():
+    """Sello de versión de 'juegos_colecciones' con que se cargó el catálogo en caché."""
+    obtener_juegos_y_colecciones()
+    return _sello
+
+
+def version_catalogo():
+    """Número que cambia cada vez que cambia el contenido del catálogo en este proceso."""
+    obtener_juegos_y_colecciones()
+    return _version
+
+
+def invalidar_catalogo():
+    global _expira
+    with _lock:
+        _expira = 0.0
+
+
+def guardar_catalogo(juegos):
+    """
+    Sustituye el catálogo completo. `juegos` tiene la forma
+    {nombre: {'color': ..., 'colecciones': [...]}}; se guarda un documento por juego.
+    """
+    documentos = [
+        {'nombre': nombre, 'color': datos.get('color', ''), 'colecciones': list(datos.get('colecciones', []))}
+        for nombre, datos in juegos.items()
+        if nombre
+    ]
+    JUEGOS_COLECCIONES_COLLECTION.delete_many({})
+    if documentos:
+        JUEGOS_COLECCIONES_COLLECTION.insert_many(documentos)
+    marcar_cambio('juegos_colecciones')
+    invalidar_catalogo()
+
+
+def actualizar_juegos(juegos):
+    """
+    Crea o actualiza juegos por nombre sin tocar el resto del catálogo.
+    `juegos` es {nombre: color}; con color None se conserva el actual.
+    """
+    operaciones = []
+    for nombre, color in juegos.items():
+        if not nombre:
+            continue
+        if color is None:
+            cambios = {'$setOnInsert': {'color': '', 'colecciones': []}}
+        else:
+            cambios = {'$set': {'color': color}, '$setOnInsert': {'colecciones': []}}
+        operaciones.append(UpdateOne({'nombre': nombre}, cambios, upsert=True))
+    if operaciones:
+        JUEGOS_COLECCIONES_COLLECTION.bulk_write(operaciones, ordered=False)
+        marcar_cambio('juegos_colecciones')
+        invalidar_catalogo()
+
+
+def anadir_colecciones(colecciones):
+    """Añade colecciones a juegos existentes. `colecciones` es una lista de (juego, coleccion)."""
+    operaciones = [
+        UpdateOne({'nombre': juego}, {'$addToSet': {'colecciones': coleccion}})
+        for juego, coleccion in colecciones
+        if juego and coleccion
+    ]
+    if operaciones:
+        JUEGOS_COLECCIONES_COLLECTION.bulk_write(operaciones, ordered=True)
+        marcar_cambio('juegos_colecciones')
+        invalidar_catalogo()
+
+def _escuchar_cambios():
+    # Con varios workers de gunicorn, cada proceso tiene su caché: el change stream
+    # avisa a todos cuando otro proceso modifica el catálogo.
+    global _escucha_activa
+    espera = 1
+    while True:
+        try:
+            with JUEGOS_COLECCIONES_COLLECTION.watch() as stream:
+                # Los cambios anteriores a abrir el stream no se verían: se recarga
+                invalidar_catalogo()
+                _escucha_activa = True
+                espera = 1
+                for _ in stream:
+                    invalidar_catalogo()
+        except PyMongoError as e:
+            _escucha_activa = False
+            # Los change streams necesitan un replica set; sin él queda el TTL
+            if getattr(e, 'code', None) == 40573:
+                logging.warning("Change streams no disponibles: el catálogo se refresca comprobando su sello.")
+                return
+            logging.warning(f"Change stream del catálogo interrumpido ({e}); reintentando en {espera}s")
+            invalidar_catalogo()
+            time.sleep(espera)
+            espera = min(espera * 2, 60)
+
+
+def _asegurar_escucha():
+    global _pid_escucha
+    pid = os.getpid()
+    if _pid_escucha == pid:
+        return
+    with _lock:
+        if _pid_escucha != pid:
+            _pid_escucha = pid
+            threading.Thread(target=_escuchar_cambios, name='catalogo-cambios', daemon=True).start()
@@ -0,0 +1,97 @@
+import argparse
+import logging
+import re
+import sys
+import time
+from pymongo import UpdateOne
+from data.data_manager import db
+from common.busqueda import CAMPO_BUSQUEDA, CAMPOS_BUSQUEDA, claves_documento, filtro_busqueda
+
+# Mantenimiento de las claves de búsqueda: relleno de los documentos existentes
+# (o tras cambiar CAMPOS_BUSQUEDA) y comparación de tiempos con la búsqueda por $regex.
+TAMANO_LOTE = 500
+
+
+def reindexar(coleccion, tamano_lote=TAMANO_LOTE):
+    """Recalcula las claves de búsqueda de todos los documentos de `coleccion`. Devuelve cuántos cambiaron."""
+    campos = CAMPOS_BUSQUEDA[coleccion]
+    proyeccion = {campo: 1 for campo in campos}
+    proyeccion[CAMPO_BUSQUEDA] = 1
+
+    modificados = 0
+    lote = []
+    for doc in db[coleccion].find({}, proyeccion, batch_size=tamano_lote):
+        claves = claves_documento(coleccion, doc)
+        if doc.get(CAMPO_BUSQUEDA) != claves:
+            lote.append(UpdateOne({'_id': doc['_id']}, {'$set': {CAMPO_BUSQUEDA: claves}}))
+        if len(lote) >= tamano_lote:
+            modificados += db[coleccion].bulk_write(lote, ordered=False).modified_count
+            lote = []
+    if lote:
+        modificados += db[coleccion].bulk_write(lote, ordered=False).modified_count
+    return modificados
+
+
+def _filtro_regex(coleccion, q):
+    # Búsqueda anterior: $regex sin anclar e insensible a mayúsculas sobre cada campo
+    patron = re.escape(q)
+    return {'$or': [{campo: {'$regex': patron, '$options': 'i'}} for campo in CAMPOS_BUSQUEDA[coleccion]]}
+
+
+def _medir(coleccion, filtro, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultados = len(list(db[coleccion].find(filtro, {'_id': 0, 'id': 1})))
+    ms = (time.perf_counter() - inicio) / repeticiones * 1000
+    estadisticas = db.command('explain', {'find': coleccion, 'filter': filtro}, verbosity='executionStats')
+    examinados = estadisticas['executionStats']['totalDocsExamined']
+    return {'ms': round(ms, 3), 'resultados': resultados, 'docs_examinados': examinados}
+
+
+def benchmark(consultas, colecciones=None, repeticiones=20):
+    """Compara, para cada consulta, la búsqueda por $regex con la búsqueda por claves."""
+    informe = []
+    for coleccion in colecciones or CAMPOS_BUSQUEDA:
+        for q in consultas:
+            filtro = filtro_busqueda(q)
+            if not filtro:
+                continue
+            informe.append({
+                'coleccion': coleccion,
+                'consulta': q,
+                'regex': _medir(coleccion, _filtro_regex(coleccion, q), repeticiones),
+                'claves': _medir(coleccion, filtro, repeticiones),
+            })
+    return informe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Claves de búsqueda: relleno y benchmark frente a $regex.')
+    parser.add_argument('accion', choices=['reindexar', 'benchmark'])
+    parser.add_argument('consultas', nargs='*', help='Textos a buscar (benchmark)')
+    parser.add_argument('--coleccion', choices=sorted(CAMPOS_BUSQUEDA), help='Solo esta colección')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    colecciones = [args.coleccion] if args.coleccion else list(CAMPOS_BUSQUEDA)
+
+    if args.accion == 'reindexar':
+        for coleccion in colecciones:
+            logging.info(f"Claves de búsqueda actualizadas en '{coleccion}': {reindexar(coleccion)}")
+        return 0
+
+    if not args.consultas:
+        parser.error('benchmark necesita al menos una consulta')
+    for fila in benchmark(args.consultas, colecciones, args.repeticiones):
+        regex, claves = fila['regex'], fila['claves']
+        logging.info(
+            f"{fila['coleccion']} '{fila['consulta']}': "
+            f"regex {regex['ms']} ms ({regex['resultados']} resultados, {regex['docs_examinados']} docs examinados) | "
+            f"claves {claves['ms']} ms ({claves['resultados']} resultados, {claves['docs_examinados']} docs examinados)"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
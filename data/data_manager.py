@@ -1,13 +1,212 @@
+import logging
+import os
+import threading
+import time
+from pymongo import MongoClient, monitoring
+import config
+from data.esquema import REGISTRO_TIPOS
 
-from pymongo import MongoClient
-from config import MONGO_URI
+# El cliente de MongoDB se crea de forma perezosa y por proceso: gunicorn importa
+# la aplicación y después hace fork de los workers, y un MongoClient no se puede
+# compartir entre procesos. Cada worker crea el suyo en el primer uso.
+_cliente = None
+_pid_cliente = None
+_lock = threading.Lock()
 
-client = MongoClient(MONGO_URI)
-db = client.jocrol
 
-LANZAMIENTOS_COLLECTION = db.lanzamientos
-EVENTOS_COLLECTION = db.eventos
-CLIENTES_COLLECTION = db.clientes
-RESERVAS_COLLECTION = db.reservas
-STAFF_COLLECTION = db.staff
-JUEGOS_COLECCIONES_COLLECTION = db.juegos_colecciones
+class _MonitorPool(monitoring.ConnectionPoolListener):
+    """Lleva la cuenta del estado del pool de conexiones de este proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.abiertas = 0
+            self.en_uso = 0
+            self.esperando = 0
+            self.checkouts = 0
+            self.fallos_checkout = 0
+            self.espera_total = 0.0
+            self.espera_max = 0.0
+
+    def _fin_espera(self):
+        inicio = getattr(self._local, 'inicio_espera', None)
+        self._local.inicio_espera = None
+        return time.monotonic() - inicio if inicio is not None else 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.abiertas += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.abiertas = max(0, self.abiertas - 1)
+
+    def connection_check_out_started(self, event):
+        self._local.inicio_espera = time.monotonic()
+        with self._lock:
+            self.esperando += 1
+
+    def connection_check_out_failed(self, event):
+        self._fin_espera()
+        with self._lock:
+            self.esperando = max(0, self.esperando - 1)
+            self.fallos_checkout += 1
+
+    def connection_checked_out(self, event):
+        espera = self._fin_espera()
+        with self._lock:
+            self.esperando = max(0, self.esperando - 1)
+            self.en_uso += 1
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.en_uso = max(0, self.en_uso - 1)
+
+
+_monitor_pool = _MonitorPool()
+# Listeners de pymongo adicionales (p. ej. el perfilado de comandos, common/perfilado.py)
+_listeners = []
+
+
+def registrar_listener(listener):
+    """Añade un listener de pymongo a los clientes que se creen a partir de ahora."""
+    if _cliente is not None and _pid_cliente == os.getpid():
+        logging.warning(f"El MongoClient de este proceso ya existe: {type(listener).__name__} no se aplicará a él.")
+    _listeners.append(listener)
+
+
+def _opciones_cliente():
+    opciones = {
+        'maxPoolSize': config.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': config.MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': config.MONGO_MAX_IDLE_TIME_MS,
+        'waitQueueTimeoutMS': config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'connectTimeoutMS': config.MONGO_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'socketTimeoutMS': config.MONGO_SOCKET_TIMEOUT_MS,
+    }
+    if config.MONGO_COMPRESSORS:
+        opciones['compressors'] = config.MONGO_COMPRESSORS
+    # Se omiten las opciones sin valor para usar los valores por defecto del driver
+    return {clave: valor for clave, valor in opciones.items() if valor is not None}
+
+
+def _reiniciar_tras_fork():
+    # En el proceso hijo no se debe usar (ni cerrar) el cliente heredado del padre
+    global _cliente, _pid_cliente
+    _cliente = None
+    _pid_cliente = None
+    _monitor_pool.reiniciar()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+def obtener_cliente():
+    """Devuelve el MongoClient de este proceso, creándolo en el primer uso."""
+    global _cliente, _pid_cliente
+    pid = os.getpid()
+    if _cliente is None or _pid_cliente != pid:
+        with _lock:
+            if _cliente is None or _pid_cliente != pid:
+                if _pid_cliente != pid:
+                    _monitor_pool.reiniciar()
+                logging.info(f"Creando MongoClient para el proceso {pid}")
+                _cliente = MongoClient(
+                    config.MONGO_URI,
+                    event_listeners=[_monitor_pool, *_listeners],
+                    # Decimal128 <-> decimal.Decimal para los importes (data/esquema.py)
+                    type_registry=REGISTRO_TIPOS,
+                    **_opciones_cliente()
+                )
+                _pid_cliente = pid
+    return _cliente
+
+
+def obtener_db():
+    return obtener_cliente()[config.MONGO_DB]
+
+
+def cerrar_cliente():
+    global _cliente, _pid_cliente
+    with _lock:
+        if _cliente is not None and _pid_cliente == os.getpid():
+            _cliente.close()
+        _cliente = None
+        _pid_cliente = None
+
+
+def estadisticas_pool():
+    """Estado del pool de conexiones de este proceso."""
+    m = _monitor_pool
+    with m._lock:
+        return {
+            'pid': os.getpid(),
+            'conectado': _cliente is not None and _pid_cliente == os.getpid(),
+            'max_pool_size': config.MONGO_MAX_POOL_SIZE,
+            'conexiones_abiertas': m.abiertas,
+            'conexiones_en_uso': m.en_uso,
+            'esperando_conexion': m.esperando,
+            'checkouts': m.checkouts,
+            'fallos_checkout': m.fallos_checkout,
+            'espera_media_ms': round(m.espera_total / m.checkouts * 1000, 3) if m.checkouts else 0.0,
+            'espera_max_ms': round(m.espera_max * 1000, 3),
+        }
+
+
+class _BaseDatosPerezosa:
+    """Delegado de la base de datos que no conecta hasta que se usa."""
+
+    def __getattr__(self, nombre):
+        return getattr(obtener_db(), nombre)
+
+    def __getitem__(self, nombre):
+        return obtener_db()[nombre]
+
+
+class _ColeccionPerezosa:
+    """Delegado de una colección que no conecta hasta que se usa."""
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+
+    def __getattr__(self, nombre):
+        return getattr(obtener_db()[self._nombre], nombre)
+
+    def __repr__(self):
+        return f"<Coleccion perezosa '{self._nombre}'>"
+
+
+db = _BaseDatosPerezosa()
+
+LANZAMIENTOS_COLLECTION = _ColeccionPerezosa('lanzamientos')
+EVENTOS_COLLECTION = _ColeccionPerezosa('eventos')
+CLIENTES_COLLECTION = _ColeccionPerezosa('clientes')
+RESERVAS_COLLECTION = _ColeccionPerezosa('reservas')
+STAFF_COLLECTION = _ColeccionPerezosa('staff')
+JUEGOS_COLECCIONES_COLLECTION = _ColeccionPerezosa('juegos_colecciones')
+VERSIONES_COLLECTION = _ColeccionPerezosa('versiones')
+TRABAJOS_COLLECTION = _ColeccionPerezosa('trabajos')
@@ -0,0 +1,109 @@
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from bson.codec_options import TypeCodec, TypeRegistry
+from bson.decimal128 import Decimal128
+
+# Tipos de los campos guardados en MongoDB.
+# Las fechas se guardan como fechas BSON (medianoche, sin zona horaria) y los importes
+# como Decimal128 con dos decimales, de modo que los filtros por rango, la ordenación y
+# las sumas de las agregaciones trabajan con tipos nativos y sin $convert. En Python los
+# importes se manejan como decimal.Decimal gracias a REGISTRO_TIPOS.
+CAMPOS_FECHA = {
+    'lanzamientos': ('fecha_salida', 'fecha_envio'),
+    'eventos': ('fecha_salida', 'fecha'),
+    'reservas': ('fecha_reserva',),
+}
+CAMPOS_IMPORTE = {
+    'lanzamientos': ('precio', 'precio_reserva'),
+    'eventos': ('precio', 'precio_reserva'),
+    'reservas': ('pagado', 'total', 'pendiente'),
+}
+CAMPOS_ENTEROS = {
+    'reservas': ('cantidad',),
+}
+
+CENTIMO = Decimal('0.01')
+CERO = Decimal('0.00')
+FORMATO_FECHA = '%Y-%m-%d'
+
+
+class CodecDecimal(TypeCodec):
+    """decimal.Decimal en Python <-> Decimal128 en MongoDB."""
+    python_type = Decimal
+    bson_type = Decimal128
+
+    def transform_python(self, valor):
+        return Decimal128(valor)
+
+    def transform_bson(self, valor):
+        return valor.to_decimal()
+
+
+REGISTRO_TIPOS = TypeRegistry([CodecDecimal()])
+
+
+def a_fecha(valor):
+    """
+    Convierte una fecha ('YYYY-MM-DD', con o sin hora, date o datetime) a datetime a
+    medianoche. Devuelve None si no hay valor. Lanza ValueError si no es una fecha.
+    """
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, datetime):
+        return valor.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day)
+    if isinstance(valor, str):
+        return datetime.strptime(valor.strip()[:10], FORMATO_FECHA)
+    raise ValueError(f"Fecha no válida: {valor!r}")
+
+
+def fecha_iso(valor):
+    """'YYYY-MM-DD' para una fecha guardada (o '' si no hay). Deja tal cual los textos."""
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime(FORMATO_FECHA)
+    return valor or ''
+
+
+def a_importe(valor):
+    """
+    Convierte un importe (texto del formulario, número o Decimal) a Decimal con dos
+    decimales. Sin valor es 0. Lanza ValueError si no es un número.
+    """
+    if valor is None or valor == '':
+        return CERO
+    if isinstance(valor, Decimal128):
+        valor = valor.to_decimal()
+    if isinstance(valor, float):
+        # Por texto, para no arrastrar la representación binaria del float
+        valor = repr(valor)
+    try:
+        importe = Decimal(str(valor).strip().replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"Importe no válido: {valor!r}")
+    if not importe.is_finite():
+        raise ValueError(f"Importe no válido: {valor!r}")
+    return importe.quantize(CENTIMO, rounding=ROUND_HALF_UP)
+
+
+def a_entero(valor, por_defecto=0):
+    if valor is None or valor == '':
+        return por_defecto
+    try:
+        return int(Decimal(str(valor)))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Número entero no válido: {valor!r}")
+
+
+def normalizar_documento(coleccion, doc):
+    """Convierte (en el propio dict) los campos de fecha, importe y enteros presentes en `doc`."""
+    for campo in CAMPOS_FECHA.get(coleccion, ()):
+        if campo in doc:
+            doc[campo] = a_fecha(doc[campo])
+    for campo in CAMPOS_IMPORTE.get(coleccion, ()):
+        if campo in doc:
+            doc[campo] = a_importe(doc[campo])
+    for campo in CAMPOS_ENTEROS.get(coleccion, ()):
+        if campo in doc:
+            doc[campo] = a_entero(doc[campo], 1)
+    return doc
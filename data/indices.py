@@ -0,0 +1,240 @@
+import argparse
+import logging
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from data.data_manager import db
+
+# Registro declarativo de índices por colección.
+# Cada entrada es (nombre, claves, opciones). El nombre es explícito para poder
+# comparar lo declarado con lo que existe realmente en la base de datos.
+INDICES = {
+    'lanzamientos': [
+        ('id_unico', [('id', ASCENDING)], {'unique': True}),
+        ('fecha_salida', [('fecha_salida', ASCENDING)], {}),
+        ('fecha_envio', [('fecha_envio', ASCENDING)], {}),
+        # Índice multikey sobre las claves de búsqueda (common/busqueda.py)
+        ('busqueda', [('busqueda', ASCENDING)], {}),
+        # Autocompletado de productos por juego (y colección), los más recientes primero;
+        # el desempate por id forma parte del orden, así que también del índice
+        ('juego_fecha_id', [('juego', ASCENDING), ('fecha_salida', DESCENDING), ('id', ASCENDING)], {}),
+        ('juego_coleccion_fecha_id', [('juego', ASCENDING), ('coleccion', ASCENDING), ('fecha_salida', DESCENDING), ('id', ASCENDING)], {}),
+        # Clave natural (nombre, juego, coleccion): importación de reservas y modo merge
+        ('clave_natural', [('nombre', ASCENDING), ('juego', ASCENDING), ('coleccion', ASCENDING)], {}),
+    ],
+    'eventos': [
+        ('id_unico', [('id', ASCENDING)], {'unique': True}),
+        ('fecha', [('fecha', ASCENDING)], {}),
+        ('busqueda', [('busqueda', ASCENDING)], {}),
+        ('juego_fecha_id', [('juego', ASCENDING), ('fecha', DESCENDING), ('id', ASCENDING)], {}),
+        ('juego_coleccion_fecha_id', [('juego', ASCENDING), ('coleccion', ASCENDING), ('fecha', DESCENDING), ('id', ASCENDING)], {}),
+        ('clave_natural', [('nombre', ASCENDING), ('juego', ASCENDING), ('coleccion', ASCENDING)], {}),
+    ],
+    'clientes': [
+        ('id_unico', [('id', ASCENDING)], {'unique': True}),
+        ('email', [('email', ASCENDING)], {}),
+        ('telefono', [('telefono', ASCENDING)], {}),
+        ('busqueda', [('busqueda', ASCENDING)], {}),
+        # Listado paginado y autocompletado sin texto: orden alfabético con desempate por id
+        ('nombre_id', [('nombre', ASCENDING), ('id', ASCENDING)], {}),
+    ],
+    'reservas': [
+        ('id_unico', [('id', ASCENDING)], {'unique': True}),
+        ('cliente_id', [('cliente_id', ASCENDING)], {}),
+        ('lanzamiento_id', [('lanzamiento_id', ASCENDING)], {}),
+        ('evento_id', [('evento_id', ASCENDING)], {}),
+        # Listado paginado: orden por fecha con desempate por id (en ambos sentidos)
+        ('fecha_reserva_id', [('fecha_reserva', ASCENDING), ('id', ASCENDING)], {}),
+        # Filtro por estado de pago sobre los totales materializados, con el mismo orden
+        ('pago_completo_fecha_id', [('pago_completo', ASCENDING), ('fecha_reserva', ASCENDING), ('id', ASCENDING)], {}),
+    ],
+    'staff': [
+        ('id_unico', [('id', ASCENDING)], {'unique': True}),
+    ],
+    # Trabajos en segundo plano (data/trabajos.py): consulta de estado y limpieza de antiguos
+    'trabajos': [
+        ('id_unico', [('id', ASCENDING)], {'unique': True}),
+        ('creado', [('creado', ASCENDING)], {}),
+    ],
+    # Los documentos del catálogo no tienen 'id': la clave natural es el nombre del juego.
+    'juegos_colecciones': [
+        ('nombre_unico', [('nombre', ASCENDING)], {'unique': True}),
+    ],
+}
+
+# Opciones que se tienen en cuenta al comparar un índice existente con su declaración
+OPCIONES_COMPARADAS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+# Un índice recreado queda con el nombre alternativo (MongoDB no renombra índices y
+# no admite dos con las mismas claves); los dos nombres valen para su declaración
+SUFIJO_ALTERNATIVO = '_nuevo'
+
+def _nombres_posibles(nombre):
+    return (nombre, f"{nombre}{SUFIJO_ALTERNATIVO}")
+
+def nombre_existente(nombre, existentes):
+    """Nombre con el que existe el índice declarado `nombre`, o None si no existe."""
+    return next((candidato for candidato in _nombres_posibles(nombre) if candidato in existentes), None)
+
+def _especificacion(claves, opciones):
+    # El servidor puede devolver la dirección como float (1.0): se normaliza a int
+    spec = {'key': [(campo, int(dir) if isinstance(dir, (int, float)) else dir) for campo, dir in claves]}
+    for opcion in OPCIONES_COMPARADAS:
+        if opciones.get(opcion):
+            spec[opcion] = opciones[opcion]
+    return spec
+
+def comprobar_indices(base_datos=None):
+    """
+    Compara los índices declarados con los existentes.
+    Devuelve un dict por colección con las claves 'faltan', 'sobran' y 'distintos'.
+    """
+    base_datos = base_datos if base_datos is not None else db
+    informe = {}
+    for nombre_coleccion, declarados in INDICES.items():
+        existentes = base_datos[nombre_coleccion].index_information()
+        existentes.pop('_id_', None)
+
+        faltan, distintos, encontrados = [], [], set()
+        for nombre, claves, opciones in declarados:
+            existente = nombre_existente(nombre, existentes)
+            if existente is None:
+                faltan.append(nombre)
+                continue
+            encontrados.add(existente)
+            esperado = _especificacion(claves, opciones)
+            actual = _especificacion(existentes[existente]['key'], existentes[existente])
+            if esperado != actual:
+                distintos.append({'nombre': nombre, 'esperado': esperado, 'actual': actual})
+
+        sobran = [nombre for nombre in existentes if nombre not in encontrados]
+
+        informe[nombre_coleccion] = {'faltan': faltan, 'sobran': sobran, 'distintos': distintos}
+    return informe
+
+def hay_desviaciones(informe):
+    return any(d['faltan'] or d['sobran'] or d['distintos'] for d in informe.values())
+
+# Errores de MongoDB al crear un índice con las mismas claves que otro ya existente
+CODIGOS_CONFLICTO = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+
+def _crear_indice(coleccion, nombre, claves, opciones):
+    """Crea un índice. Devuelve False (y lo registra) si falla, sin afectar a los demás."""
+    try:
+        coleccion.create_indexes([IndexModel(claves, name=nombre, **opciones)])
+        logging.info(f"Índice '{nombre}' creado en '{coleccion.name}'")
+        return True
+    except OperationFailure as e:
+        # Por ejemplo, un índice único sobre datos duplicados
+        logging.error(f"No se pudo crear el índice '{nombre}' en '{coleccion.name}': {e}")
+        return False
+
+def _opciones_existentes(info):
+    return {opcion: info[opcion] for opcion in OPCIONES_COMPARADAS if info.get(opcion)}
+
+def _recrear_indice(coleccion, nombre, claves, opciones, existente, actual):
+    """
+    Sustituye el índice `existente` por la nueva declaración de `nombre` sin quedarse
+    sin ninguno en ningún momento. La nueva se construye con el otro nombre posible
+    (`nombre` o `nombre_nuevo`) mientras la actual sigue en uso, y solo cuando está
+    lista se elimina la actual; si no se puede construir (p. ej. datos duplicados para
+    un índice único) se deja la actual. Si las claves son las mismas y solo cambian
+    las opciones, MongoDB no admite las dos a la vez: se elimina la actual, se crea
+    la nueva y, si falla, se restaura la anterior.
+    """
+    nuevo = next(candidato for candidato in _nombres_posibles(nombre) if candidato != existente)
+    try:
+        coleccion.create_indexes([IndexModel(claves, name=nuevo, **opciones)])
+    except OperationFailure as e:
+        if e.code not in CODIGOS_CONFLICTO:
+            logging.error(f"No se puede recrear '{nombre}' en '{coleccion.name}'; se mantiene el actual: {e}")
+            return False
+        coleccion.drop_index(existente)
+        if _crear_indice(coleccion, nombre, claves, opciones):
+            return True
+        logging.warning(f"Restaurando el índice anterior '{existente}' en '{coleccion.name}'")
+        _crear_indice(coleccion, existente, actual['key'], _opciones_existentes(actual))
+        return False
+
+    logging.info(f"Índice '{nuevo}' creado en '{coleccion.name}'; eliminando el anterior '{existente}'")
+    coleccion.drop_index(existente)
+    return True
+
+def aplicar_indices(base_datos=None, eliminar_sobrantes=False, recrear_distintos=False):
+    """
+    Crea los índices declarados que falten, de uno en uno: si uno falla (p. ej. un
+    único sobre datos duplicados) los demás se crean igualmente. Es idempotente. Los
+    que existen con otra especificación solo se recrean con `recrear_distintos`
+    (python -m data.indices aplicar); al arrancar la aplicación solo se informa.
+    Devuelve el informe de desviaciones tras aplicar.
+    """
+    base_datos = base_datos if base_datos is not None else db
+    informe = comprobar_indices(base_datos)
+
+    for nombre_coleccion, declarados in INDICES.items():
+        coleccion = base_datos[nombre_coleccion]
+        desviacion = informe[nombre_coleccion]
+        distintos = {d['nombre'] for d in desviacion['distintos']}
+
+        if recrear_distintos and distintos:
+            existentes = coleccion.index_information()
+            for nombre, claves, opciones in declarados:
+                if nombre in distintos:
+                    existente = nombre_existente(nombre, existentes)
+                    logging.warning(f"Recreando índice '{nombre}' en '{nombre_coleccion}'")
+                    _recrear_indice(coleccion, nombre, claves, opciones, existente, existentes[existente])
+
+        for nombre, claves, opciones in declarados:
+            if nombre in desviacion['faltan']:
+                _crear_indice(coleccion, nombre, claves, opciones)
+
+        if eliminar_sobrantes:
+            for nombre in desviacion['sobran']:
+                logging.warning(f"Eliminando índice no declarado '{nombre}' en '{nombre_coleccion}'")
+                coleccion.drop_index(nombre)
+
+    return comprobar_indices(base_datos)
+
+def indices_unicos_pendientes(informe, colecciones):
+    """Índices únicos declarados de `colecciones` que faltan o no coinciden con el registro."""
+    pendientes = []
+    for nombre_coleccion in colecciones:
+        desviacion = informe.get(nombre_coleccion, {'faltan': [], 'distintos': []})
+        no_validos = set(desviacion['faltan']) | {d['nombre'] for d in desviacion['distintos']}
+        pendientes.extend(
+            f"{nombre_coleccion}.{nombre}"
+            for nombre, _, opciones in INDICES.get(nombre_coleccion, [])
+            if opciones.get('unique') and nombre in no_validos
+        )
+    return pendientes
+
+def registrar_informe(informe):
+    for nombre_coleccion, desviacion in informe.items():
+        if desviacion['faltan']:
+            logging.warning(f"[indices] {nombre_coleccion}: faltan {desviacion['faltan']}")
+        if desviacion['sobran']:
+            logging.warning(f"[indices] {nombre_coleccion}: no declarados {desviacion['sobran']}")
+        for distinto in desviacion['distintos']:
+            logging.warning(
+                f"[indices] {nombre_coleccion}: '{distinto['nombre']}' difiere "
+                f"(esperado {distinto['esperado']}, actual {distinto['actual']})"
+            )
+    if not hay_desviaciones(informe):
+        logging.info("[indices] Todos los índices coinciden con el registro.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gestión de índices de MongoDB.')
+    parser.add_argument('accion', choices=['comprobar', 'aplicar'], help='Comprobar desviaciones o aplicar el registro')
+    parser.add_argument('--eliminar-sobrantes', action='store_true', help='Elimina los índices no declarados al aplicar')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    if args.accion == 'aplicar':
+        informe = aplicar_indices(eliminar_sobrantes=args.eliminar_sobrantes, recrear_distintos=True)
+    else:
+        informe = comprobar_indices()
+    registrar_informe(informe)
+    return 1 if hay_desviaciones(informe) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import argparse
+import logging
+import sys
+from pymongo import UpdateOne
+from data.data_manager import db
+from data.esquema import CAMPOS_ENTEROS, CAMPOS_FECHA, CAMPOS_IMPORTE, a_entero, a_fecha, a_importe
+from data.versiones import marcar_cambio
+from modules.reservas.totales import reparar_totales
+
+# Migración en el sitio de los tipos de los campos (data/esquema.py): fechas guardadas
+# como texto a fechas BSON, importes float/int/texto a Decimal128 y cantidades a entero.
+# Solo se leen los documentos con algún campo de tipo antiguo, por lotes, y se
+# reescriben con bulk_write. Es idempotente: se puede repetir sin efectos.
+#
+#   python -m data.migracion_tipos [comprobar|migrar] [--coleccion reservas]
+TAMANO_LOTE = 500
+
+TIPOS_ANTIGUOS_FECHA = ['string']
+TIPOS_ANTIGUOS_IMPORTE = ['double', 'int', 'long', 'string']
+TIPOS_ANTIGUOS_ENTERO = ['double', 'long', 'string', 'decimal']
+
+
+def _conversiones(coleccion):
+    """Lista de (campo, tipos antiguos, función de conversión) de `coleccion`."""
+    return (
+        [(campo, TIPOS_ANTIGUOS_FECHA, a_fecha) for campo in CAMPOS_FECHA.get(coleccion, ())]
+        + [(campo, TIPOS_ANTIGUOS_IMPORTE, a_importe) for campo in CAMPOS_IMPORTE.get(coleccion, ())]
+        + [(campo, TIPOS_ANTIGUOS_ENTERO, lambda valor: a_entero(valor, 1)) for campo in CAMPOS_ENTEROS.get(coleccion, ())]
+    )
+
+
+def colecciones_con_esquema():
+    return sorted(set(CAMPOS_FECHA) | set(CAMPOS_IMPORTE) | set(CAMPOS_ENTEROS))
+
+
+def comprobar(coleccion):
+    """Devuelve {campo: documentos con tipo antiguo} para `coleccion`."""
+    return {
+        campo: db[coleccion].count_documents({campo: {'$type': tipos}})
+        for campo, tipos, _ in _conversiones(coleccion)
+    }
+
+
+def migrar(coleccion, tamano_lote=TAMANO_LOTE):
+    """Convierte los campos de tipo antiguo de `coleccion`. Devuelve (modificados, errores)."""
+    conversiones = _conversiones(coleccion)
+    filtro = {'$or': [{campo: {'$type': tipos}} for campo, tipos, _ in conversiones]}
+    proyeccion = {campo: 1 for campo, _, _ in conversiones}
+
+    modificados, errores = 0, 0
+    lote = []
+    for doc in db[coleccion].find(filtro, proyeccion, batch_size=tamano_lote):
+        cambios = {}
+        try:
+            for campo, _, convertir in conversiones:
+                if campo in doc:
+                    cambios[campo] = convertir(doc[campo])
+        except ValueError as e:
+            logging.warning(f"'{coleccion}' {doc['_id']}: {e}; se deja sin migrar.")
+            errores += 1
+            continue
+        lote.append(UpdateOne({'_id': doc['_id']}, {'$set': cambios}))
+        if len(lote) >= tamano_lote:
+            modificados += db[coleccion].bulk_write(lote, ordered=False).modified_count
+            lote = []
+    if lote:
+        modificados += db[coleccion].bulk_write(lote, ordered=False).modified_count
+    return modificados, errores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migración de fechas e importes a tipos BSON nativos.')
+    parser.add_argument('accion', choices=['comprobar', 'migrar'])
+    parser.add_argument('--coleccion', choices=colecciones_con_esquema(), help='Solo esta colección')
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    colecciones = [args.coleccion] if args.coleccion else colecciones_con_esquema()
+
+    if args.accion == 'comprobar':
+        pendientes = 0
+        for coleccion in colecciones:
+            for campo, total in comprobar(coleccion).items():
+                pendientes += total
+                logging.info(f"{coleccion}.{campo}: {total} documentos con tipo antiguo")
+        return 1 if pendientes else 0
+
+    cambiadas = []
+    for coleccion in colecciones:
+        modificados, errores = migrar(coleccion, args.tamano_lote)
+        logging.info(f"'{coleccion}': {modificados} documentos migrados, {errores} con valores no válidos.")
+        if modificados:
+            cambiadas.append(coleccion)
+
+    # Los totales materializados de las reservas se recalculan con los importes nuevos
+    if cambiadas:
+        procesadas = reparar_totales()
+        logging.info(f"Totales recalculados para {procesadas} reservas.")
+        marcar_cambio(*cambiadas)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
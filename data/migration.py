@@ -1,56 +1,331 @@
-
+import argparse
+import hashlib
+import itertools
 import json
+import logging
 import os
-from data.data_manager import (
-    LANZAMIENTOS_COLLECTION,
-    EVENTOS_COLLECTION,
-    CLIENTES_COLLECTION,
-    RESERVAS_COLLECTION,
-    STAFF_COLLECTION,
-    JUEGOS_COLECCIONES_COLLECTION,
-    guardar_datos
-)
-
-DATA_DIR = 'data'
-LANZAMIENTOS_FILE = os.path.join(DATA_DIR, 'lanzamientos.json')
-EVENTOS_FILE = os.path.join(DATA_DIR, 'eventos.json')
-CLIENTES_FILE = os.path.join(DATA_DIR, 'clientes.json')
-RESERVAS_FILE = os.path.join(DATA_DIR, 'reservas.json')
-STAFF_FILE = os.path.join(DATA_DIR, 'staff.json')
-JUEGOS_COLECCIONES_FILE = os.path.join(DATA_DIR, 'juegos_colecciones.json')
-
-def migrar_datos():
-    with open(LANZAMIENTOS_FILE, 'r', encoding='utf-8') as f:
-        lanzamientos_data = json.load(f)
-    guardar_datos(LANZAMIENTOS_COLLECTION, lanzamientos_data)
-
-    with open(EVENTOS_FILE, 'r', encoding='utf-8') as f:
-        eventos_data = json.load(f)
-    guardar_datos(EVENTOS_COLLECTION, eventos_data)
-
-    with open(CLIENTES_FILE, 'r', encoding='utf-8') as f:
-        clientes_data = json.load(f)
-    guardar_datos(CLIENTES_COLLECTION, clientes_data)
-
-    with open(RESERVAS_FILE, 'r', encoding='utf-8') as f:
-        reservas_data = json.load(f)
-    guardar_datos(RESERVAS_COLLECTION, reservas_data)
-
-    with open(STAFF_FILE, 'r', encoding='utf-8') as f:
-        staff_data = json.load(f)
-    guardar_datos(STAFF_COLLECTION, staff_data)
-
-    with open(JUEGOS_COLECCIONES_FILE, 'r', encoding='utf-8') as f:
-        juegos_colecciones_json = json.load(f)
-    
-    juegos_colecciones_data = []
-    for nombre, datos in juegos_colecciones_json["juegos"].items():
-        juegos_colecciones_data.append({
-            "nombre": nombre,
-            "color": datos["color"],
-            "colecciones": datos["colecciones"]
-        })
-    guardar_datos(JUEGOS_COLECCIONES_COLLECTION, juegos_colecciones_data)
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pymongo.errors import BulkWriteError
+from data.data_manager import db
+from data.indices import aplicar_indices, indices_unicos_pendientes
+from data.versiones import marcar_cambio
+from data.esquema import normalizar_documento
+from common.busqueda import CAMPO_BUSQUEDA, CAMPOS_BUSQUEDA, claves_documento
+from modules.reservas.totales import reparar_totales
+
+# Migración de los ficheros JSON de data/ a MongoDB.
+# Los ficheros se leen por trozos (un elemento del array cada vez), se insertan por
+# lotes con insert_many y las colecciones se migran en paralelo. El avance se guarda en
+# un fichero de control tras cada lote, así que una ejecución interrumpida continúa
+# donde se quedó. Al terminar se comparan número de documentos y suma de control.
+#
+#   python -m data.migration [--coleccion lanzamientos ...] [--reiniciar | --vaciar] [--solo-verificar]
+#
+# Una colección con documentos que no proceden de una migración anterior del mismo
+# fichero no se vacía sin --vaciar o --reiniciar.
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+FICHEROS = {
+    'lanzamientos': 'lanzamientos.json',
+    'eventos': 'eventos.json',
+    'clientes': 'clientes.json',
+    'reservas': 'reservas.json',
+    'staff': 'staff.json',
+    'juegos_colecciones': 'juegos_colecciones.json',
+}
+FICHERO_CONTROL = '.migracion_estado.json'
+
+TAMANO_LOTE = 1000
+TAMANO_TROZO = 64 * 1024
+HILOS = 4
+
+# Campos que se calculan en la base de datos tras migrar: no entran en la suma de control
+CAMPOS_DERIVADOS = ('_id', CAMPO_BUSQUEDA, 'total', 'pendiente', 'pago_completo')
+
+_ESPACIOS = re.compile(r'\s*')
+_DELIMITADORES = ',] \t\r\n'
+_lock_control = threading.Lock()
+
+
+# --- Lectura incremental ---
+
+def iterar_json(ruta, tamano_trozo=TAMANO_TROZO):
+    """
+    Recorre los elementos de un fichero cuyo contenido es un array JSON sin cargarlo
+    entero: se lee por trozos de `tamano_trozo` caracteres y se decodifica cada
+    elemento en cuanto está completo en el buffer.
+    """
+    decoder = json.JSONDecoder()
+    with open(ruta, 'r', encoding='utf-8') as f:
+        buffer, pos, fin_fichero = '', 0, False
+
+        def leer_mas():
+            trozo = f.read(tamano_trozo)
+            return buffer[pos:] + trozo, 0, not trozo
+
+        esperado = '['
+        while True:
+            pos = _ESPACIOS.match(buffer, pos).end()
+            if pos >= len(buffer):
+                if fin_fichero:
+                    raise ValueError(f"{ruta}: el fichero termina antes de cerrar el array")
+                buffer, pos, fin_fichero = leer_mas()
+                continue
+
+            caracter = buffer[pos]
+            if esperado == '[':
+                if caracter != '[':
+                    raise ValueError(f"{ruta}: se esperaba un array JSON")
+                pos += 1
+                esperado = 'valor_o_fin'
+                continue
+            if caracter == ']' and esperado != 'valor':
+                return
+            if esperado == 'coma_o_fin':
+                if caracter != ',':
+                    raise ValueError(f"{ruta}: se esperaba ',' o ']' entre elementos del array")
+                pos += 1
+                esperado = 'valor'
+                continue
+
+            try:
+                valor, fin = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if fin_fichero:
+                    raise
+                buffer, pos, fin_fichero = leer_mas()
+                continue
+            if not fin_fichero and (fin == len(buffer) or buffer[fin] not in _DELIMITADORES):
+                # Un número cortado por el trozo ("1" de "1.5e3") se decodifica sin error:
+                # solo se acepta si le sigue un delimitador o se ha llegado al final
+                buffer, pos, fin_fichero = leer_mas()
+                continue
+            yield valor
+            pos = fin
+            esperado = 'coma_o_fin'
+
+
+def iterar_catalogo(ruta):
+    """Documentos de juegos_colecciones. El fichero es un objeto pequeño y se lee entero."""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        juegos = json.load(f)['juegos']
+    for nombre, datos in juegos.items():
+        yield {'nombre': nombre, 'color': datos['color'], 'colecciones': datos['colecciones']}
+
+
+def transformar(coleccion, doc):
+    """Adapta un documento del JSON al esquema actual."""
+    if coleccion in ('lanzamientos', 'eventos') and 'reserva' in doc:
+        # Los JSON antiguos guardan el precio de reserva como 'reserva'
+        doc.setdefault('precio_reserva', doc.pop('reserva'))
+    # Fechas e importes con sus tipos BSON (data/esquema.py)
+    normalizar_documento(coleccion, doc)
+    if coleccion in CAMPOS_BUSQUEDA:
+        doc[CAMPO_BUSQUEDA] = claves_documento(coleccion, doc)
+    return doc
+
+
+def documentos_origen(coleccion, directorio=DATA_DIR):
+    ruta = os.path.join(directorio, FICHEROS[coleccion])
+    documentos = iterar_catalogo(ruta) if coleccion == 'juegos_colecciones' else iterar_json(ruta)
+    return (transformar(coleccion, doc) for doc in documentos)
+
+
+# --- Fichero de control ---
+
+def _firma(ruta):
+    estado = os.stat(ruta)
+    return [estado.st_size, int(estado.st_mtime)]
+
+
+def leer_control(ruta_control):
+    if not os.path.exists(ruta_control):
+        return {}
+    with open(ruta_control, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _guardar_control(ruta_control, control):
+    # Escritura atómica: un corte a mitad no deja el fichero de control corrupto
+    temporal = ruta_control + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(control, f, indent=2)
+    os.replace(temporal, ruta_control)
+
+
+def _actualizar_control(ruta_control, control, coleccion, **campos):
+    with _lock_control:
+        control.setdefault(coleccion, {}).update(campos)
+        _guardar_control(ruta_control, control)
+
+
+# --- Migración ---
+
+def _insertar_lote(coleccion, lote):
+    """Inserta un lote. Los duplicados por id (de un lote interrumpido) se ignoran."""
+    try:
+        return len(db[coleccion].insert_many(lote, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        otros = [error for error in e.details['writeErrors'] if error.get('code') != 11000]
+        if otros:
+            raise
+        return e.details['nInserted']
+
+
+def migrar_coleccion(coleccion, control, ruta_control, directorio=DATA_DIR, tamano_lote=TAMANO_LOTE):
+    """Migra una colección desde su fichero, continuando desde el fichero de control. Devuelve los insertados."""
+    firma = _firma(os.path.join(directorio, FICHEROS[coleccion]))
+    estado = control.get(coleccion, {})
+    if estado.get('firma') != firma:
+        # Primera ejecución o fichero cambiado: se empieza desde cero (migrar() ya ha
+        # comprobado que se puede vaciar la colección)
+        db[coleccion].delete_many({})
+        estado = {}
+        _actualizar_control(ruta_control, control, coleccion, firma=firma, procesados=0, completado=False)
+    if estado.get('completado'):
+        logging.info(f"'{coleccion}' ya estaba migrada: se omite.")
+        return 0
+
+    procesados = estado.get('procesados', 0)
+    if procesados:
+        logging.info(f"'{coleccion}': se continúa desde el documento {procesados}.")
+
+    documentos = itertools.islice(documentos_origen(coleccion, directorio), procesados, None)
+    insertados = 0
+    while True:
+        lote = list(itertools.islice(documentos, tamano_lote))
+        if not lote:
+            break
+        insertados += _insertar_lote(coleccion, lote)
+        procesados += len(lote)
+        _actualizar_control(ruta_control, control, coleccion, procesados=procesados)
+        logging.info(f"'{coleccion}': {procesados} documentos procesados.")
+
+    _actualizar_control(ruta_control, control, coleccion, completado=True)
+    return insertados
+
+
+def colecciones_a_vaciar(colecciones, control, directorio=DATA_DIR):
+    """Colecciones con documentos que la migración vaciaría (sin migración previa del mismo fichero)."""
+    return [
+        coleccion for coleccion in colecciones
+        if control.get(coleccion, {}).get('firma') != _firma(os.path.join(directorio, FICHEROS[coleccion]))
+        and db[coleccion].count_documents({}, limit=1)
+    ]
+
+
+def migrar(colecciones=None, directorio=DATA_DIR, ruta_control=None, reiniciar=False,
+           tamano_lote=TAMANO_LOTE, hilos=HILOS, vaciar=False):
+    """
+    Migra las colecciones indicadas (todas por defecto) en paralelo. Devuelve {coleccion: insertados}.
+    Una colección con documentos solo se vacía con `reiniciar` o `vaciar`; si no, lanza RuntimeError.
+    """
+    colecciones = list(colecciones or FICHEROS)
+    ruta_control = ruta_control or os.path.join(directorio, FICHERO_CONTROL)
+    if reiniciar and os.path.exists(ruta_control):
+        os.remove(ruta_control)
+    control = leer_control(ruta_control)
+
+    # Primera migración o fichero cambiado (aunque sea solo la fecha): se vaciaría la colección
+    if not (reiniciar or vaciar):
+        con_datos = colecciones_a_vaciar(colecciones, control, directorio)
+        if con_datos:
+            raise RuntimeError(
+                f"Las colecciones {', '.join(con_datos)} tienen documentos y no constan como migradas desde "
+                f"estos ficheros: la migración las vaciaría. Usa --vaciar (o --reiniciar) para confirmarlo."
+            )
+
+    # El índice único por id hace que repetir un lote interrumpido no duplique documentos:
+    # sin él no se migra
+    pendientes = indices_unicos_pendientes(aplicar_indices(), colecciones)
+    if pendientes:
+        raise RuntimeError(
+            f"Faltan índices únicos ({', '.join(pendientes)}): revisa 'python -m data.indices comprobar' antes de migrar."
+        )
+
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='migracion') as executor:
+        futuros = {
+            coleccion: executor.submit(migrar_coleccion, coleccion, control, ruta_control, directorio, tamano_lote)
+            for coleccion in colecciones
+        }
+        insertados = {coleccion: futuro.result() for coleccion, futuro in futuros.items()}
+
+    if 'reservas' in colecciones or 'lanzamientos' in colecciones or 'eventos' in colecciones:
+        reparar_totales()
+    marcar_cambio(*colecciones)
+    return insertados
+
+
+# --- Verificación ---
+
+def _huella_documento(doc):
+    contenido = {k: v for k, v in doc.items() if k not in CAMPOS_DERIVADOS}
+    return int(hashlib.sha1(json.dumps(contenido, sort_keys=True, default=str).encode('utf-8')).hexdigest(), 16)
+
+
+def _resumen(documentos):
+    # Suma de las huellas: no depende del orden de los documentos
+    total, suma = 0, 0
+    for doc in documentos:
+        total += 1
+        suma = (suma + _huella_documento(doc)) % (1 << 160)
+    return total, f'{suma:040x}'
+
+
+def verificar_coleccion(coleccion, directorio=DATA_DIR):
+    """Compara número de documentos y suma de control entre el fichero y la colección."""
+    origen, suma_origen = _resumen(documentos_origen(coleccion, directorio))
+    destino, suma_destino = _resumen(db[coleccion].find({}, {campo: 0 for campo in CAMPOS_DERIVADOS}, batch_size=TAMANO_LOTE))
+    return {
+        'origen': origen,
+        'destino': destino,
+        'suma_origen': suma_origen,
+        'suma_destino': suma_destino,
+        'correcto': origen == destino and suma_origen == suma_destino,
+    }
+
+
+def verificar(colecciones=None, directorio=DATA_DIR):
+    return {coleccion: verificar_coleccion(coleccion, directorio) for coleccion in colecciones or FICHEROS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migración de los ficheros JSON de data/ a MongoDB.')
+    parser.add_argument('--coleccion', action='append', choices=sorted(FICHEROS), help='Solo esta colección (repetible)')
+    parser.add_argument('--directorio', default=DATA_DIR, help='Carpeta con los ficheros JSON')
+    parser.add_argument('--control', help=f'Fichero de control (por defecto <directorio>/{FICHERO_CONTROL})')
+    parser.add_argument('--reiniciar', action='store_true', help='Ignora el fichero de control y migra desde cero')
+    parser.add_argument('--vaciar', action='store_true', help='Permite vaciar colecciones con documentos antes de migrarlas')
+    parser.add_argument('--solo-verificar', action='store_true', help='No migra: solo compara ficheros y colecciones')
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE)
+    parser.add_argument('--hilos', type=int, default=HILOS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    if not args.solo_verificar:
+        try:
+            insertados = migrar(args.coleccion, args.directorio, args.control, args.reiniciar, args.tamano_lote,
+                                args.hilos, args.vaciar)
+        except RuntimeError as e:
+            logging.error(str(e))
+            return 1
+        for coleccion, total in insertados.items():
+            logging.info(f"'{coleccion}': {total} documentos insertados.")
+
+    correcto = True
+    for coleccion, informe in verificar(args.coleccion, args.directorio).items():
+        correcto = correcto and informe['correcto']
+        logging.log(
+            logging.INFO if informe['correcto'] else logging.ERROR,
+            f"'{coleccion}': {informe['origen']} en el fichero, {informe['destino']} en MongoDB, "
+            f"suma {informe['suma_origen']} / {informe['suma_destino']} "
+            f"{'OK' if informe['correcto'] else 'NO COINCIDE'}"
+        )
+    return 0 if correcto else 1
+
 
 if __name__ == '__main__':
-    migrar_datos()
+    sys.exit(main())
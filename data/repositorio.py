@@ -0,0 +1,146 @@
+from data.data_manager import (
+    LANZAMIENTOS_COLLECTION,
+    EVENTOS_COLLECTION,
+    CLIENTES_COLLECTION,
+    RESERVAS_COLLECTION,
+    STAFF_COLLECTION,
+    JUEGOS_COLECCIONES_COLLECTION
+)
+
+# Punto único de acceso de lectura a las colecciones.
+# Cada vista declara solo los campos que necesita, para no mover documentos
+# completos cuando la pantalla usa tres o cuatro campos.
+COLECCIONES = {
+    'lanzamientos': LANZAMIENTOS_COLLECTION,
+    'eventos': EVENTOS_COLLECTION,
+    'clientes': CLIENTES_COLLECTION,
+    'reservas': RESERVAS_COLLECTION,
+    'staff': STAFF_COLLECTION,
+    'juegos_colecciones': JUEGOS_COLECCIONES_COLLECTION,
+}
+
+# Campos internos que no se devuelven: las claves de búsqueda ('busqueda', para el índice)
+# y la huella del contenido importado ('_huella', para la importación en modo merge)
+CAMPOS_INTERNOS = ('busqueda', '_huella')
+_COMPLETO = {'_id': 0, **{campo: 0 for campo in CAMPOS_INTERNOS}}
+# Solo el id: comprobaciones de existencia y búsquedas que devuelven ids
+_REFERENCIA = {'_id': 0, 'id': 1}
+_PRODUCTO_SELECTOR = {'_id': 0, 'id': 1, 'nombre': 1, 'juego': 1, 'coleccion': 1, 'precio': 1, 'precio_reserva': 1}
+_PRODUCTO_CLAVE = {'_id': 0, 'id': 1, 'nombre': 1, 'juego': 1, 'coleccion': 1}
+_PRODUCTO_PRECIO = {'_id': 0, 'id': 1, 'precio': 1, 'precio_reserva': 1}
+# Clave natural, precios y huella: importación en modo merge
+_PRODUCTO_HUELLA = {'_id': 0, 'id': 1, 'nombre': 1, 'juego': 1, 'coleccion': 1,
+                    'precio': 1, 'precio_reserva': 1, '_huella': 1}
+
+PROYECCIONES = {
+    'lanzamientos': {
+        'completo': _COMPLETO,
+        # Desplegables de nueva/editar reserva
+        'selector': _PRODUCTO_SELECTOR,
+        # Clave natural (nombre, juego, coleccion) usada por la importación de reservas
+        'clave': _PRODUCTO_CLAVE,
+        'precio': _PRODUCTO_PRECIO,
+        'referencia': _REFERENCIA,
+        'huella': _PRODUCTO_HUELLA,
+        # Historial de reservas en la vista de clientes
+        'resumen': {'_id': 0, 'id': 1, 'nombre': 1, 'juego': 1, 'coleccion': 1,
+                    'fecha_salida': 1, 'fecha_envio': 1, 'precio': 1, 'precio_reserva': 1},
+        'calendario': {'_id': 0, 'id': 1, 'nombre': 1, 'juego': 1, 'coleccion': 1, 'fecha_salida': 1,
+                       'fecha_envio': 1, 'precio': 1, 'precio_reserva': 1, 'comentario': 1},
+    },
+    'eventos': {
+        'completo': _COMPLETO,
+        'selector': _PRODUCTO_SELECTOR,
+        'clave': _PRODUCTO_CLAVE,
+        'precio': _PRODUCTO_PRECIO,
+        'referencia': _REFERENCIA,
+        'huella': _PRODUCTO_HUELLA,
+        'resumen': {'_id': 0, 'id': 1, 'nombre': 1, 'juego': 1, 'coleccion': 1,
+                    'fecha': 1, 'precio': 1, 'precio_reserva': 1},
+        'calendario': {'_id': 0, 'id': 1, 'nombre': 1, 'juego': 1, 'coleccion': 1, 'fecha': 1,
+                       'precio': 1, 'precio_reserva': 1, 'comentario': 1},
+    },
+    'clientes': {
+        'completo': _COMPLETO,
+        'selector': {'_id': 0, 'id': 1, 'nombre': 1, 'telefono': 1},
+        # Detalle de reservas en la vista de lanzamientos
+        'contacto': {'_id': 0, 'id': 1, 'nombre': 1, 'email': 1, 'telefono': 1},
+        'telefono': {'_id': 0, 'id': 1, 'telefono': 1},
+        'referencia': _REFERENCIA,
+        'huella': {'_id': 0, 'id': 1, 'email': 1, 'telefono': 1, '_huella': 1},
+    },
+    'reservas': {
+        'completo': _COMPLETO,
+        # Comprobaciones de existencia (p. ej. antes de borrar un cliente o un producto)
+        'referencia': _REFERENCIA,
+        'producto': {'_id': 0, 'id': 1, 'lanzamiento_id': 1, 'evento_id': 1},
+        'huella': {'_id': 0, 'id': 1, 'cliente_id': 1, 'lanzamiento_id': 1, 'evento_id': 1,
+                   'fecha_reserva': 1, '_huella': 1},
+        # Detalle de reservas de un producto (filas desplegables del listado de lanzamientos)
+        'detalle': {'_id': 0, 'id': 1, 'cliente_id': 1, 'cantidad': 1, 'fecha_reserva': 1,
+                    'estado': 1, 'pagado': 1, 'pendiente': 1},
+        # Historial de reservas de un cliente (vista de clientes)
+        'historial': {'_id': 0, 'id': 1, 'lanzamiento_id': 1, 'evento_id': 1, 'cantidad': 1,
+                      'fecha_reserva': 1, 'estado': 1, 'pagado': 1, 'pendiente': 1, 'pago_completo': 1},
+    },
+    'staff': {
+        'completo': _COMPLETO,
+    },
+    'juegos_colecciones': {
+        'completo': _COMPLETO,
+        'catalogo': {'_id': 0, 'nombre': 1, 'color': 1, 'colecciones': 1},
+    },
+}
+
+def proyeccion(coleccion, vista='completo'):
+    try:
+        return PROYECCIONES[coleccion][vista]
+    except KeyError:
+        raise ValueError(f"La vista '{vista}' no está definida para la colección '{coleccion}'")
+
+def buscar(coleccion, filtro=None, vista='completo', orden=None, limite=0):
+    cursor = COLECCIONES[coleccion].find(filtro or {}, proyeccion(coleccion, vista))
+    if orden:
+        cursor = cursor.sort(orden)
+    if limite:
+        cursor = cursor.limit(limite)
+    return list(cursor)
+
+def iterar(coleccion, filtro=None, vista='completo', orden=None, tamano_lote=1000):
+    """Como buscar, pero devuelve el cursor para recorrerlo por lotes sin cargarlo entero."""
+    cursor = COLECCIONES[coleccion].find(filtro or {}, proyeccion(coleccion, vista), batch_size=tamano_lote)
+    if orden:
+        cursor = cursor.sort(orden)
+    return cursor
+
+def buscar_uno(coleccion, filtro, vista='completo'):
+    return COLECCIONES[coleccion].find_one(filtro, proyeccion(coleccion, vista))
+
+def obtener_por_id(coleccion, id_documento, vista='completo'):
+    return buscar_uno(coleccion, {'id': id_documento}, vista)
+
+def obtener_por_ids(coleccion, ids, vista='completo'):
+    """Devuelve un dict id -> documento con los documentos de los ids indicados."""
+    ids = [i for i in set(ids) if i]
+    if not ids:
+        return {}
+    return {doc['id']: doc for doc in buscar(coleccion, {'id': {'$in': ids}}, vista)}
+
+def agregar(coleccion, pipeline):
+    # allowDiskUse: los órdenes que no cubre un índice no fallan al pasar de 100 MB
+    return list(COLECCIONES[coleccion].aggregate(pipeline, allowDiskUse=True))
+
+def obtener_clientes_todos(vista='completo'):
+    return buscar('clientes', vista=vista)
+
+def obtener_lanzamientos_todos(vista='completo'):
+    return buscar('lanzamientos', vista=vista)
+
+def obtener_eventos_todos(vista='completo'):
+    return buscar('eventos', vista=vista)
+
+def obtener_reservas_todas(vista='completo'):
+    return buscar('reservas', vista=vista)
+
+def obtener_staff_todos(vista='completo'):
+    return buscar('staff', vista=vista)
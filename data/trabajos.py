@@ -0,0 +1,223 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import gridfs
+import config
+from data.data_manager import TRABAJOS_COLLECTION, obtener_db
+
+# Trabajos en segundo plano: importaciones y exportaciones grandes se ejecutan en un
+# pool de hilos del proceso en lugar de dentro de la petición. El estado se guarda en
+# la colección 'trabajos' y los ficheros (de entrada y resultado) en GridFS, de modo
+# que cualquier worker puede responder al estado o servir la descarga.
+#
+# Un trabajo vive en un hilo del worker que lo recibió: si el proceso muere (reciclado
+# de gunicorn, despliegue, escalado a cero) el trabajo no termina nunca. Cada proceso
+# refresca 'actualizado' en sus trabajos sin terminar cada TRABAJOS_LATIDO_S, y los que
+# llevan más de TRABAJOS_SIN_LATIDO_S sin latido se dan por fallidos. En Cloud Run la
+# CPU debe estar siempre asignada (no solo durante las peticiones) para que los
+# trabajos avancen después de responder con el 202.
+#
+# Documento de un trabajo:
+#   {id, tipo, estado, progreso: {hechos, total, mensaje}, resultado, error,
+#    fichero_id, nombre_fichero, creado, actualizado, pid, host}
+# pid y host son los del proceso que lo ejecuta; 'actualizado' hace de latido.
+PENDIENTE = 'pendiente'
+EN_CURSO = 'en_curso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+ESTADOS_TERMINADOS = (COMPLETADO, ERROR)
+
+BUCKET_FICHEROS = 'ficheros_trabajos'
+
+MENSAJE_SIN_LATIDO = 'El proceso que ejecutaba el trabajo dejó de responder; vuelve a lanzarlo.'
+
+_lock = threading.Lock()
+_executor = None
+_pid_executor = None
+_activos = 0
+_pid_latido = None
+
+
+def _reiniciar_tras_fork():
+    # Los hilos del pool no sobreviven al fork: cada proceso crea el suyo
+    global _executor, _pid_executor, _activos, _pid_latido
+    _executor = None
+    _pid_executor = None
+    _activos = 0
+    _pid_latido = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+def _obtener_executor():
+    global _executor, _pid_executor
+    pid = os.getpid()
+    if _executor is None or _pid_executor != pid:
+        with _lock:
+            if _executor is None or _pid_executor != pid:
+                _executor = ThreadPoolExecutor(max_workers=config.TRABAJOS_MAX_HILOS, thread_name_prefix='trabajo')
+                _pid_executor = pid
+    return _executor
+
+
+def _ahora():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _proceso():
+    return {'pid': os.getpid(), 'host': socket.gethostname()}
+
+
+def _latir():
+    # Mientras el proceso tenga trabajos en cola o en curso, refresca su 'actualizado'
+    while True:
+        time.sleep(config.TRABAJOS_LATIDO_S)
+        if not _activos:
+            continue
+        try:
+            TRABAJOS_COLLECTION.update_many(
+                {**_proceso(), 'estado': {'$in': [PENDIENTE, EN_CURSO]}},
+                {'$set': {'actualizado': _ahora()}}
+            )
+        except Exception as e:
+            logging.warning(f"No se pudo registrar el latido de los trabajos: {e}")
+
+
+def _asegurar_latido():
+    global _pid_latido
+    pid = os.getpid()
+    if _pid_latido == pid:
+        return
+    with _lock:
+        if _pid_latido != pid:
+            _pid_latido = pid
+            threading.Thread(target=_latir, name='trabajos-latido', daemon=True).start()
+
+
+def _cambiar_activos(incremento):
+    global _activos
+    with _lock:
+        _activos += incremento
+
+
+def _bucket():
+    return gridfs.GridFSBucket(obtener_db(), bucket_name=BUCKET_FICHEROS)
+
+
+def guardar_fichero(fichero, nombre):
+    """Guarda un fichero (objeto con read) en GridFS y devuelve su id."""
+    return _bucket().upload_from_stream(nombre, fichero)
+
+
+def abrir_fichero(fichero_id):
+    """Devuelve el fichero de GridFS como objeto de solo lectura (con 'filename' y 'length')."""
+    return _bucket().open_download_stream(fichero_id)
+
+
+def _actualizar(trabajo_id, campos):
+    campos['actualizado'] = _ahora()
+    TRABAJOS_COLLECTION.update_one({'id': trabajo_id}, {'$set': campos})
+
+
+def _ejecutar(trabajo_id, funcion, args, kwargs):
+    try:
+        _ejecutar_trabajo(trabajo_id, funcion, args, kwargs)
+    finally:
+        _cambiar_activos(-1)
+
+
+def _ejecutar_trabajo(trabajo_id, funcion, args, kwargs):
+    _actualizar(trabajo_id, {'estado': EN_CURSO, **_proceso()})
+
+    def progreso(hechos, total=None, mensaje=None):
+        _actualizar(trabajo_id, {'progreso': {'hechos': hechos, 'total': total, 'mensaje': mensaje}})
+
+    try:
+        resultado = funcion(*args, progreso=progreso, **kwargs) or {}
+        campos = {'estado': COMPLETADO, 'resultado': resultado.get('resultado')}
+        if resultado.get('fichero_id') is not None:
+            campos['fichero_id'] = resultado['fichero_id']
+            campos['nombre_fichero'] = resultado.get('nombre_fichero')
+        _actualizar(trabajo_id, campos)
+    except Exception as e:
+        logging.error(f"Trabajo {trabajo_id} fallido: {e}\n{traceback.format_exc()}")
+        _actualizar(trabajo_id, {'estado': ERROR, 'error': str(e)})
+
+
+def enviar_trabajo(tipo, funcion, *args, parametros=None, **kwargs):
+    """
+    Registra un trabajo y lo ejecuta en segundo plano. `funcion` recibe `args`,
+    `kwargs` y una función `progreso(hechos, total=None, mensaje=None)`, y devuelve un
+    dict con 'resultado' (guardado tal cual) y opcionalmente 'fichero_id' y
+    'nombre_fichero' para un fichero descargable. Devuelve el id del trabajo.
+    """
+    limpiar_trabajos()
+    trabajo_id = str(uuid.uuid4())
+    ahora = _ahora()
+    TRABAJOS_COLLECTION.insert_one({
+        'id': trabajo_id,
+        'tipo': tipo,
+        'estado': PENDIENTE,
+        'parametros': parametros or {},
+        'progreso': {'hechos': 0, 'total': None, 'mensaje': None},
+        'creado': ahora,
+        'actualizado': ahora,
+        **_proceso(),
+    })
+    _asegurar_latido()
+    _cambiar_activos(1)
+    _obtener_executor().submit(_ejecutar, trabajo_id, funcion, args, kwargs)
+    return trabajo_id
+
+
+def _filtro_sin_latido():
+    limite = _ahora() - timedelta(seconds=config.TRABAJOS_SIN_LATIDO_S)
+    return {'estado': {'$in': [PENDIENTE, EN_CURSO]}, 'actualizado': {'$lt': limite}}
+
+
+def _marcar_sin_latido(filtro):
+    return TRABAJOS_COLLECTION.update_many(
+        {**filtro, **_filtro_sin_latido()},
+        {'$set': {'estado': ERROR, 'error': MENSAJE_SIN_LATIDO, 'actualizado': _ahora()}}
+    ).modified_count
+
+
+def obtener_trabajo(trabajo_id):
+    trabajo = TRABAJOS_COLLECTION.find_one({'id': trabajo_id}, {'_id': 0})
+    if trabajo and trabajo['estado'] not in ESTADOS_TERMINADOS and _marcar_sin_latido({'id': trabajo_id}):
+        trabajo = TRABAJOS_COLLECTION.find_one({'id': trabajo_id}, {'_id': 0})
+    return trabajo
+
+
+def limpiar_trabajos():
+    """
+    Da por fallidos los trabajos sin latido y borra los creados hace más de
+    TRABAJOS_RETENCION_HORAS junto con sus ficheros.
+    """
+    abandonados = _marcar_sin_latido({})
+    if abandonados:
+        logging.warning(f"{abandonados} trabajos sin latido marcados como fallidos.")
+    limite = _ahora() - timedelta(hours=config.TRABAJOS_RETENCION_HORAS)
+    antiguos = list(TRABAJOS_COLLECTION.find(
+        {'creado': {'$lt': limite}}, {'_id': 0, 'id': 1, 'fichero_id': 1, 'parametros.fichero_id': 1}
+    ))
+    if not antiguos:
+        return 0
+    bucket = _bucket()
+    for trabajo in antiguos:
+        for fichero_id in (trabajo.get('fichero_id'), trabajo.get('parametros', {}).get('fichero_id')):
+            if fichero_id is not None:
+                try:
+                    bucket.delete(fichero_id)
+                except gridfs.errors.NoFile:
+                    pass
+    TRABAJOS_COLLECTION.delete_many({'id': {'$in': [t['id'] for t in antiguos]}})
+    return len(antiguos)
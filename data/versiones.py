@@ -0,0 +1,26 @@
+from pymongo import UpdateOne
+from data.data_manager import VERSIONES_COLLECTION
+
+# Sellos de versión por colección: un documento {_id: coleccion, version, modificado}
+# que se incrementa en cada escritura. Permite responder a peticiones condicionales
+# (ETag / Last-Modified) leyendo un par de documentos pequeños en lugar de la colección.
+# Las escrituras hechas fuera de la aplicación no actualizan el sello.
+
+def marcar_cambio(*colecciones):
+    operaciones = [
+        UpdateOne(
+            {'_id': coleccion},
+            {'$inc': {'version': 1}, '$currentDate': {'modificado': True}},
+            upsert=True
+        )
+        for coleccion in colecciones
+    ]
+    if operaciones:
+        VERSIONES_COLLECTION.bulk_write(operaciones, ordered=False)
+
+def obtener_versiones(colecciones):
+    """Devuelve {coleccion: {'version': int, 'modificado': datetime|None}}."""
+    versiones = {c: {'version': 0, 'modificado': None} for c in colecciones}
+    for doc in VERSIONES_COLLECTION.find({'_id': {'$in': list(colecciones)}}):
+        versiones[doc['_id']] = {'version': doc.get('version', 0), 'modificado': doc.get('modificado')}
+    return versiones
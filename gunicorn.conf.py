@@ -0,0 +1,25 @@
+import os
+import shutil
+import tempfile
+
+# Configuración de gunicorn (se carga sola al arrancar desde la raíz del proyecto).
+#
+# Métricas de Prometheus compartidas entre workers (common/metricas.py): cada proceso
+# escribe sus valores en esta carpeta y /metrics los suma. La variable se define aquí,
+# antes de que el master importe la aplicación.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'jocrol_metricas')
+)
+
+
+def on_starting(server):
+    # Los ficheros de una ejecución anterior falsearían los contadores. Se limpia solo
+    # al arrancar (no en cada recarga) y sin preload_app: la aplicación se importa después
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Los gauges 'livesum' dejan de contar el worker que termina
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
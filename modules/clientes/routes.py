@@ -1,19 +1,32 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import math
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from config import CLIENTES_POR_PAGINA
 from modules.clientes.services import (
-    obtener_clientes_con_reservas, 
+    obtener_clientes_paginados, 
+    obtener_reservas_cliente,
     crear_cliente, 
     eliminar_cliente as eliminar_cliente_servicio,
     obtener_cliente_por_id,
     actualizar_cliente
 )
+from common.condicional import respuesta_condicional
 
 clientes_bp = Blueprint('clientes', __name__, url_prefix='/clientes')
 
 @clientes_bp.route('/')
 def listar_clientes():
-    q_filter = request.args.get('q', '')
-    clientes = obtener_clientes_con_reservas(q_filter)
-    return render_template('clientes/clientes.html', clientes=clientes, filters={'q': q_filter})
+    filters = {
+        'q': request.args.get('q', ''),
+        'page': max(request.args.get('page', 1, type=int), 1),
+        'per_page': min(max(request.args.get('per_page', CLIENTES_POR_PAGINA, type=int), 1), 500)
+    }
+    clientes, total_clientes = obtener_clientes_paginados(filters)
+    paginacion = {
+        'pagina': filters['page'],
+        'total_paginas': max(math.ceil(total_clientes / filters['per_page']), 1),
+        'total': total_clientes
+    }
+    return render_template('clientes/clientes.html', clientes=clientes, filters=filters, paginacion=paginacion)
 
 @clientes_bp.route('/nuevo', methods=['GET', 'POST'])
 def nuevo_cliente():
@@ -66,3 +79,11 @@ def eliminar_cliente(cliente_id):
     except ValueError as e:
         flash(str(e), 'danger')
     return redirect(url_for('clientes.listar_clientes'))
+
+@clientes_bp.route('/api/<cliente_id>/reservas')
+def api_reservas_cliente(cliente_id):
+    return respuesta_condicional(
+        ['reservas', 'lanzamientos', 'eventos'],
+        lambda: jsonify(obtener_reservas_cliente(cliente_id)),
+        variante=cliente_id
+    )
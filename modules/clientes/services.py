@@ -1,118 +1,137 @@
 import uuid
-from data.data_manager import CLIENTES_COLLECTION, RESERVAS_COLLECTION, LANZAMIENTOS_COLLECTION, EVENTOS_COLLECTION
-from collections import defaultdict
-
-def obtener_clientes_todos():
-    return list(CLIENTES_COLLECTION.find({}, {'_id': 0}))
+from data.data_manager import CLIENTES_COLLECTION
+from data import repositorio
+from data.versiones import marcar_cambio
+from common.metricas import contar_operacion
+from config import CLIENTES_POR_PAGINA
+from common.busqueda import CAMPO_BUSQUEDA, claves_documento, filtro_busqueda
 
 def obtener_cliente_por_id(cliente_id):
-    return CLIENTES_COLLECTION.find_one({'id': cliente_id}, {'_id': 0})
-
-def obtener_reservas_todas():
-    return list(RESERVAS_COLLECTION.find({}, {'_id': 0}))
-
-def obtener_lanzamientos_todos():
-    return list(LANZAMIENTOS_COLLECTION.find({}, {'_id': 0}))
+    return repositorio.obtener_por_id('clientes', cliente_id)
 
-def obtener_eventos_todos():
-    return list(EVENTOS_COLLECTION.find({}, {'_id': 0}))
-
-def crear_cliente(nombre, email=None, telefono=None):
+def construir_cliente(nombre, email=None, telefono=None):
+    """Documento de un cliente nuevo, sin comprobar la unicidad del email."""
     if not nombre:
         raise ValueError("El nombre del cliente es obligatorio.")
 
-    if email and CLIENTES_COLLECTION.find_one({'email': email}):
-        raise ValueError(f"El email '{email}' ya está registrado.")
-
     nuevo_cliente = {
         'id': str(uuid.uuid4()),
         'nombre': nombre,
         'email': email,
         'telefono': telefono
     }
+    nuevo_cliente[CAMPO_BUSQUEDA] = claves_documento('clientes', nuevo_cliente)
+    return nuevo_cliente
+
+@contar_operacion('crear_cliente')
+def crear_cliente(nombre, email=None, telefono=None):
+    nuevo_cliente = construir_cliente(nombre, email, telefono)
+
+    if email and repositorio.buscar_uno('clientes', {'email': email}, 'selector'):
+        raise ValueError(f"El email '{email}' ya está registrado.")
 
     CLIENTES_COLLECTION.insert_one(nuevo_cliente)
-    # Quitar el _id de pymongo para que el resto de la app no se rompa
+    marcar_cambio('clientes')
+    # Quitar el _id de pymongo y las claves de búsqueda para que el resto de la app no se rompa
     del nuevo_cliente['_id']
+    del nuevo_cliente[CAMPO_BUSQUEDA]
     return nuevo_cliente
 
+@contar_operacion('actualizar_cliente')
 def actualizar_cliente(cliente_id, nombre, email=None, telefono=None):
     if not nombre:
         raise ValueError("El nombre del cliente es obligatorio.")
 
     if email:
-        existing_client = CLIENTES_COLLECTION.find_one({'email': email})
+        existing_client = repositorio.buscar_uno('clientes', {'email': email}, 'selector')
         if existing_client and existing_client.get('id') != cliente_id:
             raise ValueError(f"El email '{email}' ya está registrado por otro cliente.")
 
-    update_data = {
-        '$set': {
-            'nombre': nombre,
-            'email': email,
-            'telefono': telefono
-        }
+    campos = {
+        'nombre': nombre,
+        'email': email,
+        'telefono': telefono
     }
+    campos[CAMPO_BUSQUEDA] = claves_documento('clientes', campos)
+    update_data = {'$set': campos}
 
     result = CLIENTES_COLLECTION.update_one({'id': cliente_id}, update_data)
     
     if result.matched_count == 0:
         raise ValueError(f"No se encontró el cliente con ID {cliente_id}")
+    marcar_cambio('clientes')
 
+@contar_operacion('eliminar_cliente')
 def eliminar_cliente(cliente_id):
-    if RESERVAS_COLLECTION.find_one({'cliente_id': cliente_id}):
+    if repositorio.buscar_uno('reservas', {'cliente_id': cliente_id}, 'referencia'):
         raise ValueError("No se puede eliminar un cliente que tiene reservas asociadas.")
 
     result = CLIENTES_COLLECTION.delete_one({'id': cliente_id})
     
     if result.deleted_count == 0:
         raise ValueError(f"No se encontró el cliente con ID {cliente_id}")
+    marcar_cambio('clientes')
+
+def obtener_clientes_paginados(filters):
+    """
+    Devuelve (clientes de la página, número total de clientes) con una sola agregación.
+    Cada cliente lleva un 'resumen' con su número de reservas y el importe pendiente;
+    el historial de reservas se pide aparte con obtener_reservas_cliente.
+    Admite 'q', 'page' y 'per_page'.
+    """
+    page = max(int(filters.get('page') or 1), 1)
+    per_page = min(max(int(filters.get('per_page') or CLIENTES_POR_PAGINA), 1), 500)
 
-def obtener_clientes_con_reservas(q_filter=None):
     pipeline = []
-    if q_filter:
-        q = q_filter.lower()
-        pipeline.append({
-            '$match': {
-                '$or': [
-                    {'nombre': {'$regex': q, '$options': 'i'}},
-                    {'email': {'$regex': q, '$options': 'i'}},
-                    {'telefono': {'$regex': q, '$options': 'i'}}
-                ]
-            }
-        })
-    
-    # Proyectar para excluir _id
-    pipeline.append({'$project': {'_id': 0}})
-
-    clientes_filtrados = list(CLIENTES_COLLECTION.aggregate(pipeline))
-    cliente_ids = [c['id'] for c in clientes_filtrados]
-
-    reservas_por_cliente = defaultdict(list)
-    lanzamiento_ids = set()
-    evento_ids = set()
-
-    if cliente_ids:
-        reservas_cursor = RESERVAS_COLLECTION.find({'cliente_id': {'$in': cliente_ids}}, {'_id': 0})
-        for res in reservas_cursor:
-            reservas_por_cliente[res['cliente_id']].append(res)
-            if res.get('lanzamiento_id'):
-                lanzamiento_ids.add(res.get('lanzamiento_id'))
-            if res.get('evento_id'):
-                evento_ids.add(res.get('evento_id'))
-
-    lanzamientos = {l['id']: l for l in LANZAMIENTOS_COLLECTION.find({'id': {'$in': list(lanzamiento_ids)}}, {'_id': 0})}
-    eventos = {e['id']: e for e in EVENTOS_COLLECTION.find({'id': {'$in': list(evento_ids)}}, {'_id': 0})}
-
-    for cliente in clientes_filtrados:
-        reservas_cliente = reservas_por_cliente.get(cliente['id'], [])
-        for res in reservas_cliente:
-            item = None
-            if res.get('lanzamiento_id'):
-                item = lanzamientos.get(res.get('lanzamiento_id'))
-            elif res.get('evento_id'):
-                item = eventos.get(res.get('evento_id'))
-            res['item'] = item
-        cliente['reservas'] = reservas_cliente
-
-    return clientes_filtrados
-
+    filtro_q = filtro_busqueda(filters.get('q'))
+    if filtro_q:
+        pipeline.append({'$match': filtro_q})
+
+    # El orden va antes del $facet para usar el índice (nombre, id): dentro no hay índices
+    pipeline.append({'$sort': {'nombre': 1, 'id': 1}})
+
+    # Los resúmenes solo se calculan para los clientes de la página. localField/foreignField
+    # junto con pipeline (MongoDB 5.0+) busca las reservas por el índice de cliente_id
+    filas = [
+        {'$skip': (page - 1) * per_page},
+        {'$limit': per_page},
+        {'$lookup': {
+            'from': 'reservas',
+            'localField': 'id',
+            'foreignField': 'cliente_id',
+            'pipeline': [
+                {'$group': {
+                    '_id': None,
+                    'reservas': {'$sum': 1},
+                    'pendiente': {'$sum': {'$cond': ['$pago_completo', 0, '$pendiente']}}
+                }},
+                {'$project': {'_id': 0}}
+            ],
+            'as': 'resumen'
+        }},
+        {'$set': {'resumen': {'$ifNull': [{'$arrayElemAt': ['$resumen', 0]}, {'reservas': 0, 'pendiente': 0}]}}},
+        # Proyectar para excluir _id y los campos internos
+        {'$project': repositorio.proyeccion('clientes')}
+    ]
+    pipeline.append({'$facet': {'filas': filas, 'total': [{'$count': 'total'}]}})
+
+    resultado = repositorio.agregar('clientes', pipeline)[0]
+    total = resultado['total'][0]['total'] if resultado['total'] else 0
+    return resultado['filas'], total
+
+def obtener_reservas_cliente(cliente_id):
+    """Historial de reservas de un cliente con el lanzamiento o evento de cada una."""
+    reservas = repositorio.buscar(
+        'reservas', {'cliente_id': cliente_id}, 'historial', orden=[('fecha_reserva', -1), ('id', 1)]
+    )
+    lanzamientos = repositorio.obtener_por_ids('lanzamientos', [r.get('lanzamiento_id') for r in reservas], 'resumen')
+    eventos = repositorio.obtener_por_ids('eventos', [r.get('evento_id') for r in reservas], 'resumen')
+
+    for res in reservas:
+        item = None
+        if res.get('lanzamiento_id'):
+            item = lanzamientos.get(res.get('lanzamiento_id'))
+        elif res.get('evento_id'):
+            item = eventos.get(res.get('evento_id'))
+        res['item'] = item
+    return reservas
@@ -7,6 +7,7 @@ from modules.eventos.services import (
     eliminar_evento as eliminar_evento_servicio,
     obtener_juegos_y_colecciones
 )
+from common.condicional import respuesta_condicional
 
 eventos_bp = Blueprint('eventos', __name__, url_prefix='/eventos')
 
@@ -23,7 +24,11 @@ def listar_eventos():
 def nuevo_evento():
     if request.method == 'POST':
         datos_evento = request.form.to_dict()
-        crear_evento(datos_evento)
+        try:
+            crear_evento(datos_evento)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('eventos.nuevo_evento'))
         flash('Evento creado con éxito.', 'success')
         return redirect(url_for('eventos.listar_eventos'))
     juegos_y_colecciones = obtener_juegos_y_colecciones()
@@ -38,7 +43,11 @@ def editar_evento(evento_id):
 
     if request.method == 'POST':
         datos_evento = request.form.to_dict()
-        actualizar_evento(evento_id, datos_evento)
+        try:
+            actualizar_evento(evento_id, datos_evento)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('eventos.editar_evento', evento_id=evento_id))
         flash('Evento actualizado con éxito.', 'success')
         return redirect(url_for('eventos.listar_eventos'))
 
@@ -61,4 +70,4 @@ def calendario_eventos():
 
 @eventos_bp.route('/api/juegos_colecciones')
 def api_juegos_colecciones():
-    return jsonify(obtener_juegos_y_colecciones())
+    return respuesta_condicional(['juegos_colecciones'], lambda: jsonify(obtener_juegos_y_colecciones()))
@@ -0,0 +1,134 @@
+import itertools
+import tempfile
+from datetime import datetime
+from openpyxl import Workbook
+from data import repositorio
+from data.catalogo import obtener_juegos_y_colecciones
+from common.metricas import contar_filas, contar_operacion
+
+# Exportación a Excel en memoria constante: el libro se escribe en modo write-only
+# (las filas van directamente al fichero), las colecciones se recorren con cursores
+# por lotes y el resultado se guarda en un fichero temporal que se envía después.
+TAMANO_LOTE = 1000
+
+CABECERAS_RESERVAS = ['telefono_cliente', 'tipo', 'nombre', 'juego', 'coleccion', 'cantidad',
+                      'fecha_reserva', 'estado', 'pagado', 'tipo_pago', 'notas']
+
+
+def _lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while True:
+        lote = list(itertools.islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _celda(valor):
+    # Las fechas se guardan a medianoche: como date, Excel las muestra sin hora
+    if isinstance(valor, datetime):
+        return valor.date()
+    return valor
+
+
+def escribir_hoja_coleccion(wb, sheet_name, coleccion, headers_to_exclude=None):
+    """Crea una hoja con todos los documentos de `coleccion`; las columnas salen del primero."""
+    ws = wb.create_sheet(title=sheet_name)
+    cursor = repositorio.iterar(coleccion, orden=[('_id', 1)], tamano_lote=TAMANO_LOTE)
+    primero = next(cursor, None)
+    if primero is None:
+        ws.append(["No hay datos disponibles."])
+        return
+
+    headers = [key for key in primero.keys() if key not in (headers_to_exclude or [])]
+    ws.append(headers)
+    filas = 0
+    for item in itertools.chain([primero], cursor):
+        ws.append([_celda(item.get(h, '')) for h in headers])
+        filas += 1
+    contar_filas('exportacion_excel', coleccion, filas)
+
+
+def escribir_hojas_catalogo(wb):
+    juegos_data = obtener_juegos_y_colecciones()
+    ws_juegos = wb.create_sheet(title='Juegos')
+    ws_juegos.append(['Juego', 'Color'])
+    ws_colecciones = wb.create_sheet(title='Colecciones')
+    ws_colecciones.append(['Coleccion', 'Juego'])
+
+    for juego, details in juegos_data.get('juegos', {}).items():
+        ws_juegos.append([juego, details.get('color', '')])
+        for coleccion in details.get('colecciones', []):
+            ws_colecciones.append([coleccion, juego])
+
+
+def escribir_hoja_reservas(wb):
+    """
+    Hoja de reservas con el teléfono del cliente y la clave natural del producto.
+    Los cruces se resuelven por lotes: cada lote de reservas hace como mucho tres
+    consultas $in acotadas al tamaño del lote, en lugar de cargar las colecciones enteras.
+    """
+    ws = wb.create_sheet(title='Reservas')
+    ws.append(CABECERAS_RESERVAS)
+
+    cursor = repositorio.iterar('reservas', orden=[('_id', 1)], tamano_lote=TAMANO_LOTE)
+    for lote in _lotes(cursor, TAMANO_LOTE):
+        contar_filas('exportacion_excel', 'reservas', len(lote))
+        clientes_map = repositorio.obtener_por_ids('clientes', [r.get('cliente_id') for r in lote], 'telefono')
+        lanzamientos_map = repositorio.obtener_por_ids('lanzamientos', [r.get('lanzamiento_id') for r in lote], 'clave')
+        eventos_map = repositorio.obtener_por_ids('eventos', [r.get('evento_id') for r in lote], 'clave')
+
+        for reserva in lote:
+            cliente_telefono = clientes_map.get(reserva.get('cliente_id'), {}).get('telefono', '-')
+
+            tipo, item = '', None
+            if reserva.get('lanzamiento_id'):
+                tipo, item = 'Lanzamiento', lanzamientos_map.get(reserva.get('lanzamiento_id'))
+            elif reserva.get('evento_id'):
+                tipo, item = 'Evento', eventos_map.get(reserva.get('evento_id'))
+            if not item:
+                tipo, item = '', {}
+
+            ws.append([
+                cliente_telefono,
+                tipo,
+                item.get('nombre', ''),
+                item.get('juego', ''),
+                item.get('coleccion', ''),
+                reserva.get('cantidad', ''),
+                _celda(reserva.get('fecha_reserva', '')),
+                reserva.get('estado', ''),
+                reserva.get('pagado', ''),
+                reserva.get('tipo_pago', ''),
+                reserva.get('notas', '')
+            ])
+
+
+@contar_operacion('exportar_excel')
+def generar_excel(progreso=None):
+    """
+    Genera el Excel completo en un fichero temporal anónimo y lo devuelve abierto y
+    posicionado al principio. El fichero se borra al cerrarlo.
+    `progreso(hechos, total=None, mensaje=None)`, si se indica, se llama tras cada hoja.
+    """
+    pasos = [
+        ('Juegos y colecciones', escribir_hojas_catalogo, {}),
+        ('Clientes', escribir_hoja_coleccion, {'sheet_name': 'Clientes', 'coleccion': 'clientes', 'headers_to_exclude': ['id']}),
+        ('Eventos', escribir_hoja_coleccion, {'sheet_name': 'Eventos', 'coleccion': 'eventos', 'headers_to_exclude': ['id']}),
+        ('Lanzamientos', escribir_hoja_coleccion, {'sheet_name': 'Lanzamientos', 'coleccion': 'lanzamientos', 'headers_to_exclude': ['id']}),
+        ('Reservas', escribir_hoja_reservas, {}),
+    ]
+    wb = Workbook(write_only=True)
+    for hechos, (nombre, escribir, kwargs) in enumerate(pasos, start=1):
+        escribir(wb, **kwargs)
+        if progreso:
+            progreso(hechos, len(pasos), f"Hoja {nombre} escrita")
+
+    fichero = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        wb.save(fichero)
+        fichero.seek(0)
+    except Exception:
+        fichero.close()
+        raise
+    return fichero
@@ -0,0 +1,405 @@
+import hashlib
+import itertools
+import json
+from openpyxl import load_workbook
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import config
+from common.busqueda import CAMPO_BUSQUEDA
+from data import repositorio
+from data.catalogo import actualizar_juegos, anadir_colecciones, guardar_catalogo
+from data.versiones import marcar_cambio
+from common.metricas import contar_filas, contar_operacion
+from modules.clientes.services import construir_cliente
+from modules.eventos.services import construir_evento
+from modules.lanzamientos.services import construir_lanzamiento
+from modules.reservas.services import construir_reserva
+from modules.reservas.totales import recalcular_totales_producto
+
+# Importación de hojas Excel por lotes: el libro se lee en modo read_only fila a fila,
+# cada lote se valida y se convierte en documentos, las comprobaciones de unicidad y
+# los cruces se resuelven con una consulta $in por lote, y los documentos se insertan
+# con insert_many. Los errores se devuelven por fila en lugar de abortar la importación.
+#
+# El modo 'merge' casa cada fila con el documento existente por su clave natural y
+# solo escribe las filas cuyo contenido ha cambiado desde la última importación,
+# comparando la huella ('_huella') que se guarda en cada documento importado.
+MODOS = ('overwrite', 'append', 'merge')
+HOJAS_CATALOGO = ('Juegos', 'Colecciones')
+
+CAMPO_HUELLA = '_huella'
+# Campos que no forman parte del contenido importado: generados o derivados de otros
+CAMPOS_SIN_HUELLA = ('id', CAMPO_BUSQUEDA, CAMPO_HUELLA, 'total', 'pendiente', 'pago_completo')
+
+# Colección -> campos de su clave natural. El primero se usa para buscar los existentes.
+CLAVES_NATURALES = {
+    'clientes': ('telefono',),
+    'lanzamientos': ('nombre', 'juego', 'coleccion'),
+    'eventos': ('nombre', 'juego', 'coleccion'),
+    'reservas': ('cliente_id', 'lanzamiento_id', 'evento_id', 'fecha_reserva'),
+}
+
+
+def _lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while True:
+        lote = list(itertools.islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _valor(valor):
+    """Normaliza el valor de una celda: fechas a 'YYYY-MM-DD', textos sin espacios y vacíos a None."""
+    if hasattr(valor, 'strftime'):
+        return valor.strftime('%Y-%m-%d')
+    if isinstance(valor, str):
+        return valor.strip() or None
+    return valor
+
+
+def _texto(valor):
+    """Valor de celda como texto (los teléfonos suelen llegar como números)."""
+    valor = _valor(valor)
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor)
+
+
+def leer_filas(fichero, hoja):
+    """
+    Devuelve un generador de (número de fila, dict cabecera -> valor) de la hoja `hoja`.
+    Las filas vacías se saltan. Lanza ValueError si la hoja no existe.
+    """
+    wb = load_workbook(fichero, read_only=True, data_only=True)
+    if hoja not in wb.sheetnames:
+        wb.close()
+        raise ValueError(f"La hoja '{hoja}' no existe en el fichero.")
+
+    def filas():
+        try:
+            valores_filas = wb[hoja].iter_rows(values_only=True)
+            cabeceras = next(valores_filas, None) or ()
+            cabeceras = [_texto(c) for c in cabeceras]
+            for numero, valores in enumerate(valores_filas, start=2):
+                fila = {c: _valor(v) for c, v in zip(cabeceras, valores) if c}
+                if any(v is not None for v in fila.values()):
+                    yield numero, fila
+        finally:
+            wb.close()
+
+    return filas()
+
+
+def _error(resultado, numero, mensaje):
+    resultado['errores'].append((numero, mensaje))
+
+
+def _email_ocupado(email, telefono, existentes, vistos, modo):
+    if modo == 'merge':
+        # En modo merge el email puede ser ya del mismo cliente (mismo teléfono)
+        return any(email in emails and emails[email] != telefono for emails in (existentes, vistos))
+    return email in existentes or email in vistos
+
+
+def _preparar_clientes(lote, resultado, estado, modo):
+    emails = {_texto(fila.get('email')) for _, fila in lote} - {None}
+    existentes = {
+        c['email']: _texto(c.get('telefono'))
+        for c in repositorio.buscar('clientes', {'email': {'$in': list(emails)}}, 'contacto')
+    } if emails else {}
+    vistos = estado.setdefault('emails', {})
+
+    documentos = []
+    for numero, fila in lote:
+        try:
+            doc = construir_cliente(_texto(fila.get('nombre')), _texto(fila.get('email')), _texto(fila.get('telefono')))
+        except ValueError as e:
+            _error(resultado, numero, str(e))
+            continue
+        email = doc['email']
+        if email and _email_ocupado(email, doc['telefono'], existentes, vistos, modo):
+            _error(resultado, numero, f"El email '{email}' ya está registrado.")
+            continue
+        if email:
+            vistos[email] = doc['telefono']
+        documentos.append((numero, doc))
+    return documentos
+
+
+def _preparar_productos(construir):
+    def preparar(lote, resultado, estado, modo):
+        documentos = []
+        for numero, fila in lote:
+            datos = dict(fila)
+            # La exportación escribe 'precio_reserva'; el formulario de eventos usa 'reserva'
+            datos.setdefault('reserva', fila.get('precio_reserva'))
+            try:
+                documentos.append((numero, construir(datos)))
+            except (TypeError, ValueError) as e:
+                _error(resultado, numero, f"Datos no válidos: {e}")
+        return documentos
+    return preparar
+
+
+def _clave_producto(datos):
+    return tuple(_texto(datos.get(campo)) or '' for campo in ('nombre', 'juego', 'coleccion'))
+
+
+def _productos_por_clave(coleccion, claves):
+    """Productos (vista 'selector') de `coleccion` indexados por (nombre, juego, coleccion)."""
+    nombres = list({clave[0] for clave in claves if clave[0]})
+    if not nombres:
+        return {}
+    return {
+        _clave_producto(p): p
+        for p in repositorio.buscar(coleccion, {'nombre': {'$in': nombres}}, 'selector')
+    }
+
+
+def _preparar_reservas(lote, resultado, estado, modo):
+    telefonos = list({_texto(fila.get('telefono_cliente')) for _, fila in lote} - {None})
+    clientes_map = {
+        _texto(c.get('telefono')): c['id']
+        for c in repositorio.buscar('clientes', {'telefono': {'$in': telefonos}}, 'telefono')
+    } if telefonos else {}
+    claves_eventos = {_clave_producto(fila) for _, fila in lote if fila.get('tipo') == 'Evento'}
+    claves_lanzamientos = {_clave_producto(fila) for _, fila in lote if fila.get('tipo') != 'Evento'}
+    eventos_map = _productos_por_clave('eventos', claves_eventos)
+    lanzamientos_map = _productos_por_clave('lanzamientos', claves_lanzamientos)
+
+    documentos = []
+    for numero, fila in lote:
+        telefono = _texto(fila.get('telefono_cliente'))
+        cliente_id = clientes_map.get(telefono)
+        if not cliente_id:
+            _error(resultado, numero, f"Cliente con teléfono {telefono} no encontrado.")
+            continue
+
+        clave = _clave_producto(fila)
+        if fila.get('tipo') == 'Evento':
+            tipo_producto, item = 'evento', eventos_map.get(clave)
+        else:  # Asumir Lanzamiento por defecto
+            tipo_producto, item = 'lanzamiento', lanzamientos_map.get(clave)
+        if not item:
+            _error(resultado, numero, f"Producto no encontrado: {clave}.")
+            continue
+
+        if not fila.get('fecha_reserva') and modo == 'merge':
+            # Forma parte de la clave natural: con la fecha de hoy no casaría con la
+            # reserva ya importada y se crearía otra en cada importación
+            _error(resultado, numero, "Falta la fecha de reserva (necesaria en modo merge).")
+            continue
+
+        datos_reserva = {
+            'cliente_id': cliente_id,
+            'tipo_producto': tipo_producto,
+            'producto_id': item['id'],
+            'cantidad': fila.get('cantidad'),
+            'fecha_reserva': fila.get('fecha_reserva'),
+            'estado': fila.get('estado'),
+            'pagado': fila.get('pagado'),
+            'tipo_pago': fila.get('tipo_pago'),
+            'notas': fila.get('notas')
+        }
+        try:
+            doc = construir_reserva({k: v for k, v in datos_reserva.items() if v is not None}, item)
+        except (TypeError, ValueError) as e:
+            _error(resultado, numero, f"Datos no válidos: {e}")
+            continue
+        if not fila.get('fecha_reserva'):
+            doc[CAMPO_HUELLA] = calcular_huella(doc, por_defecto=('fecha_reserva',))
+        documentos.append((numero, doc))
+    return documentos
+
+
+# Hoja -> (colección, función que convierte un lote de filas en documentos)
+IMPORTADORES = {
+    'Clientes': ('clientes', _preparar_clientes),
+    'Eventos': ('eventos', _preparar_productos(construir_evento)),
+    'Lanzamientos': ('lanzamientos', _preparar_productos(construir_lanzamiento)),
+    'Reservas': ('reservas', _preparar_reservas),
+}
+
+
+def _insertar(coleccion, documentos, resultado):
+    if not documentos:
+        return
+    try:
+        insertados = repositorio.COLECCIONES[coleccion].insert_many([doc for _, doc in documentos], ordered=False)
+        resultado['importadas'] += len(insertados.inserted_ids)
+    except BulkWriteError as e:
+        # Con ordered=False se insertan todos los documentos válidos; se anotan los fallidos
+        resultado['importadas'] += e.details.get('nInserted', 0)
+        for error in e.details.get('writeErrors', []):
+            _error(resultado, documentos[error['index']][0], error.get('errmsg', 'Error al insertar.'))
+
+
+def calcular_huella(doc, por_defecto=()):
+    """
+    Huella (sha1) del contenido importado de un documento. `por_defecto` son los campos
+    que no venían en la fila y se rellenaron al construir el documento (p. ej. la
+    fecha de una reserva, que toma la de hoy): no son contenido importado y, si
+    contasen, la huella cambiaría de un día para otro con la misma fila.
+    """
+    contenido = {k: v for k, v in doc.items() if k not in CAMPOS_SIN_HUELLA and k not in por_defecto}
+    return hashlib.sha1(json.dumps(contenido, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _clave_natural(coleccion, doc):
+    return tuple(_texto(doc.get(campo)) or '' for campo in CLAVES_NATURALES[coleccion])
+
+
+def _existentes_por_clave(coleccion, documentos):
+    """Documentos ya guardados que comparten clave natural con los del lote, por clave."""
+    campo = CLAVES_NATURALES[coleccion][0]
+    valores = list({doc.get(campo) for _, doc in documentos} - {None})
+    if not valores:
+        return {}
+    return {
+        _clave_natural(coleccion, existente): existente
+        for existente in repositorio.buscar(coleccion, {campo: {'$in': valores}}, 'huella')
+    }
+
+
+def clasificar_fusion(coleccion, documentos, existentes, resultado, estado):
+    """
+    Casa cada documento con el existente de su clave natural (`existentes`, por clave).
+    Cuenta en `resultado` los que no han cambiado y anota como error las filas sin
+    clave o repetidas. Devuelve [(numero, doc, existente o None)] de los que hay que
+    escribir: nuevos (sin existente) y cambiados (con otra huella).
+    """
+    claves_vistas = estado.setdefault('claves', set())
+    campos_clave = CLAVES_NATURALES[coleccion]
+
+    pendientes = []
+    for numero, doc in documentos:
+        clave = _clave_natural(coleccion, doc)
+        if not any(clave):
+            _error(resultado, numero, f"Falta la clave natural ({', '.join(campos_clave)}).")
+            continue
+        if clave in claves_vistas:
+            _error(resultado, numero, f"Fila repetida para la clave {clave}.")
+            continue
+        claves_vistas.add(clave)
+
+        existente = existentes.get(clave)
+        if existente and existente.get(CAMPO_HUELLA) == doc[CAMPO_HUELLA]:
+            resultado['sin_cambios'] += 1
+            continue
+        pendientes.append((numero, doc, existente))
+    return pendientes
+
+
+def _fusionar(coleccion, documentos, resultado, estado):
+    """Upsert por clave natural de los documentos cuya huella ha cambiado."""
+    existentes = _existentes_por_clave(coleccion, documentos)
+    campos_clave = CLAVES_NATURALES[coleccion]
+
+    operaciones, numeros, precios_cambiados = [], [], []
+    for numero, doc, existente in clasificar_fusion(coleccion, documentos, existentes, resultado, estado):
+        contenido = {k: v for k, v in doc.items() if k != 'id'}
+        if existente:
+            operaciones.append(UpdateOne({'id': existente['id']}, {'$set': contenido}))
+            precios = (existente.get('precio'), existente.get('precio_reserva'))
+            if coleccion in ('lanzamientos', 'eventos') and precios != (doc.get('precio'), doc.get('precio_reserva')):
+                precios_cambiados.append(existente['id'])
+        else:
+            filtro = {campo: doc.get(campo) for campo in campos_clave}
+            operaciones.append(UpdateOne(filtro, {'$set': contenido, '$setOnInsert': {'id': doc['id']}}, upsert=True))
+        numeros.append(numero)
+
+    if operaciones:
+        try:
+            escritura = repositorio.COLECCIONES[coleccion].bulk_write(operaciones, ordered=False)
+            resultado['importadas'] += escritura.upserted_count
+            resultado['actualizadas'] += escritura.matched_count
+        except BulkWriteError as e:
+            resultado['importadas'] += e.details.get('nUpserted', 0)
+            resultado['actualizadas'] += e.details.get('nMatched', 0)
+            for error in e.details.get('writeErrors', []):
+                _error(resultado, numeros[error['index']], error.get('errmsg', 'Error al escribir.'))
+
+    # Las reservas guardan sus totales: se recalculan si cambia el precio del producto
+    campo_producto = 'lanzamiento_id' if coleccion == 'lanzamientos' else 'evento_id'
+    for producto_id in precios_cambiados:
+        recalcular_totales_producto(**{campo_producto: producto_id})
+
+
+def importar_catalogo(hoja, filas, modo):
+    if modo == 'overwrite':
+        if hoja == 'Juegos':
+            guardar_catalogo({fila.get('Juego'): {'color': fila.get('Color', ''), 'colecciones': []} for _, fila in filas})
+        else:  # Colecciones
+            raise ValueError('Para sobrescribir colecciones, por favor, sobrescriba la hoja "Juegos" y luego añada las colecciones.')
+    else:  # Append
+        # Se escribe juego a juego en MongoDB en lugar de guardar una copia del catálogo
+        # en caché: así no se pierden los cambios hechos entre tanto por otro proceso
+        if hoja == 'Juegos':
+            actualizar_juegos({fila.get('Juego'): fila.get('Color') for _, fila in filas})
+        elif hoja == 'Colecciones':
+            anadir_colecciones([(fila.get('Juego'), fila.get('Coleccion')) for _, fila in filas])
+
+
+def validar_importacion(hoja, modo):
+    """Lanza ValueError si la hoja o el modo de importación no son válidos."""
+    if modo not in MODOS:
+        raise ValueError(f"Modo de importación no válido: '{modo}'")
+    if hoja not in HOJAS_CATALOGO and hoja not in IMPORTADORES:
+        raise ValueError(f"La importación para la hoja '{hoja}' no está implementada.")
+
+
+@contar_operacion('importar_excel')
+def importar_excel(fichero, hoja, modo='overwrite', tamano_lote=None, progreso=None):
+    """
+    Importa la hoja `hoja` del fichero Excel. Devuelve un dict con 'filas' (filas
+    leídas), 'importadas' (documentos nuevos), 'actualizadas' y 'sin_cambios' (modo
+    merge) y 'errores' (lista de (número de fila, mensaje)).
+    `progreso(hechos, total=None, mensaje=None)`, si se indica, se llama tras cada lote.
+    Lanza ValueError si la hoja o el modo no son válidos.
+    """
+    validar_importacion(hoja, modo)
+
+    resultado = {'filas': 0, 'importadas': 0, 'actualizadas': 0, 'sin_cambios': 0, 'errores': []}
+    filas = leer_filas(fichero, hoja)
+
+    def contar(filas):
+        for fila in filas:
+            resultado['filas'] += 1
+            yield fila
+
+    if hoja in HOJAS_CATALOGO:
+        filas = list(contar(filas))
+        # El catálogo se fusiona por nombre de juego: 'merge' equivale a 'append'
+        importar_catalogo(hoja, filas, 'append' if modo == 'merge' else modo)
+        resultado['importadas'] = len(filas)
+        contar_filas('importacion', 'juegos_colecciones', resultado['filas'])
+        return resultado
+
+    coleccion, preparar = IMPORTADORES[hoja]
+    if modo == 'overwrite':
+        repositorio.COLECCIONES[coleccion].delete_many({})
+        marcar_cambio(coleccion)
+
+    # Valores ya vistos en esta importación (emails, claves naturales), para detectar
+    # duplicados entre lotes
+    estado = {}
+    for lote in _lotes(contar(filas), tamano_lote or config.IMPORTACION_TAMANO_LOTE):
+        documentos = preparar(lote, resultado, estado, modo)
+        for _, doc in documentos:
+            # Las funciones de preparación la calculan ya si han rellenado campos por defecto
+            if CAMPO_HUELLA not in doc:
+                doc[CAMPO_HUELLA] = calcular_huella(doc)
+        if modo == 'merge':
+            _fusionar(coleccion, documentos, resultado, estado)
+        else:
+            _insertar(coleccion, documentos, resultado)
+        if progreso:
+            progreso(resultado['filas'], mensaje=f"{resultado['filas']} filas procesadas")
+
+    if resultado['importadas'] or resultado['actualizadas']:
+        marcar_cambio(coleccion)
+    contar_filas('importacion', coleccion, resultado['filas'])
+    return resultado
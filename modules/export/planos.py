@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from data import repositorio
+from data.esquema import a_fecha, fecha_iso
+from common.metricas import contar_filas, contar_operacion_diferida
+
+# Exportación por colección a CSV y NDJSON. Las filas salen del cursor de MongoDB
+# directamente a la respuesta a través de un generador, así que la memoria usada no
+# depende del tamaño de la colección. Pensado para sincronizaciones que piden deltas
+# por rango de fechas.
+TAMANO_LOTE = 1000
+FILAS_POR_TROZO = 500
+
+# Colección -> campo de fecha por el que filtran start_date/end_date (None: sin fecha)
+COLECCIONES_EXPORTABLES = {
+    'clientes': None,
+    'lanzamientos': 'fecha_salida',
+    'eventos': 'fecha',
+    'reservas': 'fecha_reserva',
+}
+
+# Colecciones que tienen el campo 'juego'
+COLECCIONES_CON_JUEGO = ('lanzamientos', 'eventos')
+
+# Campos internos que nunca se exportan
+CAMPOS_OCULTOS = ('_id',) + repositorio.CAMPOS_INTERNOS
+
+
+def construir_filtro(coleccion, filters):
+    """Filtro de MongoDB a partir de los filtros 'start_date', 'end_date' y 'juego'."""
+    if coleccion not in COLECCIONES_EXPORTABLES:
+        raise ValueError(f"La colección '{coleccion}' no se puede exportar.")
+
+    filtro = {}
+    campo_fecha = COLECCIONES_EXPORTABLES[coleccion]
+    if filters.get('start_date') or filters.get('end_date'):
+        if not campo_fecha:
+            raise ValueError(f"La colección '{coleccion}' no admite filtro por fechas.")
+        rango = {}
+        if filters.get('start_date'):
+            rango['$gte'] = a_fecha(filters['start_date'])
+        if filters.get('end_date'):
+            rango['$lte'] = a_fecha(filters['end_date'])
+        filtro[campo_fecha] = rango
+
+    if filters.get('juego'):
+        if coleccion not in COLECCIONES_CON_JUEGO:
+            raise ValueError(f"La colección '{coleccion}' no admite filtro por juego.")
+        filtro['juego'] = filters['juego']
+    return filtro
+
+
+def construir_proyeccion(fields):
+    """Proyección para la lista de campos pedida, o None para exportar todos."""
+    if not fields:
+        return None
+    for campo in fields:
+        if not campo or campo.startswith('$') or campo in CAMPOS_OCULTOS:
+            raise ValueError(f"Campo no válido: '{campo}'")
+    proyeccion = {'_id': 0}
+    proyeccion.update({campo: 1 for campo in fields})
+    return proyeccion
+
+
+def _plano(doc):
+    # Las fechas se exportan como 'YYYY-MM-DD' tanto en CSV como en NDJSON
+    for campo, valor in doc.items():
+        if isinstance(valor, datetime):
+            doc[campo] = fecha_iso(valor)
+    return doc
+
+
+def _json(valor):
+    # Importes Decimal como números en NDJSON
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return str(valor)
+
+
+def _cursor(coleccion, filters, fields, operacion):
+    filtro = construir_filtro(coleccion, filters)
+    proyeccion = construir_proyeccion(fields) or repositorio.proyeccion(coleccion)
+    orden = [(COLECCIONES_EXPORTABLES[coleccion] or 'id', 1), ('_id', 1)]
+    cursor = repositorio.COLECCIONES[coleccion].find(filtro, proyeccion, batch_size=TAMANO_LOTE).sort(orden)
+
+    def documentos():
+        filas = 0
+        try:
+            for doc in cursor:
+                filas += 1
+                yield _plano(doc)
+        finally:
+            # También si el cliente corta la descarga a medias
+            contar_filas(operacion, coleccion, filas)
+    return documentos()
+
+
+@contar_operacion_diferida('exportar_csv')
+def generar_csv(coleccion, filters, fields=None):
+    """
+    Devuelve un generador de trozos de texto CSV. Las columnas son `fields` o, si no
+    se indican, las claves del primer documento. Los errores de filtros se lanzan al
+    llamar a la función, antes de empezar a enviar la respuesta.
+    """
+    cursor = _cursor(coleccion, filters, fields, 'exportacion_csv')
+
+    def filas():
+        primero = next(cursor, None)
+        columnas = list(fields) if fields else list(primero.keys()) if primero else []
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columnas, extrasaction='ignore')
+        writer.writeheader()
+        if primero is not None:
+            writer.writerow(primero)
+            pendientes = 1
+            for doc in cursor:
+                writer.writerow(doc)
+                pendientes += 1
+                if pendientes >= FILAS_POR_TROZO:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                    pendientes = 0
+        yield buffer.getvalue()
+
+    return filas()
+
+
+@contar_operacion_diferida('exportar_ndjson')
+def generar_ndjson(coleccion, filters, fields=None):
+    """Devuelve un generador de trozos NDJSON (un documento JSON por línea)."""
+    cursor = _cursor(coleccion, filters, fields, 'exportacion_ndjson')
+
+    def lineas():
+        trozo = []
+        for doc in cursor:
+            trozo.append(json.dumps(doc, ensure_ascii=False, default=_json))
+            if len(trozo) >= FILAS_POR_TROZO:
+                yield '\n'.join(trozo) + '\n'
+                trozo = []
+        if trozo:
+            yield '\n'.join(trozo) + '\n'
+
+    return lineas()
@@ -0,0 +1,50 @@
+import shutil
+import tempfile
+from data import trabajos
+from modules.export.excel import generar_excel
+from modules.export.importacion import importar_excel
+
+# Funciones que se ejecutan como trabajos en segundo plano (data/trabajos.py). Reciben
+# los parámetros del trabajo y la función de progreso, y devuelven el dict que se
+# guarda como resultado.
+NOMBRE_EXPORTACION = 'export_gestion_lanzamientos.xlsx'
+
+# Errores por fila que se guardan en el documento del trabajo; el resto solo se cuenta
+MAXIMO_ERRORES_GUARDADOS = 100
+
+
+def exportar_excel(progreso):
+    with generar_excel(progreso=progreso) as fichero:
+        fichero_id = trabajos.guardar_fichero(fichero, NOMBRE_EXPORTACION)
+    return {'fichero_id': fichero_id, 'nombre_fichero': NOMBRE_EXPORTACION, 'resultado': {}}
+
+
+def importar_excel_guardado(fichero_id, hoja, modo, progreso):
+    # openpyxl necesita un fichero con seek: se copia el subido desde GridFS a disco
+    with tempfile.TemporaryFile(suffix='.xlsx') as local:
+        with trabajos.abrir_fichero(fichero_id) as subido:
+            shutil.copyfileobj(subido, local)
+        local.seek(0)
+        resultado = importar_excel(local, hoja, modo, progreso=progreso)
+
+    errores = resultado['errores']
+    resultado['total_errores'] = len(errores)
+    resultado['errores'] = [list(error) for error in errores[:MAXIMO_ERRORES_GUARDADOS]]
+    return {'resultado': resultado}
+
+
+def enviar_exportacion_excel():
+    """Lanza la exportación completa a Excel en segundo plano. Devuelve el id del trabajo."""
+    return trabajos.enviar_trabajo('exportacion_excel', exportar_excel)
+
+
+def enviar_importacion_excel(fichero, nombre, hoja, modo):
+    """
+    Guarda el fichero subido en GridFS y lanza su importación en segundo plano.
+    Devuelve el id del trabajo.
+    """
+    fichero_id = trabajos.guardar_fichero(fichero, nombre)
+    return trabajos.enviar_trabajo(
+        'importacion_excel', importar_excel_guardado, fichero_id, hoja, modo,
+        parametros={'fichero_id': fichero_id, 'nombre_fichero': nombre, 'hoja': hoja, 'modo': modo}
+    )
@@ -5,8 +5,10 @@ from modules.lanzamientos.services import (
     eliminar_lanzamiento as eliminar_lanzamiento_servicio,
     obtener_lanzamiento_por_id,
     actualizar_lanzamiento,
+    obtener_reservas_lanzamiento,
     obtener_juegos_y_colecciones
 )
+from common.condicional import respuesta_condicional
 
 lanzamientos_bp = Blueprint('lanzamientos', __name__, url_prefix='/lanzamientos')
 
@@ -21,7 +23,11 @@ def listar_lanzamientos():
         'sort_by': request.args.get('sort_by', 'fecha_salida'),
         'sort_order': request.args.get('sort_order', 'asc')
     }
-    lanzamientos, _ = obtener_lanzamientos_filtrados(filters)
+    try:
+        lanzamientos, _ = obtener_lanzamientos_filtrados(filters)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('lanzamientos.listar_lanzamientos'))
     juegos_y_colecciones = obtener_juegos_y_colecciones()
     return render_template(
         'lanzamientos/lanzamientos.html', 
@@ -34,7 +40,11 @@ def listar_lanzamientos():
 def nuevo_lanzamiento():
     if request.method == 'POST':
         datos_lanzamiento = request.form.to_dict()
-        crear_lanzamiento(datos_lanzamiento)
+        try:
+            crear_lanzamiento(datos_lanzamiento)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('lanzamientos.nuevo_lanzamiento'))
         flash('Lanzamiento añadido con éxito.', 'success')
         return redirect(url_for('lanzamientos.listar_lanzamientos'))
     juegos_y_colecciones = obtener_juegos_y_colecciones()
@@ -49,7 +59,11 @@ def editar_lanzamiento(lanzamiento_id):
 
     if request.method == 'POST':
         datos_lanzamiento = request.form.to_dict()
-        actualizar_lanzamiento(lanzamiento_id, datos_lanzamiento)
+        try:
+            actualizar_lanzamiento(lanzamiento_id, datos_lanzamiento)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('lanzamientos.editar_lanzamiento', lanzamiento_id=lanzamiento_id))
         flash('Lanzamiento actualizado con éxito.', 'success')
         return redirect(url_for('lanzamientos.listar_lanzamientos'))
 
@@ -64,4 +78,12 @@ def eliminar_lanzamiento(lanzamiento_id):
 
 @lanzamientos_bp.route('/api/juegos_colecciones')
 def api_juegos_colecciones():
-    return jsonify(obtener_juegos_y_colecciones())
+    return respuesta_condicional(['juegos_colecciones'], lambda: jsonify(obtener_juegos_y_colecciones()))
+
+@lanzamientos_bp.route('/api/<lanzamiento_id>/reservas')
+def api_reservas_lanzamiento(lanzamiento_id):
+    return respuesta_condicional(
+        ['reservas', 'clientes'],
+        lambda: jsonify(obtener_reservas_lanzamiento(lanzamiento_id)),
+        variante=lanzamiento_id
+    )
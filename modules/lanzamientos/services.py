@@ -1,89 +1,76 @@
-from data.data_manager import (
-    LANZAMIENTOS_COLLECTION, 
-    RESERVAS_COLLECTION, 
-    CLIENTES_COLLECTION, 
-    JUEGOS_COLECCIONES_COLLECTION
-)
-from collections import defaultdict
+from data.data_manager import LANZAMIENTOS_COLLECTION, RESERVAS_COLLECTION
+from data import repositorio
+from data.versiones import marcar_cambio
+from common.metricas import contar_operacion
+from modules.reservas.totales import recalcular_totales_producto
+from data.catalogo import obtener_juegos_y_colecciones
+from common.paleta import aplicar_colores, colores
+from common.busqueda import CAMPO_BUSQUEDA, claves_documento, filtro_busqueda
+from data.esquema import CERO, a_fecha, a_importe
 from datetime import datetime
 import uuid
 
-def adjust_color_brightness(hex_color, factor):
-    """
-    Ajusta el brillo de un color hexadecimal.
-    Factor < 1 para oscurecer, > 1 para aclarar.
-    """
-    if not hex_color or not hex_color.startswith('#') or len(hex_color) != 7:
-        return hex_color
-    
-    try:
-        r, g, b = int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
-        r = int(max(0, min(255, r * factor)))
-        g = int(max(0, min(255, g * factor)))
-        b = int(max(0, min(255, b * factor)))
-        return f"#{r:02x}{g:02x}{b:02x}"
-    except (ValueError, TypeError):
-        return hex_color
-
 def generar_id():
     return str(uuid.uuid4())
 
-def obtener_juegos_y_colecciones():
-    juegos_list = list(JUEGOS_COLECCIONES_COLLECTION.find({}, {'_id': 0}))
-    juegos_dict = {
-        juego['nombre']: {
-            'color': juego['color'],
-            'colecciones': juego['colecciones']
-        }
-        for juego in juegos_list
-    }
-    return {'juegos': juegos_dict}
-
-def obtener_lanzamientos_todos():
-    return list(LANZAMIENTOS_COLLECTION.find({}, {'_id': 0}))
-
-def obtener_reservas_todas():
-    return list(RESERVAS_COLLECTION.find({}, {'_id': 0}))
-
-def obtener_clientes_todos():
-    return list(CLIENTES_COLLECTION.find({}, {'_id': 0}))
-
 def obtener_lanzamiento_por_id(lanzamiento_id):
-    lanzamiento = LANZAMIENTOS_COLLECTION.find_one({'id': lanzamiento_id}, {'_id': 0})
+    lanzamiento = repositorio.obtener_por_id('lanzamientos', lanzamiento_id)
     if lanzamiento:
-        juego_info = JUEGOS_COLECCIONES_COLLECTION.find_one({'nombre': lanzamiento.get('juego')}, {'_id': 0})
-        if juego_info:
-            lanzamiento['juego_color'] = juego_info.get('color', '#6c757d')
-        else:
-            lanzamiento['juego_color'] = '#6c757d'
+        lanzamiento['juego_color'], _ = colores(lanzamiento.get('juego'), None)
     return lanzamiento
 
+RESUMEN_VACIO = {'reservas': 0, 'unidades': 0, 'pagado': CERO, 'pendiente': CERO}
+
+def obtener_resumenes_reservas(lanzamiento_ids):
+    """
+    Devuelve un dict lanzamiento_id -> {'reservas', 'unidades', 'pagado', 'pendiente'}
+    calculado con una sola agregación agrupada sobre las reservas.
+    """
+    if not lanzamiento_ids:
+        return {}
+    pipeline = [
+        {'$match': {'lanzamiento_id': {'$in': list(lanzamiento_ids)}}},
+        {'$group': {
+            '_id': '$lanzamiento_id',
+            'reservas': {'$sum': 1},
+            'unidades': {'$sum': '$cantidad'},
+            'pagado': {'$sum': '$pagado'},
+            'pendiente': {'$sum': {'$cond': ['$pago_completo', 0, '$pendiente']}}
+        }}
+    ]
+    return {r.pop('_id'): r for r in repositorio.agregar('reservas', pipeline)}
+
+def obtener_reservas_lanzamiento(lanzamiento_id):
+    """Reservas de un lanzamiento con el contacto de su cliente (detalle de la fila del listado)."""
+    reservas = repositorio.buscar(
+        'reservas', {'lanzamiento_id': lanzamiento_id}, 'detalle', orden=[('fecha_reserva', 1), ('id', 1)]
+    )
+    clientes_map = repositorio.obtener_por_ids('clientes', [r.get('cliente_id') for r in reservas], 'contacto')
+    for r in reservas:
+        r['cliente'] = clientes_map.get(r.get('cliente_id'))
+    return reservas
+
 def obtener_lanzamientos_filtrados(filters):
     pipeline = []
     match_stage = {}
 
-    q = filters.get('q')
-    if q:
-        q = q.lower()
-        match_stage['$or'] = [
-            {'nombre': {'$regex': q, '$options': 'i'}},
-            {'coleccion': {'$regex': q, '$options': 'i'}},
-            {'juego': {'$regex': q, '$options': 'i'}}
-        ]
+    filtro_q = filtro_busqueda(filters.get('q'))
+    if filtro_q:
+        match_stage.update(filtro_q)
 
     if filters.get('juego'):
         match_stage['juego'] = filters.get('juego')
 
     if filters.get('start_date'):
-        match_stage['fecha_salida'] = {'$gte': filters.get('start_date')}
+        match_stage['fecha_salida'] = {'$gte': a_fecha(filters.get('start_date'))}
 
     if filters.get('end_date'):
         if 'fecha_salida' not in match_stage:
             match_stage['fecha_salida'] = {}
-        match_stage['fecha_salida']['$lte'] = filters.get('end_date')
+        match_stage['fecha_salida']['$lte'] = a_fecha(filters.get('end_date'))
 
     if filters.get('hide_past') == 'on':
-        today = datetime.now().strftime('%Y-%m-%d')
+        today = a_fecha(datetime.now())
         if 'fecha_salida' not in match_stage:
             match_stage['fecha_salida'] = {}
         match_stage['fecha_salida']['$gte'] = today
@@ -94,89 +81,68 @@ def obtener_lanzamientos_filtrados(filters):
     sort_by = filters.get('sort_by') or 'fecha_salida'
     sort_order = 1 if filters.get('sort_order', 'asc') == 'asc' else -1
     pipeline.append({'$sort': {sort_by: sort_order, '_id': 1}})
+    pipeline.append({'$project': repositorio.proyeccion('lanzamientos')})
 
-    lanzamientos_filtrados = list(LANZAMIENTOS_COLLECTION.aggregate(pipeline))
-    lanz_ids = [l['id'] for l in lanzamientos_filtrados]
-
-    reservas_por_lanzamiento = defaultdict(list)
-    cliente_ids = set()
-    if lanz_ids:
-        reservas_cursor = RESERVAS_COLLECTION.find({'lanzamiento_id': {'$in': lanz_ids}})
-        for r in reservas_cursor:
-            reservas_por_lanzamiento[r['lanzamiento_id']].append(r)
-            if r.get('cliente_id'):
-                cliente_ids.add(r['cliente_id'])
-
-    clientes_map = {}
-    if cliente_ids:
-        clientes_cursor = CLIENTES_COLLECTION.find({'id': {'$in': list(cliente_ids)}})
-        clientes_map = {c['id']: c for c in clientes_cursor}
-
-    for lanz_id, reservas in reservas_por_lanzamiento.items():
-        for r in reservas:
-            if r.get('cliente_id') in clientes_map:
-                r['cliente'] = clientes_map[r['cliente_id']]
-
-    juegos_data = obtener_juegos_y_colecciones().get('juegos', {})
+    lanzamientos_filtrados = repositorio.agregar('lanzamientos', pipeline)
+
+    # El listado solo muestra el resumen de reservas; el detalle se pide al desplegar la fila
+    resumenes = obtener_resumenes_reservas([l['id'] for l in lanzamientos_filtrados])
     for lanz in lanzamientos_filtrados:
-        lanz['reservas'] = reservas_por_lanzamiento.get(lanz.get('id'), [])
-        juego_nombre = lanz.get('juego')
-        coleccion_nombre = lanz.get('coleccion')
-        
-        if juego_nombre and juego_nombre in juegos_data:
-            juego_info = juegos_data[juego_nombre]
-            juego_color = juego_info.get('color', '#6c757d')
-            lanz['juego_color'] = juego_color
-            
-            colecciones = juego_info.get('colecciones', [])
-            if coleccion_nombre and coleccion_nombre in colecciones:
-                try:
-                    idx = colecciones.index(coleccion_nombre)
-                    factor = 1 - ((idx + 1) * 0.1)
-                    lanz['coleccion_color'] = adjust_color_brightness(juego_color, factor)
-                except (ValueError, TypeError):
-                    lanz['coleccion_color'] = juego_color
-            else:
-                lanz['coleccion_color'] = juego_color
-        else:
-            lanz['juego_color'] = '#6c757d'
-            lanz['coleccion_color'] = '#6c757d'
-
-    return lanzamientos_filtrados, juegos_data
+        lanz['resumen'] = resumenes.get(lanz.get('id'), RESUMEN_VACIO)
+    aplicar_colores(lanzamientos_filtrados)
 
-def crear_lanzamiento(datos_lanzamiento):
+    return lanzamientos_filtrados, obtener_juegos_y_colecciones().get('juegos', {})
+
+def construir_lanzamiento(datos_lanzamiento):
+    """Documento de un lanzamiento nuevo a partir de los datos del formulario."""
     nuevo_id = generar_id()
     lanzamiento = {
         "id": nuevo_id,
         "nombre": datos_lanzamiento.get('nombre'),
         "juego": datos_lanzamiento.get('juego'),
         "coleccion": datos_lanzamiento.get('coleccion'),
-        "fecha_salida": datos_lanzamiento.get('fecha_salida'),
-        "fecha_envio": datos_lanzamiento.get('fecha_envio'),
-        "precio": float(datos_lanzamiento.get('precio') or 0),
-        "precio_reserva": float(datos_lanzamiento.get('precio_reserva') or 0),
+        "fecha_salida": a_fecha(datos_lanzamiento.get('fecha_salida')),
+        "fecha_envio": a_fecha(datos_lanzamiento.get('fecha_envio')),
+        "precio": a_importe(datos_lanzamiento.get('precio')),
+        "precio_reserva": a_importe(datos_lanzamiento.get('precio_reserva')),
         "comentario": datos_lanzamiento.get('comentario'),
     }
-    LANZAMIENTOS_COLLECTION.insert_one(lanzamiento)
+    lanzamiento[CAMPO_BUSQUEDA] = claves_documento('lanzamientos', lanzamiento)
+    return lanzamiento
+
+@contar_operacion('crear_lanzamiento')
+def crear_lanzamiento(datos_lanzamiento):
+    LANZAMIENTOS_COLLECTION.insert_one(construir_lanzamiento(datos_lanzamiento))
+    marcar_cambio('lanzamientos')
 
+@contar_operacion('actualizar_lanzamiento')
 def actualizar_lanzamiento(lanzamiento_id, datos_lanzamiento):
     update_data = {
         "nombre": datos_lanzamiento.get('nombre'),
         "juego": datos_lanzamiento.get('juego'),
         "coleccion": datos_lanzamiento.get('coleccion'),
-        "fecha_salida": datos_lanzamiento.get('fecha_salida'),
-        "fecha_envio": datos_lanzamiento.get('fecha_envio'),
-        "precio": float(datos_lanzamiento.get('precio') or 0),
-        "precio_reserva": float(datos_lanzamiento.get('precio_reserva') or 0),
+        "fecha_salida": a_fecha(datos_lanzamiento.get('fecha_salida')),
+        "fecha_envio": a_fecha(datos_lanzamiento.get('fecha_envio')),
+        "precio": a_importe(datos_lanzamiento.get('precio')),
+        "precio_reserva": a_importe(datos_lanzamiento.get('precio_reserva')),
         "comentario": datos_lanzamiento.get('comentario'),
     }
-    result = LANZAMIENTOS_COLLECTION.update_one({'id': lanzamiento_id}, {'$set': update_data})
-    if result.matched_count == 0:
+    update_data[CAMPO_BUSQUEDA] = claves_documento('lanzamientos', update_data)
+    # Se recuperan los precios anteriores para saber si hay que recalcular las reservas
+    anterior = LANZAMIENTOS_COLLECTION.find_one_and_update(
+        {'id': lanzamiento_id}, {'$set': update_data}, projection={'_id': 0, 'precio': 1, 'precio_reserva': 1}
+    )
+    if anterior is None:
         raise ValueError(f"No se encontró el lanzamiento con ID {lanzamiento_id}")
+    marcar_cambio('lanzamientos')
+    if (anterior.get('precio'), anterior.get('precio_reserva')) != (update_data['precio'], update_data['precio_reserva']):
+        recalcular_totales_producto(lanzamiento_id=lanzamiento_id)
 
+@contar_operacion('eliminar_lanzamiento')
 def eliminar_lanzamiento(lanzamiento_id):
     delete_result = LANZAMIENTOS_COLLECTION.delete_one({'id': lanzamiento_id})
     if delete_result.deleted_count == 0:
         raise ValueError(f"No se encontró el lanzamiento con ID {lanzamiento_id}")
     
     RESERVAS_COLLECTION.delete_many({'lanzamiento_id': lanzamiento_id})
+    marcar_cambio('lanzamientos', 'reservas')
@@ -1,5 +1,9 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request, make_response, abort
 from modules.main.services import obtener_eventos_calendario
+from data.data_manager import estadisticas_pool
+from common.condicional import respuesta_condicional
+from common.perfilado import exigir_token
+import config
 
 main_bp = Blueprint('main', __name__)
 
@@ -13,7 +17,33 @@ def calendario():
 
 @main_bp.route('/api/eventos')
 def api_eventos():
-    eventos, error = obtener_eventos_calendario()
-    if error:
-        return jsonify({"error": error}), 500
-    return jsonify(eventos)
+    # FullCalendar envía la ventana visible como ?start=...&end=...
+    start, end = request.args.get('start'), request.args.get('end')
+
+    def generar():
+        try:
+            eventos, error = obtener_eventos_calendario(start, end)
+        except ValueError:
+            return make_response(jsonify({"error": "Parámetros 'start'/'end' no válidos"}), 400)
+        if error:
+            return make_response(jsonify({"error": error}), 500)
+        return jsonify(eventos)
+
+    return respuesta_condicional(
+        ['lanzamientos', 'eventos', 'juegos_colecciones'], generar, variante=f"{start}|{end}"
+    )
+
+@main_bp.route('/api/estado/pool')
+def api_estado_pool():
+    """Estado del pool de MongoDB de este proceso (requiere el token de PERFILADO_TOKEN)."""
+    exigir_token()
+    return jsonify(estadisticas_pool())
+
+@main_bp.route('/api/estado/perfil')
+def api_estado_perfil():
+    """Peticiones más lentas de este proceso (requiere PERFILADO_ACTIVO y el token de PERFILADO_TOKEN)."""
+    if not config.PERFILADO_ACTIVO:
+        abort(404)
+    exigir_token()
+    from common.perfilado import peticiones_lentas
+    return jsonify(peticiones_lentas(request.args.get('limite', type=int)))
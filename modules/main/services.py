@@ -1,73 +1,85 @@
-from data.data_manager import (
-    LANZAMIENTOS_COLLECTION,
-    EVENTOS_COLLECTION
-)
-from modules.eventos.services import obtener_juegos_y_colecciones
+import logging
+from data import repositorio
+from data.esquema import a_fecha
+from common.paleta import obtener_paleta, colores
 
-def adjust_color_brightness(hex_color, factor):
+def normalizar_fecha_rango(valor):
     """
-    Ajusta el brillo de un color hexadecimal.
-    Factor < 1 para oscurecer, > 1 para aclarar.
+    Convierte un parámetro 'start'/'end' de FullCalendar (ISO 8601, p. ej.
+    '2025-09-28T00:00:00+02:00') a la fecha a medianoche con que se guardan las fechas.
     """
-    if not hex_color or not hex_color.startswith('#') or len(hex_color) != 7:
-        return hex_color
-    
+    if not valor:
+        return None
+    return a_fecha(valor[:10])  # ValueError si el formato no es válido
+
+def _en_rango(fecha, rango):
+    if not fecha:
+        return False
+    if not rango:
+        return True
+    # Documentos antiguos pueden guardar la fecha como texto: se compara como fecha y,
+    # si no lo es, el documento no entra en la ventana en lugar de fallar la petición
     try:
-        r, g, b = int(hex_color[1:3], 16), int(hex_color[3:5], 16), int(hex_color[5:7], 16)
-        r = int(max(0, min(255, r * factor)))
-        g = int(max(0, min(255, g * factor)))
-        b = int(max(0, min(255, b * factor)))
-        return f"#{r:02x}{g:02x}{b:02x}"
-    except (ValueError, TypeError):
-        return hex_color
+        fecha = a_fecha(fecha)
+    except ValueError:
+        logging.warning(f"[calendario] Fecha no válida ignorada: {fecha!r}")
+        return False
+    return ('$gte' not in rango or fecha >= rango['$gte']) and ('$lt' not in rango or fecha < rango['$lt'])
+
+def obtener_eventos_calendario(start=None, end=None):
+    """
+    Eventos para FullCalendar. Si se indica la ventana visible [start, end) solo se
+    consultan los lanzamientos y eventos cuyas fechas caen dentro de ella.
+    Lanza ValueError si las fechas no son válidas.
+    """
+    rango = {}
+    if start:
+        rango['$gte'] = normalizar_fecha_rango(start)
+    if end:
+        rango['$lt'] = normalizar_fecha_rango(end)
 
-def obtener_eventos_calendario():
     try:
-        lanzamientos = list(LANZAMIENTOS_COLLECTION.find({}, {'_id': 0}))
-        eventos_data = list(EVENTOS_COLLECTION.find({}, {'_id': 0}))
-        juegos_data = obtener_juegos_y_colecciones().get('juegos', {})
+        if rango:
+            filtro_lanzamientos = {'$or': [{'fecha_salida': rango}, {'fecha_envio': rango}]}
+            filtro_eventos = {'fecha': rango}
+        else:
+            filtro_lanzamientos, filtro_eventos = {}, {}
+        lanzamientos = repositorio.buscar('lanzamientos', filtro_lanzamientos, 'calendario')
+        eventos_data = repositorio.buscar('eventos', filtro_eventos, 'calendario')
+        paleta = obtener_paleta()
 
         eventos_calendario = []
 
         for lanz in lanzamientos:
             juego_nombre = lanz.get('juego')
             coleccion_nombre = lanz.get('coleccion')
-            juego_info = juegos_data.get(juego_nombre, {})
-            juego_color = juego_info.get('color', '#6c757d')
-            
-            colecciones = juego_info.get('colecciones', [])
-            coleccion_color = juego_color
-            if coleccion_nombre and coleccion_nombre in colecciones:
-                try:
-                    idx = colecciones.index(coleccion_nombre)
-                    factor = 1 - ((idx + 1) * 0.1)
-                    coleccion_color = adjust_color_brightness(juego_color, factor)
-                except (ValueError, TypeError):
-                    pass
+            juego_color, coleccion_color = colores(juego_nombre, coleccion_nombre, paleta)
 
             juego_inicial_badge = f'<span class="badge" style="background-color: {juego_color};">{juego_nombre[0] if juego_nombre else " "}</span>'
 
-            eventos_calendario.append({
-                'id': f"salida-{lanz.get('id')}",
-                'title': f'{juego_inicial_badge} 🚀 {lanz.get("nombre")}',
-                'start': lanz.get('fecha_salida'),
-                'backgroundColor': coleccion_color,
-                'borderColor': coleccion_color,
-                'extendedProps': {
-                    'tipo': 'Lanzamiento',
-                    'nombre': lanz.get('nombre'),
-                    'juego': juego_nombre,
-                    'coleccion': coleccion_nombre,
-                    'juego_color': juego_color,
-                    'coleccion_color': coleccion_color,
-                    'precio': lanz.get('precio'),
-                    'reserva': lanz.get('precio_reserva'),
-                    'comentario': lanz.get('comentario'),
-                    'fecha_envio': lanz.get('fecha_envio'),
-                    'fecha_salida': lanz.get('fecha_salida')
-                }
-            })
-            if lanz.get('fecha_envio'):
+            # Un lanzamiento puede entrar en la ventana solo por su fecha de envío
+            if not rango or _en_rango(lanz.get('fecha_salida'), rango):
+                eventos_calendario.append({
+                    'id': f"salida-{lanz.get('id')}",
+                    'title': f'{juego_inicial_badge} 🚀 {lanz.get("nombre")}',
+                    'start': lanz.get('fecha_salida'),
+                    'backgroundColor': coleccion_color,
+                    'borderColor': coleccion_color,
+                    'extendedProps': {
+                        'tipo': 'Lanzamiento',
+                        'nombre': lanz.get('nombre'),
+                        'juego': juego_nombre,
+                        'coleccion': coleccion_nombre,
+                        'juego_color': juego_color,
+                        'coleccion_color': coleccion_color,
+                        'precio': lanz.get('precio'),
+                        'reserva': lanz.get('precio_reserva'),
+                        'comentario': lanz.get('comentario'),
+                        'fecha_envio': lanz.get('fecha_envio'),
+                        'fecha_salida': lanz.get('fecha_salida')
+                    }
+                })
+            if lanz.get('fecha_envio') and _en_rango(lanz.get('fecha_envio'), rango):
                 eventos_calendario.append({
                     'id': f"envio-{lanz.get('id')}",
                     'title': f'{juego_inicial_badge} 📦 {lanz.get("nombre")}',
@@ -93,18 +105,7 @@ def obtener_eventos_calendario():
         for ev in eventos_data:
             juego_nombre = ev.get('juego')
             coleccion_nombre = ev.get('coleccion')
-            juego_info = juegos_data.get(juego_nombre, {})
-            juego_color = juego_info.get('color', '#6c757d')
-            
-            colecciones = juego_info.get('colecciones', [])
-            coleccion_color = juego_color
-            if coleccion_nombre and coleccion_nombre in colecciones:
-                try:
-                    idx = colecciones.index(coleccion_nombre)
-                    factor = 1 - ((idx + 1) * 0.1)
-                    coleccion_color = adjust_color_brightness(juego_color, factor)
-                except (ValueError, TypeError):
-                    pass
+            juego_color, coleccion_color = colores(juego_nombre, coleccion_nombre, paleta)
             
             juego_inicial_badge = f'<span class="badge" style="background-color: {juego_color};">{juego_nombre[0] if juego_nombre else " "}</span>'
 
@@ -1,16 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import math
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
 from datetime import datetime
+from config import RESERVAS_POR_PAGINA, AUTOCOMPLETAR_LIMITE, AUTOCOMPLETAR_LIMITE_MAXIMO
 from modules.reservas.services import (
     obtener_reservas_filtradas, 
     crear_reserva, 
-    obtener_lanzamientos_todos, 
-    obtener_clientes_todos,
     obtener_reserva_por_id,
     actualizar_reserva,
-    obtener_eventos_todos,
-    eliminar_reserva as eliminar_reserva_servicio
+    eliminar_reserva as eliminar_reserva_servicio,
+    autocompletar_clientes,
+    autocompletar_productos,
+    TIPOS_PRODUCTO
 )
-from modules.lanzamientos.services import obtener_juegos_y_colecciones
+from data import repositorio
+from data.catalogo import obtener_juegos_y_colecciones
+from common.condicional import respuesta_condicional
 
 reservas_bp = Blueprint('reservas', __name__, url_prefix='/reservas')
 
@@ -20,10 +24,29 @@ def listar_reservas():
         'q': request.args.get('q', ''),
         'start_date': request.args.get('start_date', ''),
         'end_date': request.args.get('end_date', ''),
-        'payment_status': request.args.get('payment_status', '')
+        'payment_status': request.args.get('payment_status', ''),
+        'sort_by': request.args.get('sort_by', 'fecha_reserva'),
+        'sort_order': request.args.get('sort_order', 'desc'),
+        'page': max(request.args.get('page', 1, type=int), 1),
+        'per_page': min(max(request.args.get('per_page', RESERVAS_POR_PAGINA, type=int), 1), 500)
     }
-    reservas, total_pendiente = obtener_reservas_filtradas(filters)
-    return render_template('reservas/reservas.html', reservas=reservas, total_pendiente=total_pendiente, filters=filters)
+    try:
+        reservas, total_pendiente, total_reservas = obtener_reservas_filtradas(filters)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('reservas.listar_reservas'))
+    paginacion = {
+        'pagina': filters['page'],
+        'total_paginas': max(math.ceil(total_reservas / filters['per_page']), 1),
+        'total': total_reservas
+    }
+    return render_template(
+        'reservas/reservas.html',
+        reservas=reservas,
+        total_pendiente=total_pendiente,
+        filters=filters,
+        paginacion=paginacion
+    )
 
 @reservas_bp.route('/nueva', methods=['GET', 'POST'])
 def nueva_reserva():
@@ -33,16 +56,11 @@ def nueva_reserva():
         flash('Reserva creada con éxito.', 'success')
         return redirect(url_for('reservas.listar_reservas'))
 
-    lanzamientos = obtener_lanzamientos_todos()
-    clientes = obtener_clientes_todos()
-    eventos = obtener_eventos_todos()
+    # Clientes y productos se cargan bajo demanda desde las APIs de autocompletado
     juegos_colecciones = obtener_juegos_y_colecciones()
     juegos = list(juegos_colecciones.get('juegos', {}).keys())
     return render_template(
         'reservas/nueva_reserva.html', 
-        lanzamientos=lanzamientos, 
-        clientes=clientes, 
-        eventos=eventos, 
         juegos_colecciones=juegos_colecciones,
         juegos=juegos,
         now=datetime.now()
@@ -61,24 +79,21 @@ def editar_reserva(reserva_id):
         flash('Reserva actualizada con éxito.', 'success')
         return redirect(url_for('reservas.listar_reservas'))
 
-    lanzamientos = obtener_lanzamientos_todos()
-    clientes = obtener_clientes_todos()
-    eventos = obtener_eventos_todos()
+    # Solo se cargan el cliente y el producto actuales; el resto, desde el autocompletado
     juegos_colecciones = obtener_juegos_y_colecciones()
     juegos = list(juegos_colecciones.get('juegos', {}).keys())
-    
+    cliente = repositorio.obtener_por_id('clientes', reserva.get('cliente_id'), 'selector') if reserva.get('cliente_id') else None
+
     producto = None
     if reserva.get('lanzamiento_id'):
-        producto = next((l for l in lanzamientos if l['id'] == reserva['lanzamiento_id']), None)
+        producto = repositorio.obtener_por_id('lanzamientos', reserva['lanzamiento_id'], 'selector')
     elif reserva.get('evento_id'):
-        producto = next((e for e in eventos if e['id'] == reserva['evento_id']), None)
+        producto = repositorio.obtener_por_id('eventos', reserva['evento_id'], 'selector')
 
     return render_template(
         'reservas/editar_reserva.html', 
         reserva=reserva, 
-        lanzamientos=lanzamientos, 
-        clientes=clientes, 
-        eventos=eventos,
+        cliente=cliente,
         juegos_colecciones=juegos_colecciones,
         juegos=juegos,
         producto=producto
@@ -92,3 +107,31 @@ def eliminar_reserva(reserva_id):
     except ValueError as e:
         flash(str(e), 'danger')
     return redirect(url_for('reservas.listar_reservas'))
+
+def _limite_autocompletar():
+    return min(max(request.args.get('limite', AUTOCOMPLETAR_LIMITE, type=int), 1), AUTOCOMPLETAR_LIMITE_MAXIMO)
+
+@reservas_bp.route('/api/clientes')
+def api_clientes():
+    q = request.args.get('q', '')
+    limite = _limite_autocompletar()
+    return respuesta_condicional(
+        ['clientes'],
+        lambda: jsonify(autocompletar_clientes(q, limite)),
+        variante=f"{q}|{limite}"
+    )
+
+@reservas_bp.route('/api/productos')
+def api_productos():
+    tipo = request.args.get('tipo', 'lanzamiento')
+    if tipo not in TIPOS_PRODUCTO:
+        return make_response(jsonify({"error": f"Tipo de producto no válido: '{tipo}'"}), 400)
+    juego = request.args.get('juego', '')
+    coleccion = request.args.get('coleccion', '')
+    q = request.args.get('q', '')
+    limite = _limite_autocompletar()
+    return respuesta_condicional(
+        [TIPOS_PRODUCTO[tipo][0]],
+        lambda: jsonify(autocompletar_productos(tipo, juego, coleccion, q, limite)),
+        variante=f"{tipo}|{juego}|{coleccion}|{q}|{limite}"
+    )
@@ -1,49 +1,75 @@
-from data.data_manager import RESERVAS_COLLECTION, CLIENTES_COLLECTION, LANZAMIENTOS_COLLECTION, EVENTOS_COLLECTION
+from data.data_manager import RESERVAS_COLLECTION
+from data import repositorio
+from data.versiones import marcar_cambio
+from common.metricas import contar_operacion
+from config import RESERVAS_POR_PAGINA, AUTOCOMPLETAR_LIMITE
+from modules.reservas.totales import calcular_totales, obtener_producto
+from common.busqueda import filtro_busqueda
+from data.esquema import a_entero, a_fecha, a_importe
 from datetime import datetime
 import uuid
-from bson.objectid import ObjectId
+
+# Columnas por las que se puede ordenar el listado de reservas
+CAMPOS_ORDEN_RESERVAS = {
+    'cliente': 'cliente.nombre',
+    'producto': 'item.nombre',
+    'cantidad': 'cantidad',
+    'fecha_reserva': 'fecha_reserva',
+    'estado': 'estado',
+    'pagado': 'pagado',
+    'pendiente': 'pendiente',
+}
+
+# Tipo de producto -> (colección, campo de fecha por el que se ordena el autocompletado)
+TIPOS_PRODUCTO = {
+    'lanzamiento': ('lanzamientos', 'fecha_salida'),
+    'evento': ('eventos', 'fecha'),
+}
 
 def generar_id():
     return str(uuid.uuid4())
 
-def obtener_reservas_todas():
-    return list(RESERVAS_COLLECTION.find({}, {'_id': 0}))
-
-def obtener_clientes_todos():
-    return list(CLIENTES_COLLECTION.find({}, {'_id': 0}))
-
-def obtener_lanzamientos_todos():
-    return list(LANZAMIENTOS_COLLECTION.find({}, {'_id': 0}))
-
-def obtener_eventos_todos():
-    return list(EVENTOS_COLLECTION.find({}, {'_id': 0}))
-
 def obtener_reserva_por_id(reserva_id):
-    return RESERVAS_COLLECTION.find_one({'id': reserva_id}, {'_id': 0})
+    return repositorio.obtener_por_id('reservas', reserva_id)
 
-def crear_reserva(datos_reserva):
+def construir_reserva(datos_reserva, item):
+    """
+    Documento de una reserva nueva a partir de los datos del formulario. `item` es el
+    producto reservado (con 'precio' y 'precio_reserva'), o None si no existe.
+    """
     nuevo_id = generar_id()
-    pagado_monto = float(datos_reserva.get('pagado', 0) or 0)
+    pagado_monto = a_importe(datos_reserva.get('pagado'))
 
     reserva = {
         "id": nuevo_id,
         "cliente_id": datos_reserva.get('cliente_id'),
         "lanzamiento_id": datos_reserva.get('producto_id') if datos_reserva.get('tipo_producto') == 'lanzamiento' else None,
         "evento_id": datos_reserva.get('producto_id') if datos_reserva.get('tipo_producto') == 'evento' else None,
-        "cantidad": int(datos_reserva.get('cantidad') or 1),
-        "fecha_reserva": datos_reserva.get('fecha_reserva') or datetime.now().strftime('%Y-%m-%d'),
+        "cantidad": a_entero(datos_reserva.get('cantidad'), 1),
+        "fecha_reserva": a_fecha(datos_reserva.get('fecha_reserva') or datetime.now()),
         "estado": datos_reserva.get('estado', 'Pendiente'),
         "pagado": pagado_monto,
         "tipo_pago": datos_reserva.get('tipo_pago'),
-        "notas": datos_reserva.get('notas'),
-        "pago_completo": False
+        "notas": datos_reserva.get('notas')
     }
-    RESERVAS_COLLECTION.insert_one(reserva)
+    reserva.update(calcular_totales(item, reserva['cantidad'], pagado_monto))
+    return reserva
 
+@contar_operacion('crear_reserva')
+def crear_reserva(datos_reserva):
+    producto_id, tipo_producto = datos_reserva.get('producto_id'), datos_reserva.get('tipo_producto')
+    item = obtener_producto(
+        producto_id if tipo_producto == 'lanzamiento' else None,
+        producto_id if tipo_producto == 'evento' else None
+    )
+    RESERVAS_COLLECTION.insert_one(construir_reserva(datos_reserva, item))
+    marcar_cambio('reservas')
+
+@contar_operacion('actualizar_reserva')
 def actualizar_reserva(reserva_id, datos_reserva):
     update_fields = {
         'cliente_id': datos_reserva.get('cliente_id'),
-        'cantidad': int(datos_reserva.get('cantidad') or 1),
+        'cantidad': a_entero(datos_reserva.get('cantidad'), 1),
         'estado': datos_reserva.get('estado'),
         'tipo_pago': datos_reserva.get('tipo_pago'),
         'notas': datos_reserva.get('notas')
@@ -57,93 +83,72 @@ def actualizar_reserva(reserva_id, datos_reserva):
         update_fields['evento_id'] = datos_reserva.get('producto_id')
         update_fields['lanzamiento_id'] = None
 
-    pagado_val = datos_reserva.get('pagado')
-    if pagado_val is not None and pagado_val != '':
-        update_fields['pagado'] = float(pagado_val)
-    else:
-        update_fields['pagado'] = 0
+    update_fields['pagado'] = a_importe(datos_reserva.get('pagado'))
 
-    reserva_actual = RESERVAS_COLLECTION.find_one({'id': reserva_id})
+    reserva_actual = repositorio.obtener_por_id('reservas', reserva_id, 'producto')
     if not reserva_actual:
         raise ValueError(f"No se encontró la reserva con ID {reserva_id}")
 
-    item_id = update_fields.get('lanzamiento_id') or update_fields.get('evento_id')
-    item = None
-    if update_fields.get('lanzamiento_id'):
-        item = LANZAMIENTOS_COLLECTION.find_one({'id': item_id})
-    elif update_fields.get('evento_id'):
-        item = EVENTOS_COLLECTION.find_one({'id': item_id})
-    
-    if item:
-        precio = float(item.get('precio', 0))
-        precio_reserva = float(item.get('precio_reserva', 0))
-        cantidad = int(update_fields['cantidad'])
-        total = (precio * cantidad) + precio_reserva
-        update_fields['pago_completo'] = float(update_fields['pagado']) >= total
+    # Si el formulario no cambia el producto se mantiene el actual
+    lanzamiento_id = update_fields.get('lanzamiento_id', reserva_actual.get('lanzamiento_id'))
+    evento_id = update_fields.get('evento_id', reserva_actual.get('evento_id'))
+    item = obtener_producto(lanzamiento_id, evento_id)
+    update_fields.update(calcular_totales(item, update_fields['cantidad'], update_fields['pagado']))
 
     result = RESERVAS_COLLECTION.update_one({'id': reserva_id}, {'$set': update_fields})
     if result.matched_count == 0:
         raise ValueError(f"No se encontró la reserva con ID {reserva_id}")
+    marcar_cambio('reservas')
 
+@contar_operacion('eliminar_reserva')
 def eliminar_reserva(reserva_id):
     result = RESERVAS_COLLECTION.delete_one({'id': reserva_id})
     if result.deleted_count == 0:
         raise ValueError(f"No se encontró la reserva con ID {reserva_id}")
-
-def obtener_reservas_filtradas(filters):
-    pipeline = []
-
-    # Match stage for filtering
-    match_stage = {}
-    q = filters.get('q', '').lower()
-    start_date = filters.get('start_date')
-    end_date = filters.get('end_date')
-    
-    if start_date:
-        match_stage['fecha_reserva'] = {'$gte': start_date}
-    if end_date:
-        if 'fecha_reserva' in match_stage:
-            match_stage['fecha_reserva']['$lte'] = end_date
-        else:
-            match_stage['fecha_reserva'] = {'$lte': end_date}
-
-    if match_stage:
-        pipeline.append({'$match': match_stage})
-
-    # Lookup stage for cliente
-    pipeline.append({
-        '$lookup': {
+    marcar_cambio('reservas')
+
+def autocompletar_clientes(q=None, limite=AUTOCOMPLETAR_LIMITE):
+    """Clientes cuyo nombre, email o teléfono empieza por las palabras de `q` (todos si no hay `q`)."""
+    return repositorio.buscar('clientes', filtro_busqueda(q), 'selector', orden=[('nombre', 1), ('id', 1)], limite=limite)
+
+def autocompletar_productos(tipo, juego=None, coleccion=None, q=None, limite=AUTOCOMPLETAR_LIMITE):
+    """Lanzamientos o eventos de un juego/colección que coinciden con `q`, los más recientes primero."""
+    if tipo not in TIPOS_PRODUCTO:
+        raise ValueError(f"Tipo de producto no válido: '{tipo}'")
+    nombre_coleccion, campo_fecha = TIPOS_PRODUCTO[tipo]
+    filtro = filtro_busqueda(q) or {}
+    if juego:
+        filtro['juego'] = juego
+    if coleccion:
+        filtro['coleccion'] = coleccion
+    return repositorio.buscar(nombre_coleccion, filtro, 'selector', orden=[(campo_fecha, -1), ('id', 1)], limite=limite)
+
+def _etapas_lookup():
+    """Etapas que añaden 'cliente' e 'item' (lanzamiento o evento) a cada reserva."""
+    return [
+        # Lookup stage for cliente
+        {'$lookup': {
             'from': 'clientes',
             'localField': 'cliente_id',
             'foreignField': 'id',
             'as': 'cliente'
-        }
-    })
-    pipeline.append({'$unwind': '$cliente'})
-
-    # Lookup stage for lanzamientos
-    pipeline.append({
-        '$lookup': {
+        }},
+        {'$unwind': {'path': '$cliente', 'preserveNullAndEmptyArrays': True}},
+        # Lookup stages for lanzamientos and eventos
+        {'$lookup': {
             'from': 'lanzamientos',
             'localField': 'lanzamiento_id',
             'foreignField': 'id',
             'as': 'lanzamiento_item'
-        }
-    })
-    
-    # Lookup stage for eventos
-    pipeline.append({
-        '$lookup': {
+        }},
+        {'$lookup': {
             'from': 'eventos',
             'localField': 'evento_id',
             'foreignField': 'id',
             'as': 'evento_item'
-        }
-    })
-
-    # Add fields for item
-    pipeline.append({
-        '$addFields': {
+        }},
+        # Add fields for item
+        {'$addFields': {
             'item': {
                 '$cond': {
                     'if': {'$gt': [{'$size': '$lanzamiento_item'}, 0]},
@@ -151,51 +156,97 @@ def obtener_reservas_filtradas(filters):
                     'else': {'$arrayElemAt': ['$evento_item', 0]}
                 }
             }
-        }
-    })
+        }}
+    ]
+
+def _filtro_ids_busqueda(filtro_q):
+    """Condiciones $or sobre cliente_id/lanzamiento_id/evento_id que coinciden con la búsqueda."""
+    ids = {
+        coleccion: [doc['id'] for doc in repositorio.buscar(coleccion, filtro_q, 'referencia')]
+        for coleccion in ('clientes', 'lanzamientos', 'eventos')
+    }
+    return [
+        {'cliente_id': {'$in': ids['clientes']}},
+        {'lanzamiento_id': {'$in': ids['lanzamientos']}},
+        {'evento_id': {'$in': ids['eventos']}},
+    ]
 
-    # Filter by query on cliente and item name
-    if q:
-        pipeline.append({
-            '$match': {
-                '$or': [
-                    {'cliente.nombre': {'$regex': q, '$options': 'i'}},
-                    {'item.nombre': {'$regex': q, '$options': 'i'}}
-                ]
-            }
-        })
+def obtener_reservas_filtradas(filters):
+    """
+    Devuelve (reservas de la página, total pendiente, número de reservas) para los
+    filtros indicados. Admite 'page', 'per_page', 'sort_by' y 'sort_order'.
+    """
+    pipeline = []
+
+    # Match stage for filtering: fechas y estado de pago usan campos indexados de la reserva
+    match_stage = {}
+    start_date = a_fecha(filters.get('start_date'))
+    end_date = a_fecha(filters.get('end_date'))
     
-    # Add fields for total, pendiente, pagado, and pago_completo
-    pipeline.append({
-        '$addFields': {
-            'total': {
-                '$add': [
-                    {'$multiply': [{'$toDouble': '$item.precio'}, {'$toInt': '$cantidad'}]},
-                    {'$toDouble': '$item.precio_reserva'}
-                ]
-            },
-            'pagado': {'$toDouble': '$pagado'}
-        }
-    })
-    pipeline.append({
-        '$addFields': {
-            'pendiente': {'$subtract': ['$total', '$pagado']},
-            'pago_completo': {'$gte': ['$pagado', '$total']}
-        }
-    })
+    if start_date:
+        match_stage['fecha_reserva'] = {'$gte': start_date}
+    if end_date:
+        if 'fecha_reserva' in match_stage:
+            match_stage['fecha_reserva']['$lte'] = end_date
+        else:
+            match_stage['fecha_reserva'] = {'$lte': end_date}
+
+    # La búsqueda por nombre de cliente o de producto se resuelve primero sobre las
+    # claves de búsqueda indexadas de cada colección y se filtra la reserva por sus ids
+    filtro_q = filtro_busqueda(filters.get('q'))
+    if filtro_q:
+        match_stage['$or'] = _filtro_ids_busqueda(filtro_q)
 
-    # Filter by payment_status
     payment_status = filters.get('payment_status')
     if payment_status == 'pagado':
-        pipeline.append({'$match': {'pago_completo': True}})
+        match_stage['pago_completo'] = True
     elif payment_status == 'pendiente':
-        pipeline.append({'$match': {'pago_completo': False}})
-        
+        match_stage['pago_completo'] = False
+
+    if match_stage:
+        pipeline.append({'$match': match_stage})
+
+    sort_field = CAMPOS_ORDEN_RESERVAS.get(filters.get('sort_by'), 'fecha_reserva')
+    sort_order = 1 if filters.get('sort_order') == 'asc' else -1
+    page = max(int(filters.get('page') or 1), 1)
+    per_page = min(max(int(filters.get('per_page') or RESERVAS_POR_PAGINA), 1), 500)
+
+    # Los lookups solo hacen falta antes de paginar si se ordena por el nombre del
+    # cliente o del producto; si no, se hacen solo para las filas de la página.
+    lookup_previo = sort_field in ('cliente.nombre', 'item.nombre')
+    if lookup_previo:
+        pipeline.extend(_etapas_lookup())
+
+    # El orden va antes del $facet: dentro de él no se pueden usar índices. El desempate
+    # por id sigue la misma dirección para que el índice (fecha_reserva, id) sirva en
+    # los dos sentidos.
+    pipeline.append({'$sort': {sort_field: sort_order, 'id': sort_order}})
+
+    # Página de filas y totales globales en una sola agregación
+    filas = [
+        {'$skip': (page - 1) * per_page},
+        {'$limit': per_page}
+    ]
+    if not lookup_previo:
+        filas.extend(_etapas_lookup())
     # Projection to remove temp fields
-    pipeline.append({'$project': {'lanzamiento_item': 0, 'evento_item': 0, '_id':0}})
+    ocultos = {f'{destino}.{campo}': 0 for destino in ('cliente', 'item') for campo in repositorio.CAMPOS_INTERNOS}
+    filas.append({'$project': {'lanzamiento_item': 0, 'evento_item': 0, **repositorio.proyeccion('reservas'), **ocultos}})
 
-    reservas_enriquecidas = list(RESERVAS_COLLECTION.aggregate(pipeline))
+    pipeline.append({
+        '$facet': {
+            'filas': filas,
+            'totales': [
+                {'$group': {
+                    '_id': None,
+                    'total_reservas': {'$sum': 1},
+                    'total_pendiente': {'$sum': {'$cond': ['$pago_completo', 0, '$pendiente']}}
+                }}
+            ]
+        }
+    })
 
-    total_pendiente_general = sum(r['pendiente'] for r in reservas_enriquecidas if not r['pago_completo'])
+    resultado = repositorio.agregar('reservas', pipeline)[0]
+    totales = resultado['totales'][0] if resultado['totales'] else {}
 
-    return reservas_enriquecidas, total_pendiente_general
+    return resultado['filas'], totales.get('total_pendiente', 0), totales.get('total_reservas', 0)
@@ -0,0 +1,95 @@
+import argparse
+import logging
+import sys
+from data.data_manager import RESERVAS_COLLECTION
+from data import repositorio
+from data.versiones import marcar_cambio
+from data.esquema import CERO, a_entero, a_importe
+
+# Cada reserva guarda materializados 'total', 'pendiente' y 'pago_completo', para que
+# el listado y el filtro por estado de pago no tengan que recalcularlos con $lookup.
+# Se actualizan al crear/editar la reserva y al cambiar el precio del producto.
+# Los importes son Decimal128 y 'cantidad' entero (data/esquema.py), así que las
+# operaciones se hacen en el servidor sin convertir tipos.
+
+def calcular_totales(item, cantidad, pagado):
+    """Devuelve {'total', 'pendiente', 'pago_completo'} para una reserva de `item`."""
+    if not item:
+        # Sin producto no hay importe que cobrar
+        return {'total': CERO, 'pendiente': CERO, 'pago_completo': True}
+    total = a_importe(item.get('precio')) * a_entero(cantidad, 1) + a_importe(item.get('precio_reserva'))
+    pagado = a_importe(pagado)
+    return {'total': total, 'pendiente': total - pagado, 'pago_completo': pagado >= total}
+
+def obtener_producto(lanzamiento_id=None, evento_id=None):
+    if lanzamiento_id:
+        return repositorio.obtener_por_id('lanzamientos', lanzamiento_id, 'precio')
+    if evento_id:
+        return repositorio.obtener_por_id('eventos', evento_id, 'precio')
+    return None
+
+def _etapas_totales(precio, precio_reserva):
+    """Pipeline de actualización que recalcula los totales con precios dados (expresiones o valores)."""
+    pagado = {'$ifNull': ['$pagado', CERO]}
+    return [
+        {'$set': {
+            'total': {'$add': [
+                {'$multiply': [precio, {'$ifNull': ['$cantidad', 1]}]},
+                precio_reserva
+            ]}
+        }},
+        {'$set': {
+            'pendiente': {'$subtract': ['$total', pagado]},
+            'pago_completo': {'$gte': [pagado, '$total']}
+        }}
+    ]
+
+def recalcular_totales_producto(lanzamiento_id=None, evento_id=None):
+    """Recalcula los totales de todas las reservas de un producto tras cambiar su precio."""
+    item = obtener_producto(lanzamiento_id, evento_id)
+    filtro = {'lanzamiento_id': lanzamiento_id} if lanzamiento_id else {'evento_id': evento_id}
+    if item:
+        pipeline = _etapas_totales(a_importe(item.get('precio')), a_importe(item.get('precio_reserva')))
+    else:
+        pipeline = [{'$set': calcular_totales(None, 0, 0)}]
+    result = RESERVAS_COLLECTION.update_many(filtro, pipeline)
+    if result.modified_count:
+        marcar_cambio('reservas')
+    return result.modified_count
+
+def reparar_totales():
+    """
+    Recalcula en el servidor los totales de todas las reservas (relleno inicial o
+    reparación) y los escribe con $merge. Devuelve el número de reservas procesadas.
+    """
+    producto = {'$ifNull': [{'$arrayElemAt': ['$lanzamiento_item', 0]}, {'$arrayElemAt': ['$evento_item', 0]}]}
+    pipeline = [
+        {'$lookup': {'from': 'lanzamientos', 'localField': 'lanzamiento_id', 'foreignField': 'id', 'as': 'lanzamiento_item'}},
+        {'$lookup': {'from': 'eventos', 'localField': 'evento_id', 'foreignField': 'id', 'as': 'evento_item'}},
+        {'$set': {'item': producto}},
+        *_etapas_totales({'$ifNull': ['$item.precio', CERO]}, {'$ifNull': ['$item.precio_reserva', CERO]}),
+        # Reservas sin producto: nada que cobrar
+        {'$set': {
+            'total': {'$cond': [{'$ifNull': ['$item', False]}, '$total', CERO]},
+            'pendiente': {'$cond': [{'$ifNull': ['$item', False]}, '$pendiente', CERO]},
+            'pago_completo': {'$cond': [{'$ifNull': ['$item', False]}, '$pago_completo', True]},
+        }},
+        {'$project': {'_id': 0, 'id': 1, 'total': 1, 'pendiente': 1, 'pago_completo': 1}},
+        {'$merge': {'into': 'reservas', 'on': 'id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}}
+    ]
+    RESERVAS_COLLECTION.aggregate(pipeline)
+    marcar_cambio('reservas')
+    return RESERVAS_COLLECTION.count_documents({})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Relleno/reparación de los totales materializados de las reservas.')
+    parser.add_argument('accion', choices=['reparar'])
+    parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    procesadas = reparar_totales()
+    logging.info(f"Totales recalculados para {procesadas} reservas.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
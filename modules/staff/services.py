@@ -1,4 +1,4 @@
-from data.data_manager import STAFF_COLLECTION
+from data import repositorio
 
 def obtener_staff_todos():
-    return list(STAFF_COLLECTION.find({}, {'_id': 0}))
+    return repositorio.obtener_staff_todos()
@@ -0,0 +1,23 @@
+from datetime import datetime
+import pytest
+from modules.main.services import _en_rango
+
+RANGO = {'$gte': datetime(2025, 1, 1), '$lt': datetime(2025, 2, 1)}
+
+
+@pytest.mark.parametrize('fecha, esperado', [
+    (datetime(2025, 1, 10), True),
+    (datetime(2025, 2, 1), False),
+    ('2025-01-10', True),
+    ('2025-01-10T18:30:00', True),
+    ('2025-03-01', False),
+    (None, False),
+    ('', False),
+])
+def test_en_rango(fecha, esperado):
+    assert _en_rango(fecha, RANGO) is esperado
+
+
+@pytest.mark.parametrize('fecha', ['sin fecha', 20250110])
+def test_en_rango_ignora_fechas_no_validas(fecha):
+    assert _en_rango(fecha, RANGO) is False
@@ -0,0 +1,129 @@
+import io
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from openpyxl import Workbook
+from modules.export.importacion import (
+    CAMPO_HUELLA, _lotes, _texto, calcular_huella, clasificar_fusion, leer_filas
+)
+from modules.reservas.services import construir_reserva
+
+PRODUCTO = {'id': 'l1', 'precio': Decimal('100.00'), 'precio_reserva': Decimal('10.00')}
+
+
+def _lanzamiento(**cambios):
+    doc = {
+        'id': 'x', 'nombre': 'Caja de sobres', 'juego': 'Magic', 'coleccion': 'Avatar',
+        'fecha_salida': datetime(2025, 3, 1), 'precio': Decimal('120.00'), 'comentario': None,
+    }
+    doc.update(cambios)
+    doc[CAMPO_HUELLA] = calcular_huella(doc)
+    return doc
+
+
+def _resultado():
+    return {'filas': 0, 'importadas': 0, 'actualizadas': 0, 'sin_cambios': 0, 'errores': []}
+
+
+def test_huella_no_depende_del_orden_ni_de_campos_generados():
+    doc = {'nombre': 'Ana', 'telefono': '600', 'email': None}
+    generados = {'email': None, 'id': 'otro', 'busqueda': ['ana'], 'telefono': '600', 'nombre': 'Ana', 'total': 1}
+    assert calcular_huella(doc) == calcular_huella(generados)
+
+
+def test_huella_cambia_con_el_contenido():
+    assert calcular_huella({'precio': Decimal('10.00')}) != calcular_huella({'precio': Decimal('10.50')})
+    assert calcular_huella({'fecha': datetime(2025, 1, 1)}) != calcular_huella({'fecha': datetime(2025, 1, 2)})
+
+
+def test_huella_de_reserva_sin_fecha_no_depende_del_dia():
+    datos = {'cliente_id': 'c1', 'tipo_producto': 'lanzamiento', 'producto_id': 'l1', 'cantidad': 2}
+    hoy = construir_reserva(datos, PRODUCTO)
+    otro_dia = dict(hoy, fecha_reserva=datetime(2020, 1, 1), id='otro')
+    assert calcular_huella(hoy) != calcular_huella(otro_dia)
+    assert (calcular_huella(hoy, por_defecto=('fecha_reserva',))
+            == calcular_huella(otro_dia, por_defecto=('fecha_reserva',)))
+
+
+def test_clasificar_fusion_nuevos_cambiados_y_sin_cambios():
+    guardado = _lanzamiento(id='a')
+    guardado_antiguo = _lanzamiento(id='b', coleccion='Foundations', precio=Decimal('90.00'))
+    existentes = {
+        ('Caja de sobres', 'Magic', 'Avatar'): guardado,
+        ('Caja de sobres', 'Magic', 'Foundations'): guardado_antiguo,
+    }
+    sin_cambios = _lanzamiento()
+    cambiado = _lanzamiento(coleccion='Foundations', precio=Decimal('95.00'))
+    nuevo = _lanzamiento(coleccion='Aetherdrift')
+
+    resultado = _resultado()
+    pendientes = clasificar_fusion(
+        'lanzamientos', [(2, sin_cambios), (3, cambiado), (4, nuevo)], existentes, resultado, {}
+    )
+
+    assert resultado['sin_cambios'] == 1
+    assert resultado['errores'] == []
+    assert [(numero, existente) for numero, _, existente in pendientes] == [(3, guardado_antiguo), (4, None)]
+
+
+def test_clasificar_fusion_rechaza_filas_repetidas_y_sin_clave():
+    estado = {}
+    resultado = _resultado()
+    primero = clasificar_fusion('lanzamientos', [(2, _lanzamiento())], {}, resultado, estado)
+    # La clave ya se vio en un lote anterior de la misma importación
+    repetido = clasificar_fusion('lanzamientos', [(3, _lanzamiento())], {}, resultado, estado)
+    sin_clave = clasificar_fusion(
+        'lanzamientos', [(4, _lanzamiento(nombre=None, juego=None, coleccion=None))], {}, resultado, estado
+    )
+
+    assert len(primero) == 1 and repetido == [] and sin_clave == []
+    assert [numero for numero, _ in resultado['errores']] == [3, 4]
+
+
+def _libro(filas):
+    libro = Workbook()
+    hoja = libro.active
+    hoja.title = 'Clientes'
+    for fila in filas:
+        hoja.append(fila)
+    fichero = io.BytesIO()
+    libro.save(fichero)
+    fichero.seek(0)
+    return fichero
+
+
+def test_leer_filas_normaliza_valores_y_salta_vacias():
+    fichero = _libro([
+        ['nombre', 'telefono', 'fecha', None],
+        ['  Ana  ', 600123456, datetime(2025, 1, 2, 10, 30), 'sin cabecera'],
+        [None, None, None, None],
+        ['', '   ', None, None],
+        ['Luis', '600654321', None, None],
+    ])
+    assert list(leer_filas(fichero, 'Clientes')) == [
+        (2, {'nombre': 'Ana', 'telefono': 600123456, 'fecha': '2025-01-02'}),
+        (5, {'nombre': 'Luis', 'telefono': '600654321', 'fecha': None}),
+    ]
+
+
+def test_leer_filas_hoja_inexistente():
+    with pytest.raises(ValueError):
+        leer_filas(_libro([['nombre']]), 'Reservas')
+
+
+def test_texto_de_telefonos_numericos():
+    assert _texto(600123456.0) == '600123456'
+    assert _texto(' 600 ') == '600'
+    assert _texto('') is None
+
+
+@pytest.mark.parametrize('total, tamano, esperado', [
+    (0, 3, []),
+    (5, 2, [2, 2, 1]),
+    (6, 3, [3, 3]),
+    (4, 10, [4]),
+])
+def test_lotes(total, tamano, esperado):
+    lotes = list(_lotes(iter(range(total)), tamano))
+    assert [len(lote) for lote in lotes] == esperado
+    assert [x for lote in lotes for x in lote] == list(range(total))
@@ -0,0 +1,38 @@
+import json
+import pytest
+from data.migration import iterar_json
+
+TAMANOS_TROZO = [1, 2, 3, 5, 7, 64, 64 * 1024]
+
+
+def _escribir(tmp_path, contenido):
+    ruta = tmp_path / 'datos.json'
+    ruta.write_text(contenido, encoding='utf-8')
+    return str(ruta)
+
+
+@pytest.mark.parametrize('tamano_trozo', TAMANOS_TROZO)
+@pytest.mark.parametrize('contenido', [
+    '[]',
+    '  [ ]  ',
+    '[1.5e3, true, null]',
+    '[12345,-0.25,1E-7]',
+    '[{"id": "a", "precio": 10.5, "notas": "con, coma y ] corchete"}, {"id": "b"}]',
+    '[\n  {"nombre": "Éxito ñ"},\n  [1, [2, 3]],\n  "texto"\n]\n',
+])
+def test_iterar_json_coincide_con_json_load(tmp_path, contenido, tamano_trozo):
+    ruta = _escribir(tmp_path, contenido)
+    assert list(iterar_json(ruta, tamano_trozo)) == json.loads(contenido)
+
+
+@pytest.mark.parametrize('tamano_trozo', TAMANOS_TROZO)
+@pytest.mark.parametrize('contenido', [
+    '{"a": 1}',
+    '[1, 2',
+    '[1 2]',
+    '[1,, 2]',
+])
+def test_iterar_json_rechaza_contenido_no_valido(tmp_path, contenido, tamano_trozo):
+    ruta = _escribir(tmp_path, contenido)
+    with pytest.raises(ValueError):
+        list(iterar_json(ruta, tamano_trozo))